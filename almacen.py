@@ -0,0 +1,217 @@
+"""Almacén de archivos subidos direccionado por contenido.
+
+Antes cada arte se guardaba como ``uploads/<nombre original>``: el mismo
+arte subido dos veces ocupaba el doble y dos archivos distintos con el
+mismo nombre se pisaban sin aviso. Ahora:
+
+- ``guardar`` escribe la subida por bloques calculando su SHA-256 y la deja
+  en ``uploads/objetos/<ab>/<sha256><ext>``. Si ya existía, no se duplica.
+- La tabla ``archivos`` lleva cuántos proyectos usan cada objeto
+  (``referenciar``/``liberar``, dentro de la transacción del proyecto).
+- ``recolectar`` borra los objetos sin referencias (tras ``eliminar_proyecto``).
+
+Los proyectos guardan el hash en ``proyectos.imagen_sha256`` y la ruta del
+objeto en ``imagen_path``. Rutas antiguas siguen funcionando; se pueden
+pasar al almacén con:
+    python almacen.py --importar-legado
+    python almacen.py --recolectar
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import base_datos
+
+DIR_UPLOADS = "uploads"
+DIR_OBJETOS = os.path.join(DIR_UPLOADS, "objetos")
+BLOQUE = 1024 * 1024
+# Un objeto sin referencias no se borra hasta pasado este margen: cubre la
+# ventana entre escribir el archivo y hacer COMMIT del proyecto que lo usa.
+GRACIA_SEGUNDOS = 15 * 60
+
+_PATRON_OBJETO = re.compile(r"([0-9a-f]{64})(\.\w+)?$")
+
+
+def ruta_objeto(sha, extension):
+    return os.path.join(DIR_OBJETOS, sha[:2], f"{sha}{extension}")
+
+
+def sha_de_ruta(ruta):
+    """Hash de un objeto del almacén a partir de su ruta; None para rutas antiguas."""
+    if not ruta:
+        return None
+    ruta = os.path.normpath(ruta)
+    if os.path.dirname(os.path.dirname(ruta)) != os.path.normpath(DIR_OBJETOS):
+        return None
+    coincide = _PATRON_OBJETO.match(os.path.basename(ruta))
+    return coincide.group(1) if coincide else None
+
+
+def guardar(archivo, nombre=None):
+    """Guarda un archivo subido (cualquier objeto con ``read``) y devuelve su ruta en el almacén.
+
+    El contenido se copia por bloques a un temporal mientras se calcula el
+    hash; luego se mueve atómicamente a su ruta definitiva o se descarta si
+    ese contenido ya estaba guardado.
+    """
+    nombre = nombre or getattr(archivo, 'name', '') or ''
+    extension = os.path.splitext(nombre)[1].lower()
+    os.makedirs(DIR_OBJETOS, exist_ok=True)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    h = hashlib.sha256()
+    descriptor, temporal = tempfile.mkstemp(dir=DIR_OBJETOS, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+                h.update(bloque)
+                destino.write(bloque)
+        sha = h.hexdigest()
+        ruta = ruta_objeto(sha, extension)
+        if os.path.exists(ruta):
+            # Duplicado: se conserva el existente y se renueva su margen de gracia
+            os.utime(ruta)
+            os.remove(temporal)
+        else:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    _registrar(sha, extension, nombre, os.path.getsize(ruta))
+    return ruta
+
+
+def _registrar(sha, extension, nombre, tamano):
+    with base_datos.transaccion() as conn:
+        conn.execute('''
+            INSERT INTO archivos (sha256, extension, nombre_original, tamano, referencias, creado)
+            VALUES (?, ?, ?, ?, 0, ?)
+            ON CONFLICT(sha256) DO NOTHING
+        ''', (sha, extension, nombre, tamano, datetime.now()))
+
+
+def referenciar(conn, ruta):
+    """Suma una referencia al objeto de ``ruta`` (si es del almacén). Devuelve su hash."""
+    sha = sha_de_ruta(ruta)
+    if sha:
+        conn.execute("UPDATE archivos SET referencias = referencias + 1 WHERE sha256 = ?", (sha,))
+    return sha
+
+
+def liberar(conn, ruta):
+    """Quita una referencia al objeto de ``ruta``. El borrado físico lo hace ``recolectar``."""
+    sha = sha_de_ruta(ruta)
+    if sha:
+        conn.execute("UPDATE archivos SET referencias = MAX(referencias - 1, 0) WHERE sha256 = ?", (sha,))
+    return sha
+
+
+def nombre_original(ruta):
+    """Nombre con el que se subió el archivo (para mostrar y para descargas)."""
+    sha = sha_de_ruta(ruta)
+    if sha:
+        with base_datos.conexion() as conn:
+            fila = conn.execute("SELECT nombre_original FROM archivos WHERE sha256 = ?", (sha,)).fetchone()
+        if fila and fila[0]:
+            return fila[0]
+    return os.path.basename(ruta) if ruta else None
+
+
+def recolectar(gracia=GRACIA_SEGUNDOS):
+    """Borra los objetos sin referencias más antiguos que ``gracia``. Devuelve los hashes borrados."""
+    limite = time.time() - gracia
+    borrados = []
+    with base_datos.transaccion() as conn:
+        candidatos = conn.execute("SELECT sha256, extension FROM archivos WHERE referencias <= 0").fetchall()
+        for sha, extension in candidatos:
+            ruta = ruta_objeto(sha, extension)
+            if os.path.exists(ruta) and os.path.getmtime(ruta) > limite:
+                continue
+            conn.execute("DELETE FROM archivos WHERE sha256 = ? AND referencias <= 0", (sha,))
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            borrados.append(sha)
+        # Archivos sin fila (p. ej. una subida interrumpida)
+        conocidos = {fila[0] for fila in conn.execute("SELECT sha256 FROM archivos")}
+        if os.path.isdir(DIR_OBJETOS):
+            for carpeta, _dirs, archivos in os.walk(DIR_OBJETOS):
+                for nombre in archivos:
+                    ruta = os.path.join(carpeta, nombre)
+                    sha = sha_de_ruta(ruta)
+                    if (sha is None or sha not in conocidos) and os.path.getmtime(ruta) <= limite:
+                        os.remove(ruta)
+                        if sha:
+                            borrados.append(sha)
+    return borrados
+
+
+def recontar(conn):
+    """Recalcula las referencias desde ``proyectos`` (reparación manual)."""
+    conn.execute('''
+        UPDATE archivos SET referencias = (
+            SELECT COUNT(*) FROM proyectos p WHERE p.imagen_sha256 = archivos.sha256
+        )
+    ''')
+
+
+def limpiar():
+    """Borra el almacén completo (reinicio de la BD)."""
+    shutil.rmtree(DIR_OBJETOS, ignore_errors=True)
+
+
+def importar_legado():
+    """Pasa al almacén los archivos de proyectos con ruta antigua. Devuelve cuántos proyectos cambiaron."""
+    with base_datos.conexion() as conn:
+        pendientes = conn.execute("SELECT id, imagen_path FROM proyectos WHERE imagen_sha256 IS NULL AND imagen_path IS NOT NULL").fetchall()
+    cambiados = 0
+    antiguos = set()
+    for proyecto_id, ruta_antigua in pendientes:
+        if not os.path.isfile(ruta_antigua):
+            continue
+        with open(ruta_antigua, 'rb') as f:
+            ruta = guardar(f, os.path.basename(ruta_antigua))
+        with base_datos.transaccion() as conn:
+            sha = referenciar(conn, ruta)
+            conn.execute("UPDATE proyectos SET imagen_path = ?, imagen_sha256 = ? WHERE id = ?", (ruta, sha, proyecto_id))
+            base_datos.marcar_cambio(conn)
+        antiguos.add(ruta_antigua)
+        cambiados += 1
+    # Los archivos antiguos se borran solo cuando ningún proyecto los nombra ya
+    with base_datos.conexion() as conn:
+        for ruta_antigua in antiguos:
+            if not conn.execute("SELECT 1 FROM proyectos WHERE imagen_path = ?", (ruta_antigua,)).fetchone():
+                os.remove(ruta_antigua)
+    return cambiados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacén de archivos subidos.")
+    parser.add_argument('--importar-legado', action='store_true', help="Mover al almacén los archivos con ruta antigua")
+    parser.add_argument('--recontar', action='store_true', help="Recalcular referencias desde los proyectos")
+    parser.add_argument('--recolectar', action='store_true', help="Borrar objetos sin referencias")
+    args = parser.parse_args()
+
+    import migraciones
+    migraciones.asegurar_esquema()
+    if args.importar_legado:
+        print(f"{importar_legado()} proyectos pasados al almacén.")
+    if args.recontar:
+        with base_datos.transaccion() as conn:
+            recontar(conn)
+        print("Referencias recalculadas.")
+    if args.recolectar:
+        print(f"{len(recolectar())} objetos sin referencias borrados.")
+    with base_datos.conexion() as conn:
+        n, total, huerfanos = conn.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0), SUM(referencias = 0) FROM archivos").fetchone()
+    print(f"Almacén: {n} objetos, {total / 1e6:.1f} MB, {huerfanos or 0} sin referencias.")
+
+
+if __name__ == '__main__':
+    main()
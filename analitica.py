@@ -0,0 +1,193 @@
+"""Motor de analítica de tiempos de proceso sobre ``proyectos_log``.
+
+Calcula, para las etapas ya cerradas (con ``timestamp_fin``), duraciones
+promedio/p50/p95, throughput, metros impresos y proporción de desperdicio,
+agrupadas por estado, máquina, responsable, día o semana de cierre. Las
+filas "Pausado" no cuentan como tiempo de trabajo.
+
+Una pausa parte la etapa en dos filas del log (se cierra la fila y al
+reanudar se abre otra del mismo estado). Las duraciones por etapa (promedio,
+p50, p95) y la cantidad de etapas se calculan sobre la etapa completa: la
+suma de sus tramos, en el día y con la máquina del último tramo. Una etapa
+pausada que todavía no terminó no entra en esas cifras, pero sus horas y
+metros sí.
+
+La base de filas cerradas se mantiene en memoria por proceso y se actualiza
+de forma incremental: en cada consulta solo se leen las filas cerradas
+después de la última marca (``timestamp_fin``), usando el índice
+``idx_log_fin``. Los resultados agregados se memorizan hasta que llega
+alguna fila nueva. Si se elimina un proyecto (contador ``log_borrados``)
+la base se reconstruye completa; si se borra la BD entera, ``olvidar()``.
+"""
+import threading
+
+import pandas as pd
+
+import base_datos
+from consultas import calcular_duraciones
+
+ESTADO_PAUSA = "Pausado"
+# Valores que la pausa/reanudación escribe en maquina_utilizada en lugar de una máquina real
+MAQUINAS_FICTICIAS = ("Reanudado",)
+PREFIJO_MOTIVO_PAUSA = "Motivo:"
+
+# Dimensiones de agrupación disponibles -> columna de la base
+DIMENSIONES = {
+    'estado': 'estado',
+    'maquina': 'maquina',
+    'responsable': 'responsable',
+    'dia': 'dia',
+    'semana': 'semana',
+}
+
+_COLUMNAS = """id, proyecto_id, estado, maquina_utilizada AS maquina, responsable,
+           timestamp_inicio, timestamp_fin, metros_impresos, desperdicio, cantidad_cores, numero_cajas"""
+
+# `cerrado_por_pausa`: la fila siguiente del proyecto es la pausa (puede seguir abierta).
+# Filas nuevas (pocas): subconsulta por fila. Carga completa: todas las filas (también las
+# abiertas) en el orden del índice, y la fila siguiente se busca en pandas (``_cerradas``).
+SQL_CERRADOS = f"""
+    SELECT {_COLUMNAS},
+           (SELECT sig.estado FROM proyectos_log sig
+            WHERE sig.proyecto_id = pl.proyecto_id AND sig.id > pl.id
+            ORDER BY sig.id LIMIT 1) = '{ESTADO_PAUSA}' AS cerrado_por_pausa
+    FROM proyectos_log pl
+    WHERE timestamp_fin IS NOT NULL
+"""
+
+SQL_LOG_COMPLETO = f"""
+    SELECT {_COLUMNAS}
+    FROM proyectos_log
+    ORDER BY proyecto_id, timestamp_inicio
+"""
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _cerradas(df):
+    """Filas cerradas del log completo, con ``cerrado_por_pausa`` según la fila siguiente (por id) del proyecto."""
+    siguiente = df.sort_values(['proyecto_id', 'id']).groupby('proyecto_id')['estado'].shift(-1)
+    df['cerrado_por_pausa'] = siguiente == ESTADO_PAUSA
+    return df[df['timestamp_fin'].notna()].reset_index(drop=True)
+
+
+def _preparar(df):
+    """Tipos, duraciones y columnas derivadas de un bloque de filas cerradas."""
+    df = calcular_duraciones(df)
+    for col in ('metros_impresos', 'desperdicio', 'cantidad_cores', 'numero_cajas'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['cerrado_por_pausa'] = df['cerrado_por_pausa'].fillna(0).astype(bool)
+    df['dia'] = df['timestamp_fin'].dt.normalize()
+    df['semana'] = df['timestamp_fin'].dt.to_period('W').dt.start_time
+    return df
+
+
+def _resolver_maquinas(df):
+    """Al reanudar una pausa se registra 'Reanudado' como máquina: se hereda la del tramo anterior."""
+    maquina = df['maquina'].where(~df['maquina'].isin(MAQUINAS_FICTICIAS))
+    df['maquina'] = maquina.groupby([df['proyecto_id'], df['estado']]).ffill()
+    return df
+
+
+def _unir_tramos(df):
+    """``etapa_min``: en el último tramo de cada etapa, la duración sumada de todos sus tramos (NaN en el resto).
+
+    Un tramo continúa la etapa del anterior del proyecto si ese se cerró por una pausa y es del mismo estado.
+    """
+    trabajo = df[df['estado'] != ESTADO_PAUSA]
+    anterior = trabajo.groupby('proyecto_id')[['estado', 'cerrado_por_pausa']].shift(1)
+    continua = (anterior['estado'] == trabajo['estado']) & anterior['cerrado_por_pausa'].fillna(False).astype(bool)
+    etapa = (~continua).cumsum()
+    total = trabajo['duracion_min'].groupby(etapa).transform('sum')
+    df['etapa_min'] = total.where(~trabajo['cerrado_por_pausa'])
+    return df
+
+
+def base_log():
+    """DataFrame (compartido, no modificar) con todas las etapas cerradas, al día con la BD."""
+    ruta = base_datos.DB_PATH
+    with _lock:
+        estado = _cache.get(ruta)
+        with base_datos.conexion() as conn:
+            borrados = base_datos.version_datos('log_borrados', conn)
+            if estado is None or estado['borrados'] != borrados:
+                df = _cerradas(pd.read_sql_query(SQL_LOG_COMPLETO, conn))
+                df = _unir_tramos(_resolver_maquinas(_preparar(df)))
+                estado = _cache[ruta] = {'df': df, 'borrados': borrados, 'resultados': {}}
+            else:
+                df = estado['df']
+                marca = df['timestamp_fin'].max() if not df.empty else None
+                if marca is not None:
+                    # Misma representación de texto que guarda sqlite3 para datetime
+                    nuevos = pd.read_sql_query(SQL_CERRADOS + " AND timestamp_fin >= ?", conn, params=(str(marca),))
+                    nuevos = nuevos[~nuevos['id'].isin(df.loc[df['timestamp_fin'] == marca, 'id'])]
+                else:
+                    nuevos = pd.read_sql_query(SQL_CERRADOS, conn)
+                if not nuevos.empty:
+                    df = pd.concat([df, _preparar(nuevos)], ignore_index=True)
+                    df = _unir_tramos(_resolver_maquinas(df.sort_values(['proyecto_id', 'timestamp_inicio'], kind='stable')))
+                    estado.update(df=df, resultados={})
+        return estado['df']
+
+
+def olvidar(ruta=None):
+    """Descarta la base en memoria (al recrear la BD el contador ``log_borrados`` vuelve a 0)."""
+    with _lock:
+        _cache.pop(ruta or base_datos.DB_PATH, None)
+
+
+def resumir(df, por):
+    """Agrega las etapas de trabajo (sin pausas) de ``df`` por una o varias columnas.
+
+    Horas, metros y desperdicio suman todos los tramos; etapas y duraciones
+    cuentan cada etapa completa una vez (columna ``etapa_min``).
+    """
+    trabajo = df[df['estado'] != ESTADO_PAUSA]
+    if trabajo.empty:
+        return pd.DataFrame()
+    out = trabajo.groupby(por, dropna=False).agg(
+        proyectos=('proyecto_id', 'nunique'),
+        horas_totales=('duracion_min', 'sum'),
+        metros_impresos=('metros_impresos', 'sum'),
+        desperdicio=('desperdicio', 'sum'),
+    )
+    g = trabajo.dropna(subset=['etapa_min']).groupby(por, dropna=False)['etapa_min']
+    out['etapas'] = g.size().reindex(out.index, fill_value=0)
+    out['prom_min'] = g.mean()
+    out['p50_min'] = g.median()
+    out['p95_min'] = g.quantile(0.95)
+    out['horas_totales'] = out['horas_totales'] / 60
+    material = out['metros_impresos'] + out['desperdicio']
+    # Proporción del material consumido que terminó como desperdicio
+    out['ratio_desperdicio'] = (out['desperdicio'] / material).where(material > 0)
+    columnas = ['etapas', 'proyectos', 'horas_totales', 'prom_min', 'p50_min', 'p95_min', 'metros_impresos', 'desperdicio', 'ratio_desperdicio']
+    return out[columnas].round(2).reset_index()
+
+
+def resumen(por='estado'):
+    """Resumen cacheado por dimensión (ver ``DIMENSIONES``); se recalcula solo si llegaron filas nuevas."""
+    columna = DIMENSIONES[por]
+    df = base_log()
+    with _lock:
+        resultados = _cache[base_datos.DB_PATH]['resultados']
+        if por not in resultados:
+            resultados[por] = resumir(df, columna)
+        return resultados[por]
+
+
+def entregas_por_periodo(conn, periodo='dia'):
+    """Proyectos que pasaron a 'Entregado' por día o semana (throughput de planta).
+
+    ``periodo`` es la fecha del día o del lunes de la semana, como en los tableros de kpi_diario.
+    """
+    expresion = "date(timestamp_inicio)" if periodo == 'dia' else "date(timestamp_inicio, 'weekday 0', '-6 days')"
+    query = f"""
+        SELECT {expresion} AS periodo, COUNT(DISTINCT proyecto_id) AS entregados
+        FROM proyectos_log
+        WHERE estado = 'Entregado'
+        GROUP BY periodo ORDER BY periodo
+    """
+    df = pd.read_sql_query(query, conn)
+    df['periodo'] = pd.to_datetime(df['periodo'])
+    return df
@@ -0,0 +1,292 @@
+"""API HTTP de solo lectura (JSON) para tablets y pantallas de planta.
+
+Un kiosco que solo muestra su cola no necesita ejecutar todo el script de
+Streamlit en cada refresco. Este proceso aparte usa la misma capa de datos
+(base_datos, consultas, resumen_diario, planificador, secuenciador) y sirve:
+
+    GET /api/salud
+    GET /api/proyectos?estado=Impresion&maquina=SP1&prioridad=Urgente&cliente=&op=&anilox=&color=&activos=1&despues_de=&limite=50
+    GET /api/proyectos/<id>
+    GET /api/proyectos/<id>/log
+    GET /api/colores?anilox=440&color=P-185C&estado=Preprensa&estado=Impresion
+    GET /api/kpis?por=maquina&desde=2024-01-01&hasta=2024-01-31
+    GET /api/plan?solo_riesgo=1
+    GET /api/secuencia?maquina=SP1
+    GET /api/eventos?despues_de=<id>
+
+Cada respuesta lleva un ETag derivado de la versión de datos (el contador
+que incrementa ``marcar_cambio`` en cada escritura) y de la generación de la
+BD (cambia si se borra y se recrea desde Configuración): si el cliente manda
+``If-None-Match`` con el mismo valor se responde 304 sin consultar nada
+más que esa versión. Los cuerpos se guardan por URL y versión, así que
+veinte pantallas con la misma URL cuestan una sola consulta por cambio, y
+se comprimen con gzip cuando el cliente lo acepta.
+
+La API no tiene usuarios: por defecto solo escucha en 127.0.0.1. Para
+abrirla a la red de planta hay que fijar un token compartido (``--token`` o
+la variable PRODUCCION_API_TOKEN) que los kioscos mandan en la cabecera
+``Authorization: Bearer <token>``.
+
+Uso:
+    python api.py [--host 127.0.0.1] [--puerto 8502] [--token SECRETO] [--verbose]
+"""
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import colores
+import eventos
+import planificador
+import resumen_diario
+import secuenciador
+from base_datos import conexion, generacion_bd, version_datos
+from consultas import SQL_PROYECTOS, listar_proyectos, logs_proyectos
+from migraciones import asegurar_esquema
+
+LIMITE_MAXIMO = 500
+# Respuestas (URL + versión) que se guardan en memoria
+CACHE_MAX = 256
+# Por debajo de este tamaño gzip no compensa
+GZIP_MINIMO = 1024
+
+
+class ErrorPeticion(Exception):
+    """Parámetro inválido o recurso inexistente; se responde con ``estado``."""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _a_json(valor):
+    if isinstance(valor, pd.DataFrame):
+        return valor.to_json(orient='records', date_format='iso', force_ascii=False)
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+def _objeto(**campos):
+    """Objeto JSON con DataFrames serializados por pandas (sin pasar por dicts de Python)."""
+    return "{" + ",".join(f"{json.dumps(k)}:{_a_json(v)}" for k, v in campos.items()) + "}"
+
+
+def _entero(params, nombre, defecto=None):
+    valor = params.get(nombre, [None])[-1]
+    if valor in (None, ''):
+        return defecto
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErrorPeticion(f"'{nombre}' debe ser un entero")
+
+
+def _texto(params, nombre):
+    valor = params.get(nombre, [''])[-1].strip()
+    return valor or None
+
+
+# --- Recursos ---
+
+def salud(conn, params):
+    return _objeto(ok=True, version=version_datos(conn=conn))
+
+
+def proyectos(conn, params):
+    filtros = {
+        'solo_activos': _entero(params, 'activos', 1) == 1,
+        'estados': params.get('estado'),
+        'prioridades': params.get('prioridad'),
+        'cliente': _texto(params, 'cliente'),
+        'op': _texto(params, 'op'),
+        'maquina': _texto(params, 'maquina'),
+        'entrega_desde': _texto(params, 'entrega_desde'),
+        'entrega_hasta': _texto(params, 'entrega_hasta'),
+        'anilox': _texto(params, 'anilox'),
+        'codigo_color': _texto(params, 'color'),
+    }
+    limite = min(max(_entero(params, 'limite', 50), 1), LIMITE_MAXIMO)
+    df, siguiente = listar_proyectos(conn, filtros, _entero(params, 'despues_de'), limite)
+    return _objeto(proyectos=df, siguiente=siguiente)
+
+
+def proyecto(conn, params, proyecto_id):
+    df = pd.read_sql_query(f"{SQL_PROYECTOS} WHERE p.id = ?", conn, params=[proyecto_id])
+    if df.empty:
+        raise ErrorPeticion(f"No existe el proyecto {proyecto_id}", 404)
+    unidades = colores.cargar(conn, [proyecto_id]).get(proyecto_id, [])
+    return _a_json(df)[1:-2] + f',"colores":{_a_json(unidades)}}}'
+
+
+def log_proyecto(conn, params, proyecto_id):
+    return _objeto(log=logs_proyectos(conn, [proyecto_id]))
+
+
+def colores_en_uso(conn, params):
+    anilox, color = _texto(params, 'anilox'), _texto(params, 'color')
+    if not anilox and not color:
+        raise ErrorPeticion("Indicar 'anilox' y/o 'color'")
+    return _objeto(colores=colores.proyectos_con(conn, anilox, color, params.get('estado')))
+
+
+def kpis(conn, params):
+    por = _texto(params, 'por') or 'estado'
+    if por not in resumen_diario.DIMENSIONES:
+        raise ErrorPeticion(f"'por' debe ser uno de: {', '.join(resumen_diario.DIMENSIONES)}")
+    return _objeto(kpis=resumen_diario.kpis(conn, por, _texto(params, 'desde'), _texto(params, 'hasta')))
+
+
+def plan(conn, params):
+    df, _ = planificador.planificar(conn)
+    if _entero(params, 'solo_riesgo', 0) == 1:
+        df = df[df['en_riesgo']]
+    return _objeto(proyectos=df)
+
+
+def secuencia(conn, params):
+    trabajos, resumen = secuenciador.secuenciar(conn)
+    maquina = _texto(params, 'maquina')
+    if maquina:
+        trabajos, resumen = trabajos[trabajos['maquina'] == maquina], resumen[resumen['maquina'] == maquina]
+    return _objeto(secuencia=trabajos, resumen=resumen)
+
+
+def feed(conn, params):
+    despues_de = _entero(params, 'despues_de', 0)
+    nuevos = eventos.posteriores(conn, despues_de, min(max(_entero(params, 'limite', 500), 1), LIMITE_MAXIMO))
+    # `ultimo` es el cursor para la próxima consulta
+    return _objeto(eventos=nuevos, ultimo=int(nuevos['id'].iloc[-1]) if len(nuevos) else despues_de)
+
+
+# (patrón de la ruta, función, segundos de validez además de la versión de datos o None).
+# El log mide hasta "ahora" las etapas abiertas y el plan descuenta lo que está corriendo:
+# sin escrituras, igual se renuevan cada tanto.
+RUTAS = [
+    (re.compile(r"^/api/salud$"), salud, None),
+    (re.compile(r"^/api/proyectos$"), proyectos, None),
+    (re.compile(r"^/api/proyectos/(\d+)$"), proyecto, None),
+    (re.compile(r"^/api/proyectos/(\d+)/log$"), log_proyecto, 60),
+    (re.compile(r"^/api/colores$"), colores_en_uso, None),
+    (re.compile(r"^/api/kpis$"), kpis, None),
+    (re.compile(r"^/api/plan$"), plan, 300),
+    (re.compile(r"^/api/secuencia$"), secuencia, None),
+    (re.compile(r"^/api/eventos$"), feed, None),
+]
+
+_respuestas = OrderedDict()
+_respuestas_lock = threading.Lock()
+
+
+def _respuesta_cacheada(clave, etag, generar):
+    """Cuerpo (json, json gzip) para la URL; solo se genera si cambió el ETag."""
+    with _respuestas_lock:
+        guardada = _respuestas.get(clave)
+        if guardada and guardada[0] == etag:
+            _respuestas.move_to_end(clave)
+            return guardada[1], guardada[2]
+    cuerpo = generar().encode('utf-8')
+    comprimido = gzip.compress(cuerpo, compresslevel=6) if len(cuerpo) >= GZIP_MINIMO else None
+    with _respuestas_lock:
+        _respuestas[clave] = (etag, cuerpo, comprimido)
+        _respuestas.move_to_end(clave)
+        while len(_respuestas) > CACHE_MAX:
+            _respuestas.popitem(last=False)
+    return cuerpo, comprimido
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Conexiones persistentes: los kioscos consultan seguido
+    server_version = 'ProduccionAPI/1.0'
+    verbose = False
+    token = None  # Si se fija, cada petición debe traer "Authorization: Bearer <token>"
+
+    def do_GET(self):
+        if self.token and not hmac.compare_digest(self.headers.get('Authorization', '').encode('utf-8'), f"Bearer {self.token}".encode('utf-8')):
+            return self._enviar(401, _objeto(error="Token ausente o inválido").encode('utf-8'))
+        url = urlsplit(self.path)
+        for patron, funcion, validez in RUTAS:
+            coincidencia = patron.match(url.path)
+            if coincidencia:
+                break
+        else:
+            return self._enviar(404, _objeto(error="Ruta desconocida").encode('utf-8'))
+        params = parse_qs(url.query)
+        argumentos = [int(g) for g in coincidencia.groups()]
+        try:
+            with conexion() as conn:
+                version = f"{generacion_bd(conn)}-{version_datos(conn=conn)}"
+                ventana = f"-{int(time.time() // validez)}" if validez else ""
+                # Débil: la versión gzip y la sin comprimir comparten ETag
+                etag = f'W/"{version}{ventana}-{hashlib.sha1(self.path.encode()).hexdigest()[:10]}"'
+                if etag in [e.strip() for e in self.headers.get('If-None-Match', '').split(',')]:
+                    return self._enviar(304, None, etag)
+                cuerpo, comprimido = _respuesta_cacheada(self.path, etag, lambda: funcion(conn, params, *argumentos))
+        except ErrorPeticion as e:
+            return self._enviar(e.estado, _objeto(error=str(e)).encode('utf-8'))
+        except Exception as e:
+            self.log_error("Error en %s: %r", self.path, e)
+            return self._enviar(500, _objeto(error="Error interno").encode('utf-8'))
+        if comprimido is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            return self._enviar(200, comprimido, etag, gzip=True)
+        self._enviar(200, cuerpo, etag)
+
+    def _enviar(self, estado, cuerpo, etag=None, gzip=False):
+        self.send_response(estado)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')  # Siempre revalidar, pero con If-None-Match
+            self.send_header('Vary', 'Accept-Encoding')
+        if cuerpo is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            if gzip:
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(cuerpo) if cuerpo else 0))
+        self.end_headers()
+        if cuerpo:
+            self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        if self.verbose:
+            super().log_message(formato, *args)
+
+
+def servidor(host='127.0.0.1', puerto=8502, token=None):
+    """Servidor listo para ``serve_forever()`` (un hilo por conexión)."""
+    asegurar_esquema()
+    ManejadorAPI.token = token or None
+    httpd = ThreadingHTTPServer((host, puerto), ManejadorAPI)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help="0.0.0.0 para atender a toda la red de planta (usar con --token)")
+    parser.add_argument('--puerto', type=int, default=8502)
+    parser.add_argument('--token', default=os.environ.get('PRODUCCION_API_TOKEN'), help="Token compartido que deben mandar los clientes (default: PRODUCCION_API_TOKEN)")
+    parser.add_argument('--verbose', action='store_true', help="Registrar cada petición en la consola")
+    args = parser.parse_args()
+    ManejadorAPI.verbose = args.verbose
+    httpd = servidor(args.host, args.puerto, args.token)
+    print(f"API de producción en http://{args.host}:{args.puerto}/api/")
+    if not args.token and args.host not in ('127.0.0.1', 'localhost', '::1'):
+        print("Atención: API sin token abierta a la red; cualquiera en ella puede leer clientes, pedidos y operarios.")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
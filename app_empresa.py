@@ -4,12 +4,31 @@ import sqlite3
 from datetime import date, datetime
 import os
 import hashlib
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import altair as alt
-import base64
-import json
 import socket
+import time
+
+from base_datos import conexion, transaccion, contenido_bd, cerrar_conexiones, archivos_bd, marcar_cambio, version_datos
+from migraciones import asegurar_esquema, olvidar_esquema, METRICAS as METRICAS_ESQUEMA
+from semilla import sembrar_usuarios
+from consultas import SQL_PROYECTOS, listar_proyectos, contar_proyectos, logs_proyectos
+import analitica
+import resumen_diario
+import transiciones
+import derivados
+import almacen
+import eventos
+import exportacion
+import cola_operario
+import colores
+import geometria
+import importacion
+import troqueles
+from montaje import dibujar_montaje
+import optimizador
+from optimizador import Z_UNITS_LIST
+import planificador
+import secuenciador
 
 # --- FUNCIONES DE USUARIO Y HASHING ---
 def make_hashes(password):
@@ -24,431 +43,277 @@ def check_hashes(password, hashed_text):
 
 def get_user_id(username):
     """Obtiene el ID de un usuario a partir de su nombre de usuario."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    c.execute('SELECT id FROM usuarios WHERE username = ?', (username,))
-    user_id = c.fetchone()
-    conn.close()
+    with conexion() as conn:
+        user_id = conn.execute('SELECT id FROM usuarios WHERE username = ?', (username,)).fetchone()
     return user_id[0] if user_id else None
 
 def get_user_role(username):
     """Obtiene el rol de un usuario (admin, ventas, operario)."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
     try:
-        c.execute('SELECT rol FROM usuarios WHERE username = ?', (username,))
-        result = c.fetchone()
+        with conexion() as conn:
+            result = conn.execute('SELECT rol FROM usuarios WHERE username = ?', (username,)).fetchone()
         return result[0] if result and result[0] else 'operario'
     except:
         return 'operario'
-    finally:
-        conn.close()
 
 def add_userdata(username, password):
     """Agrega un nuevo usuario a la base de datos."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
     try:
-        c.execute('INSERT INTO usuarios(username, password) VALUES (?,?)', (username, make_hashes(password)))
-        conn.commit()
+        with transaccion() as conn:
+            conn.execute('INSERT INTO usuarios(username, password) VALUES (?,?)', (username, make_hashes(password)))
         st.success(f"Usuario '{username}' creado exitosamente.")
         st.info("Ahora puedes ir a la sección de Login para iniciar sesión.")
     except sqlite3.IntegrityError:
         st.error(f"El nombre de usuario '{username}' ya existe.")
-    finally:
-        conn.close()
 
 
 def login_user(username, password):
     """Verifica las credenciales de un usuario y lo loguea."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    c.execute('SELECT * FROM usuarios WHERE username =? AND password = ?', (username, make_hashes(password)))
-    data = c.fetchall()
-    conn.close()
+    with conexion() as conn:
+        data = conn.execute('SELECT * FROM usuarios WHERE username =? AND password = ?', (username, make_hashes(password))).fetchall()
     return data
 
 # --- CONFIGURACIÓN DE LA BASE DE DATOS (BACKEND) ---
 def init_db():
-    """Inicializa la BD y actualiza el esquema de tablas si es necesario."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-
-    # Habilitar claves foráneas para integridad referencial
-    c.execute("PRAGMA foreign_keys = ON")
-
-    # --- Función auxiliar para añadir columnas de forma segura ---
-    def add_column_if_not_exists(table, column, type):
-        c.execute(f"PRAGMA table_info({table})")
-        if not any(col[1] == column for col in c.fetchall()):
-            c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type}")
-            st.toast(f"Agregada columna '{column}' a la tabla '{table}'.")
-
-    # --- 1. TABLA MAESTRA (EJE) ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS proyectos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cliente TEXT, 
-            nombre_proyecto TEXT,
-            fecha_creacion DATETIME,
-            estado TEXT,
-            imagen_path TEXT,
-            prioridad TEXT,
-            estado_anterior TEXT
-        )
-    ''')
-
-    # --- 2. TABLA VENTAS (PEDIDOS) ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS info_ventas (
-            proyecto_id INTEGER PRIMARY KEY,
-            cliente TEXT,
-            nombre_proyecto TEXT,
-            numero_pedido TEXT,
-            orden_produccion TEXT,
-            fecha_entrega DATE,
-            cantidad_solicitada INTEGER,
-            logo_cliente_path TEXT,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
-        )
-    ''')
-
-    # --- 3. TABLA TÉCNICA (INGENIERÍA) ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS info_tecnica (
-            proyecto_id INTEGER PRIMARY KEY,
-            material TEXT,
-            acabado TEXT,
-            medidas TEXT,
-            metros_lineales REAL,
-            numero_cavidades INTEGER,
-            posicion_etiqueta TEXT,
-            numero_core TEXT,
-            cantidad_por_core INTEGER,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
-        )
-    ''')
-
-    # --- 4. TABLA PREPRENSA ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS info_preprensa (
-            proyecto_id INTEGER PRIMARY KEY,
-            proveedor_preprensa TEXT,
-            area_preprensa_cm2 REAL,
-            numero_colores INTEGER,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
-        )
-    ''')
-
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS proyectos_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            proyecto_id INTEGER NOT NULL,
-            estado TEXT NOT NULL,
-            timestamp_inicio DATETIME NOT NULL,
-            timestamp_fin DATETIME,
-            usuario_id INTEGER,
-            maquina_utilizada TEXT,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id),
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-    ''')
-
-    # --- 5. TABLA IMPRESIÓN (CONFIGURACIÓN) ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS info_impresion (
-            proyecto_id INTEGER PRIMARY KEY,
-            detalles_impresion TEXT,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
-        )
-    ''')
-
-    # --- 6. TABLA TROQUELADO (HERRAMENTAL) ---
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS info_troquel (
-            proyecto_id INTEGER PRIMARY KEY,
-            troquel_existente TEXT,
-            numero_troquel TEXT,
-            numero_lamina TEXT,
-            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
-        )
-    ''')
-
-    # --- MIGRACIÓN AUTOMÁTICA DE DATOS (SI EXISTEN) ---
-    try:
-        # Verificamos si la tabla info_ventas está vacía y si proyectos tiene datos antiguos
-        c.execute("SELECT COUNT(*) FROM info_ventas")
-        count_new = c.fetchone()[0]
-        
-        # Verificar columnas existentes en proyectos para saber si migrar
-        c.execute("PRAGMA table_info(proyectos)")
-        columns_proyectos = [info[1] for info in c.fetchall()]
-        
-        # Si la tabla nueva está vacía y la vieja tiene la columna 'material' (indicador de esquema viejo), migramos
-        if count_new == 0 and 'material' in columns_proyectos:
-            st.toast("⏳ Migrando base de datos a nueva estructura... No cierres la app.")
-            
-            # 1. Migrar Ventas
-            # Nota: Usamos COALESCE o nombres directos si existen. Asumimos que existen por el check anterior.
-            # SQLite permite seleccionar columnas que existen.
-            c.execute('INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path) SELECT id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path FROM proyectos')
-            
-            # 2. Migrar Técnica
-            c.execute('INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core) SELECT id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core FROM proyectos')
-            
-            # 3. Migrar Preprensa
-            c.execute('INSERT INTO info_preprensa (proyecto_id, proveedor_preprensa, area_preprensa_cm2, numero_colores) SELECT id, proveedor_preprensa, area_preprensa_cm2, numero_colores FROM proyectos')
-            
-            # 4. Migrar Impresión
-            c.execute('INSERT INTO info_impresion (proyecto_id, detalles_impresion) SELECT id, detalles_impresion FROM proyectos')
-            
-            # 5. Migrar Troquel
-            c.execute('INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina) SELECT id, troquel_existente, numero_troquel, numero_lamina FROM proyectos')
-            
-            conn.commit()
-            st.success("✅ Base de datos optimizada y datos migrados correctamente.")
-    except Exception as e:
-        # Si ocurre un error (ej. columnas no existen), lo ignoramos silenciosamente o mostramos en consola
-        print(f"Nota de migración: {e}")
-
-    # --- Actualización del Esquema de tablas existentes (Logs y Usuarios) ---
-    add_column_if_not_exists('usuarios', 'rol', 'TEXT')
+    """Inicializa la BD y aplica las migraciones de esquema pendientes.
 
-    # --- Actualización del Esquema de la tabla proyectos_log ---
-    add_column_if_not_exists('proyectos_log', 'maquina_utilizada', 'TEXT')
-    add_column_if_not_exists('proyectos_log', 'responsable', 'TEXT')
-    add_column_if_not_exists('proyectos_log', 'observaciones', 'TEXT')
-    add_column_if_not_exists('proyectos_log', 'codigo_bobina', 'TEXT')
-    add_column_if_not_exists('proyectos_log', 'metros_impresos', 'REAL')
-    add_column_if_not_exists('proyectos_log', 'desperdicio', 'REAL')
-    add_column_if_not_exists('proyectos_log', 'cantidad_cores', 'INTEGER')
-    add_column_if_not_exists('proyectos_log', 'numero_cajas', 'INTEGER')
+    Solo la primera llamada del proceso toca la base de datos; en los reruns
+    siguientes es una comprobación en memoria (ver migraciones.py).
+    """
+    if asegurar_esquema(notificar=st.toast):
+        # Primer arranque del proceso: usuarios iniciales si la semilla está pendiente
+        sembrar_usuarios()
 
-    conn.commit()
-    conn.close()
+@st.cache_data(ttl=60, show_spinner=False)
+def sonda_salud():
+    """Comprobación barata de la BD (cacheada 60 s). Devuelve (ok, mensaje)."""
+    try:
+        with conexion() as conn:
+            n = conn.execute("SELECT COUNT(*) FROM proyectos").fetchone()[0]
+        return True, f"{n} proyectos"
+    except Exception as e:
+        return False, str(e)
 
 # --- Funciones de Proyectos y Analíticas ---
-def agregar_proyecto(cliente, nombre, material, acabado, medidas, fecha, estado, username, imagen_path, cantidad_solicitada, metros_lineales, numero_pedido, orden_produccion, numero_cavidades, fecha_creacion, posicion_etiqueta, cantidad_por_core, numero_core, area_preprensa_cm2, numero_colores, prioridad, logo_cliente_path, troquel_existente, numero_troquel, numero_lamina):
-    """Agrega un nuevo proyecto a la base de datos con todos sus detalles."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
+def agregar_proyecto(cliente, nombre, material, acabado, medidas, fecha, estado, username, imagen_path, cantidad_solicitada, metros_lineales, numero_pedido, orden_produccion, numero_cavidades, fecha_creacion, posicion_etiqueta, cantidad_por_core, numero_core, area_preprensa_cm2, numero_colores, prioridad, logo_cliente_path, troquel_existente, numero_troquel, numero_lamina, geo=None):
+    """Agrega un nuevo proyecto a la base de datos con todos sus detalles.
+
+    ``geo``: geometría numérica (claves de ``geometria.CAMPOS``); sin ella se extrae del texto ``medidas``.
+    """
+    geo = geo or geometria.desde_texto(medidas)
+    usuario_id = get_user_id(username)
+    with transaccion() as conn:
+        c = conn.cursor()
+        marcar_cambio(conn)
+        imagen_sha256 = almacen.referenciar(conn, imagen_path)
     
-    # 1. Insertar en Tabla Maestra (Mantenemos cliente/nombre por compatibilidad si es NOT NULL, o usamos dummy)
-    c.execute('''
-        INSERT INTO proyectos (cliente, nombre_proyecto, fecha_creacion, estado, imagen_path, prioridad)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (cliente, nombre, fecha_creacion, estado, imagen_path, prioridad))
-    proyecto_id = c.lastrowid
-
-    # 2. Insertar en Tablas Satélite
-    c.execute('INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
-              (proyecto_id, cliente, nombre, numero_pedido, orden_produccion, fecha, cantidad_solicitada, logo_cliente_path))
+        # 1. Insertar en Tabla Maestra (Mantenemos cliente/nombre por compatibilidad si es NOT NULL, o usamos dummy)
+        c.execute('''
+            INSERT INTO proyectos (cliente, nombre_proyecto, fecha_creacion, estado, imagen_path, imagen_sha256, prioridad)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (cliente, nombre, fecha_creacion, estado, imagen_path, imagen_sha256, prioridad))
+        proyecto_id = c.lastrowid
+        eventos.registrar(c, eventos.ALTA, proyecto_id, estado, username)
+
+        # 2. Insertar en Tablas Satélite
+        c.execute('INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
+                  (proyecto_id, cliente, nombre, numero_pedido, orden_produccion, fecha, cantidad_solicitada, logo_cliente_path))
     
-    c.execute('INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-              (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core))
+        c.execute('INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core, ancho_mm, gap_ancho_mm, largo_mm, z, repeticiones, gap_avance_mm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                  (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core,
+                   geo['ancho_mm'], geo['gap_ancho_mm'], geo['largo_mm'], geo['z'], geo['repeticiones'], geo['gap_avance_mm']))
     
-    c.execute('INSERT INTO info_preprensa (proyecto_id, area_preprensa_cm2, numero_colores) VALUES (?, ?, ?)',
-              (proyecto_id, area_preprensa_cm2, numero_colores))
+        c.execute('INSERT INTO info_preprensa (proyecto_id, area_preprensa_cm2, numero_colores) VALUES (?, ?, ?)',
+                  (proyecto_id, area_preprensa_cm2, numero_colores))
     
-    c.execute('INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina) VALUES (?, ?, ?, ?)',
-              (proyecto_id, troquel_existente, numero_troquel, numero_lamina))
-
-    usuario_id = get_user_id(username)
-    c.execute('''
-        INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id)
-        VALUES (?, ?, ?, ?)
-    ''', (proyecto_id, estado, datetime.now(), usuario_id))
-    conn.commit()
-    conn.close()
+        c.execute('INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina) VALUES (?, ?, ?, ?)',
+                  (proyecto_id, troquel_existente, numero_troquel, numero_lamina))
+        if troquel_existente == "Si":
+            troqueles.asignar(c, proyecto_id, numero_troquel, numero_lamina)
+
+        c.execute('''
+            INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id)
+            VALUES (?, ?, ?, ?)
+        ''', (proyecto_id, estado, datetime.now(), usuario_id))
     st.success(f"✅ Proyecto '{nombre}' agregado exitosamente con estado inicial '{estado}'.")
 
-def cambiar_estado_proyecto(proyecto_id, nuevo_estado, username, maquina=None, responsable=None, observaciones=None, codigo_bobina=None, metros_impresos=0.0, desperdicio=0.0, cantidad_cores=0, numero_cajas=0, proveedor_preprensa=None):
-    """Registra el cambio de estado de un proyecto en el log, incluyendo la máquina utilizada."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    now = datetime.now()
-    usuario_id = get_user_id(username)
-    # Finaliza el estado anterior y guarda datos de cierre del proceso
-    c.execute('''
-        UPDATE proyectos_log 
-        SET timestamp_fin = ?, responsable = ?, observaciones = ?, codigo_bobina = ?, metros_impresos = ?, desperdicio = ?, cantidad_cores = ?, numero_cajas = ?
-        WHERE proyecto_id = ? AND timestamp_fin IS NULL
-    ''', (now, responsable, observaciones, codigo_bobina, metros_impresos, desperdicio, cantidad_cores, numero_cajas, proyecto_id))
-    # Inicia el nuevo estado
-    c.execute('''
-        INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id, maquina_utilizada)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (proyecto_id, nuevo_estado, now, usuario_id, maquina))
-    # Actualiza el estado general del proyecto
-    c.execute('UPDATE proyectos SET estado = ? WHERE id = ?', (nuevo_estado, proyecto_id))
-    # Si se definió un proveedor de preprensa (en la etapa de diseño), lo guardamos en el proyecto
-    if proveedor_preprensa:
-        c.execute('UPDATE info_preprensa SET proveedor_preprensa = ? WHERE proyecto_id = ?', (proveedor_preprensa, proyecto_id))
-    conn.commit()
-    conn.close()
+def cambiar_estado_proyecto(proyecto_id, nuevo_estado, username, maquina=None, responsable=None, observaciones=None, codigo_bobina=None, metros_impresos=0.0, desperdicio=0.0, cantidad_cores=0, numero_cajas=0, proveedor_preprensa=None, estado_esperado=None):
+    """Registra el cambio de estado de un proyecto en el log, incluyendo la máquina utilizada.
+
+    Con ``estado_esperado`` (el estado que se mostró en pantalla) no se pisa el
+    cambio de otra tablet: se avisa y no se escribe nada. Devuelve True si se aplicó.
+    """
+    try:
+        transiciones.cambiar_estado(proyecto_id, nuevo_estado, username, estado_esperado=estado_esperado, maquina=maquina, responsable=responsable, observaciones=observaciones, codigo_bobina=codigo_bobina, metros_impresos=metros_impresos, desperdicio=desperdicio, cantidad_cores=cantidad_cores, numero_cajas=numero_cajas, proveedor_preprensa=proveedor_preprensa)
+    except transiciones.ConflictoEstado as e:
+        st.warning(f"⚠️ {e}")
+        return False
     st.success(f"Proyecto actualizado al estado '{nuevo_estado}'.")
+    return True
 
 def guardar_detalles_impresion(proyecto_id, detalles):
-    """Guarda la configuración de anilox y colores en formato JSON."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    # Usamos INSERT OR REPLACE para asegurar que exista el registro
-    c.execute('INSERT OR REPLACE INTO info_impresion (proyecto_id, detalles_impresion) VALUES (?, ?)', 
-              (proyecto_id, json.dumps(detalles)))
-    conn.commit()
-    conn.close()
-
-def actualizar_proyecto_info(proyecto_id, cliente, nombre, material, acabado, cantidad, fecha, prioridad, op, pedido, pos_etiqueta, n_core, cant_core, n_colores, medidas, metros_lineales, area_preprensa, troquel_existente, n_troquel, n_lamina, imagen_path, proveedor_preprensa):
-    """Actualiza la información comercial y técnica completa de un proyecto."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
+    """Guarda la configuración de anilox y colores (una fila por unidad de color, ver colores.py)."""
+    with transaccion() as conn:
+        c = conn.cursor()
+        marcar_cambio(conn)
+        eventos.registrar(c, eventos.EDICION, proyecto_id)
+        colores.guardar(c, proyecto_id, detalles)
+
+def actualizar_proyecto_info(proyecto_id, cliente, nombre, material, acabado, cantidad, fecha, prioridad, op, pedido, pos_etiqueta, n_core, cant_core, n_colores, medidas, metros_lineales, area_preprensa, troquel_existente, n_troquel, n_lamina, imagen_path, proveedor_preprensa, geo=None):
+    """Actualiza la información comercial y técnica completa de un proyecto (``geo`` como en ``agregar_proyecto``)."""
+    geo = geo or geometria.desde_texto(medidas)
+    with transaccion() as conn:
+        c = conn.cursor()
+        marcar_cambio(conn)
+        eventos.registrar(c, eventos.EDICION, proyecto_id)
+        # Si cambió el arte, se mueve la referencia del objeto anterior al nuevo
+        imagen_anterior = c.execute('SELECT imagen_path FROM proyectos WHERE id = ?', (proyecto_id,)).fetchone()
+        imagen_anterior = imagen_anterior[0] if imagen_anterior else None
+        cambio_arte = imagen_path != imagen_anterior
+        if cambio_arte:
+            almacen.liberar(conn, imagen_anterior)
+            almacen.referenciar(conn, imagen_path)
     
-    c.execute('UPDATE proyectos SET cliente=?, nombre_proyecto=?, prioridad=?, imagen_path=? WHERE id=?', (cliente, nombre, prioridad, imagen_path, proyecto_id))
+        c.execute('UPDATE proyectos SET cliente=?, nombre_proyecto=?, prioridad=?, imagen_path=?, imagen_sha256=? WHERE id=?', (cliente, nombre, prioridad, imagen_path, almacen.sha_de_ruta(imagen_path), proyecto_id))
     
-    c.execute('UPDATE info_ventas SET cliente=?, nombre_proyecto=?, numero_pedido=?, orden_produccion=?, fecha_entrega=?, cantidad_solicitada=? WHERE proyecto_id=?', 
-              (cliente, nombre, pedido, op, fecha, cantidad, proyecto_id))
+        c.execute('UPDATE info_ventas SET cliente=?, nombre_proyecto=?, numero_pedido=?, orden_produccion=?, fecha_entrega=?, cantidad_solicitada=? WHERE proyecto_id=?', 
+                  (cliente, nombre, pedido, op, fecha, cantidad, proyecto_id))
     
-    c.execute('UPDATE info_tecnica SET material=?, acabado=?, medidas=?, metros_lineales=?, posicion_etiqueta=?, numero_core=?, cantidad_por_core=? WHERE proyecto_id=?',
-              (material, acabado, medidas, metros_lineales, pos_etiqueta, n_core, cant_core, proyecto_id))
+        c.execute('UPDATE info_tecnica SET material=?, acabado=?, medidas=?, metros_lineales=?, posicion_etiqueta=?, numero_core=?, cantidad_por_core=?, ancho_mm=?, gap_ancho_mm=?, numero_cavidades=COALESCE(?, numero_cavidades), largo_mm=?, z=?, repeticiones=?, gap_avance_mm=? WHERE proyecto_id=?',
+                  (material, acabado, medidas, metros_lineales, pos_etiqueta, n_core, cant_core,
+                   geo['ancho_mm'], geo['gap_ancho_mm'], geo['cavidades'], geo['largo_mm'], geo['z'], geo['repeticiones'], geo['gap_avance_mm'], proyecto_id))
     
-    c.execute('UPDATE info_preprensa SET area_preprensa_cm2=?, numero_colores=?, proveedor_preprensa=? WHERE proyecto_id=?',
-              (area_preprensa, n_colores, proveedor_preprensa, proyecto_id))
+        c.execute('UPDATE info_preprensa SET area_preprensa_cm2=?, numero_colores=?, proveedor_preprensa=? WHERE proyecto_id=?',
+                  (area_preprensa, n_colores, proveedor_preprensa, proyecto_id))
     
-    c.execute('UPDATE info_troquel SET troquel_existente=?, numero_troquel=?, numero_lamina=? WHERE proyecto_id=?',
-              (troquel_existente, n_troquel, n_lamina, proyecto_id))
-
-    conn.commit()
-    conn.close()
+        if troquel_existente == "Si":
+            troqueles.asignar(c, proyecto_id, n_troquel, n_lamina)
+        else:
+            c.execute('UPDATE info_troquel SET troquel_existente=?, numero_troquel=?, numero_lamina=?, troquel_id=NULL WHERE proyecto_id=?',
+                      (troquel_existente, n_troquel, n_lamina, proyecto_id))
+    # El arte anterior pudo quedar sin referencias: se recolecta como al eliminar
+    if cambio_arte:
+        for sha in almacen.recolectar():
+            derivados.borrar(sha)
     st.toast(f"Proyecto {proyecto_id} actualizado correctamente.")
 
 def eliminar_proyecto(proyecto_id):
     """Elimina un proyecto y sus registros de log."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    # Borrar de tablas satélite
-    tablas = ['info_ventas', 'info_tecnica', 'info_preprensa', 'info_impresion', 'info_troquel']
-    for t in tablas:
-        c.execute(f'DELETE FROM {t} WHERE proyecto_id = ?', (proyecto_id,))
-
-    c.execute('DELETE FROM proyectos_log WHERE proyecto_id = ?', (proyecto_id,))
-    c.execute('DELETE FROM proyectos WHERE id = ?', (proyecto_id,))
-    conn.commit()
-    conn.close()
+    with transaccion() as conn:
+        c = conn.cursor()
+        marcar_cambio(conn)
+        marcar_cambio(conn, 'log_borrados')  # Invalida la base incremental de analitica.py
+        resumen_diario.descontar_proyecto(c, proyecto_id)
+        eventos.registrar(c, eventos.BAJA, proyecto_id)
+        imagen = c.execute('SELECT imagen_path FROM proyectos WHERE id = ?', (proyecto_id,)).fetchone()
+        if imagen:
+            almacen.liberar(conn, imagen[0])
+        # Borrar de tablas satélite
+        tablas = ['info_ventas', 'info_tecnica', 'info_preprensa', 'info_impresion', 'info_troquel']
+        for t in tablas:
+            c.execute(f'DELETE FROM {t} WHERE proyecto_id = ?', (proyecto_id,))
+        colores.borrar(c, proyecto_id)
+
+        c.execute('DELETE FROM proyectos_log WHERE proyecto_id = ?', (proyecto_id,))
+        c.execute('DELETE FROM proyectos WHERE id = ?', (proyecto_id,))
+    # Arte que ya no usa ningún proyecto (y sus miniaturas)
+    for sha in almacen.recolectar():
+        derivados.borrar(sha)
     st.toast(f"Proyecto {proyecto_id} eliminado.")
 
 def actualizar_troquel(proyecto_id, numero_troquel, numero_lamina):
     """Actualiza la información del troquel para un proyecto existente."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    c.execute('UPDATE info_troquel SET troquel_existente = "Si", numero_troquel = ?, numero_lamina = ? WHERE proyecto_id = ?', (numero_troquel, numero_lamina, proyecto_id))
-    conn.commit()
-    conn.close()
+    with transaccion() as conn:
+        c = conn.cursor()
+        marcar_cambio(conn)
+        eventos.registrar(c, eventos.EDICION, proyecto_id)
+        troqueles.asignar(c, proyecto_id, numero_troquel, numero_lamina)
+
+def _valor_numerico(valor, defecto):
+    """Valor de una columna numérica del proyecto, o ``defecto`` si está vacía (NaN/None)."""
+    return defecto if valor is None or pd.isna(valor) else valor
+
+def guardar_inventario_troqueles(filas):
+    """Guarda lámina, radio, vida útil y estado de los troqueles editados en Configuración."""
+    if filas.empty:
+        return
+    with transaccion() as conn:
+        marcar_cambio(conn)
+        for fila in filas.itertuples(index=False):
+            troqueles.actualizar(conn, fila.id, fila.numero_lamina, _valor_numerico(fila.radio_esquina_mm, None), _valor_numerico(fila.vida_util_metros, None), fila.activo)
+    st.toast(f"{len(filas)} troqueles actualizados.")
 
 def ver_proyectos():
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    # JOIN masivo para reconstruir la vista completa del proyecto
-    query = """
-        SELECT 
-            p.id, p.fecha_creacion, p.estado, p.imagen_path, p.prioridad, p.estado_anterior,
-            v.cliente, v.nombre_proyecto, v.numero_pedido, v.orden_produccion, v.fecha_entrega, v.cantidad_solicitada, v.logo_cliente_path,
-            t.material, t.acabado, t.medidas, t.metros_lineales, t.numero_cavidades, t.posicion_etiqueta, t.numero_core, t.cantidad_por_core,
-            pp.proveedor_preprensa, pp.area_preprensa_cm2, pp.numero_colores,
-            i.detalles_impresion,
-            tr.troquel_existente, tr.numero_troquel, tr.numero_lamina
-        FROM proyectos p
-        LEFT JOIN info_ventas v ON p.id = v.proyecto_id
-        LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
-        LEFT JOIN info_preprensa pp ON p.id = pp.proyecto_id
-        LEFT JOIN info_impresion i ON p.id = i.proyecto_id
-        LEFT JOIN info_troquel tr ON p.id = tr.proyecto_id
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    """Vista completa de los proyectos, compartida entre sesiones hasta el próximo cambio de datos."""
+    return _snapshot_proyectos(version_datos())
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _snapshot_proyectos(version):
+    # `version` solo sirve como clave de caché: cada escritura la incrementa (marcar_cambio)
+    with conexion() as conn:
+        df = pd.read_sql_query(SQL_PROYECTOS, conn)
     return df
 
+@st.cache_data(show_spinner=False, max_entries=256)
+def _pagina_proyectos(version, filtros, despues_de, limite):
+    # `filtros` llega como tupla de pares (clave, valor) para que sea hasheable
+    with conexion() as conn:
+        return listar_proyectos(conn, dict(filtros), despues_de, limite)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _total_proyectos(version, filtros):
+    with conexion() as conn:
+        return contar_proyectos(conn, dict(filtros))
+
+def ver_plan():
+    """Plan de capacidad por máquina (ver planificador.py): se rehace al cambiar los datos y cada 5 minutos."""
+    return _plan_produccion(version_datos(), int(time.time() // 300))
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _plan_produccion(version, ventana):
+    # `ventana` avanza con el reloj: lo que está en curso se descuenta aunque nadie escriba
+    with conexion() as conn:
+        return planificador.planificar(conn)
+
+def ver_secuencia():
+    """Orden de corrida propuesto por impresora (ver secuenciador.py), cacheado por versión de datos."""
+    return _secuencia_impresion(version_datos())
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _secuencia_impresion(version):
+    with conexion() as conn:
+        return secuenciador.secuenciar(conn)
+
+def ver_cola_estacion(estacion):
+    """Cola de una estación de operario (ver cola_operario.py), cacheada por versión de datos."""
+    return _cola_estacion(version_datos(), estacion)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _cola_estacion(version, estacion):
+    with conexion() as conn:
+        return cola_operario.cola_estacion(conn, *estacion)
+
+def ver_pagina_proyectos(filtros, despues_de=None, limite=20):
+    """Página filtrada del listado (ver consultas.listar_proyectos), cacheada por versión de datos."""
+    clave = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filtros.items()))
+    version = version_datos()
+    df, siguiente = _pagina_proyectos(version, clave, despues_de, limite)
+    return df, siguiente, _total_proyectos(version, clave)
+
 def ver_log_procesos(proyecto_id):
     """Obtiene el historial de procesos para un proyecto y calcula duraciones."""
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    query = """
-        SELECT pl.estado, u.username, pl.maquina_utilizada, pl.timestamp_inicio, pl.timestamp_fin,
-               pl.responsable, pl.observaciones, pl.codigo_bobina, pl.metros_impresos, pl.desperdicio,
-               pl.cantidad_cores, pl.numero_cajas
-        FROM proyectos_log pl
-        LEFT JOIN usuarios u ON pl.usuario_id = u.id
-        WHERE pl.proyecto_id = ? ORDER BY pl.timestamp_inicio
-    """
-    df = pd.read_sql_query(query, conn, params=(proyecto_id,))
-    conn.close()
+    with conexion() as conn:
+        df = logs_proyectos(conn, [proyecto_id])
 
     if df.empty: return pd.DataFrame()
 
-    df['timestamp_inicio'] = pd.to_datetime(df['timestamp_inicio'])
-    df['timestamp_fin'] = pd.to_datetime(df['timestamp_fin'])
-    
-    df['Duracion (minutos)'] = df.apply(
-        lambda row: round(((row['timestamp_fin'] if pd.notna(row['timestamp_fin']) else datetime.now()) - row['timestamp_inicio']).total_seconds() / 60, 2),
-        axis=1
-    )
-    
-    df.rename(columns={'estado': 'Estado', 'username': 'Operario', 'maquina_utilizada': 'Máquina', 'timestamp_inicio': 'Inicio', 'timestamp_fin': 'Fin'}, inplace=True)
+    df.rename(columns={'duracion_min': 'Duracion (minutos)', 'estado': 'Estado', 'username': 'Operario', 'maquina_utilizada': 'Máquina', 'timestamp_inicio': 'Inicio', 'timestamp_fin': 'Fin'}, inplace=True)
     df['Inicio'] = df['Inicio'].dt.strftime('%Y-%m-%d %H:%M:%S')
     df['Fin'] = df['Fin'].dt.strftime('%Y-%m-%d %H:%M:%S')
     return df[['Estado', 'Máquina', 'Operario', 'responsable', 'Inicio', 'Fin', 'Duracion (minutos)', 'metros_impresos', 'desperdicio', 'codigo_bobina', 'cantidad_cores', 'numero_cajas', 'observaciones']]
 
-def dibujar_montaje(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho):
-    """Genera un gráfico visual del montaje en el cilindro."""
-    # Reducimos el tamaño a la mitad aprox (antes 4,6) para que sea más compacto
-    fig, ax = plt.subplots(figsize=(2.5, 3.5))
-    
-    # Configuración del lienzo (simulando el sustrato)
-    margen_x = 2
-    ancho_contenido = (ancho * cavidades) + (gap_ancho * max(0, cavidades - 1))
-    ancho_total = ancho_contenido + (margen_x * 2)
-    
-    # Dibujar el fondo (Sustrato / Banda)
-    rect_sustrato = patches.Rectangle((0, 0), ancho_total, z_mm, linewidth=0, facecolor='#f1f5f9')
-    ax.add_patch(rect_sustrato)
-    
-    # Líneas guía del cilindro (inicio y fin de la vuelta)
-    ax.axhline(y=0, color='black', linestyle='-', linewidth=1)
-    ax.axhline(y=z_mm, color='black', linestyle='-', linewidth=1)
-    
-    paso = z_mm / repeticiones
-    
-    for i in range(int(repeticiones)):
-        y_pos = i * paso
-        for j in range(int(cavidades)):
-            x_pos = margen_x + (j * (ancho + gap_ancho))
-            
-            # Dibujar la etiqueta (Azul)
-            rect_etiqueta = patches.Rectangle((x_pos, y_pos), ancho, largo, linewidth=0.5, edgecolor='#1e40af', facecolor='#60a5fa', alpha=0.8)
-            ax.add_patch(rect_etiqueta)
-            
-            # Texto de medida solo en la primera columna para no saturar
-            if j == 0:
-                ax.text(x_pos + ancho/2, y_pos + largo/2, f"{int(largo)}", ha='center', va='center', fontsize=6, color='white', fontweight='bold')
-            
-            # Visualización del Gap (Rojo rayado) si existe
-            if gap_avance > 0.1:
-                rect_gap = patches.Rectangle((x_pos, y_pos + largo), ancho, gap_avance, linewidth=0, facecolor='#fca5a5', alpha=0.4, hatch='///')
-                ax.add_patch(rect_gap)
-
-    ax.set_xlim(0, ancho_total)
-    ax.set_ylim(0, z_mm + (z_mm * 0.05)) # Un poco de margen visual arriba
-    ax.set_title(f"Z ({z_mm:.1f}mm) x {int(cavidades)} cavs", fontsize=8)
-    ax.set_ylabel("Avance", fontsize=7)
-    ax.set_xticks([]) # Ocultar eje X para limpieza
-    ax.tick_params(axis='y', labelsize=6)
-    ax.set_aspect('equal', adjustable='box') # Mantener proporciones reales
-    ax.axis('on')
-    return fig
+# Cada cuánto revisa el listado si otra tablet cambió algo (una consulta por rango de id)
+INTERVALO_FEED_S = 5
 
 def get_local_ip():
     """Intenta obtener la IP local de la máquina para facilitar la conexión."""
@@ -463,6 +328,43 @@ def get_local_ip():
         s.close()
     return IP
 
+@st.fragment(run_every=INTERVALO_FEED_S)
+def vigilar_cambios(ids_visibles, incluir_altas=False, estados=()):
+    """Revisa el feed de eventos cada pocos segundos sin volver a ejecutar la página.
+
+    La app completa solo se relanza si cambió un proyecto visible, si con
+    ``incluir_altas`` se creó uno o si alguno pasó a uno de ``estados``; el
+    resto se resume en un aviso.
+    """
+    with conexion() as conn:
+        nuevos = eventos.posteriores(conn, st.session_state['feed_listado'])
+    if not nuevos.empty:
+        st.session_state['feed_listado'] = int(nuevos['id'].iloc[-1])
+        relevantes = nuevos['proyecto_id'].isin(ids_visibles)
+        if incluir_altas:
+            relevantes |= nuevos['tipo'] == eventos.ALTA
+        if estados:
+            relevantes |= nuevos['estado'].isin(estados)
+        if relevantes.any():
+            st.rerun(scope="app")
+        st.session_state['feed_otros'] = st.session_state.get('feed_otros', 0) + len(nuevos)
+    otros = st.session_state.get('feed_otros', 0)
+    st.caption(f"🔄 Sincronizado {datetime.now():%H:%M:%S}" + (f" · {otros} cambios en proyectos de otras páginas" if otros else ""))
+
+def _aplicar_montaje(form_key, largo, z, repeticiones, cavidades):
+    """Callback del optimizador: carga el montaje elegido en los campos del formulario."""
+    st.session_state[f"repeticiones_{form_key}"] = repeticiones
+    st.session_state[f"cavidades_{form_key}"] = cavidades
+    # La key del selector de Z incluye la Z sugerida para esas repeticiones: se recalcula igual que en el formulario
+    idx_sugerida = optimizador.z_recomendada(largo, repeticiones) or 0
+    st.session_state[f"z_sel_{form_key}_{idx_sugerida}"] = z
+
+def _usar_troquel(form_key, numero_troquel, numero_lamina):
+    """Callback del buscador de troqueles: marca el troquel existente y carga sus números."""
+    st.session_state[f"troquel_bool_{form_key}"] = True
+    st.session_state[f"num_troquel_{form_key}"] = numero_troquel
+    st.session_state[f"num_lamina_{form_key}"] = numero_lamina
+
 # --- INTERFAZ DE USUARIO (FRONTEND CON STREAMLIT) ---
 def main_app():
     """Contiene la lógica principal de la aplicación una vez que el usuario ha iniciado sesión."""
@@ -526,13 +428,8 @@ def main_app():
         st.rerun()
 
     choice = st.session_state['current_page']
-    lista_estados = ["Por aprobar", "Diseño", "Preprensa", "Impresion", "Control calidad", "Troquelado", "Despacho", "Entregado"]
-
-    maquinas_por_estado = {
-        "Impresion": ["SP1", "FIT 350", "SUPERPRINT", "MARK ANDY"],
-        "Control calidad": [f"Controladora {i+1}" for i in range(6)],
-        "Troquelado": ["Troqueladora Plana"]
-    }
+    lista_estados = planificador.ESTADOS_FLUJO
+    maquinas_por_estado = planificador.MAQUINAS_POR_ESTADO
 
     # Directorio para guardar imágenes
     if not os.path.exists("uploads"):
@@ -541,12 +438,43 @@ def main_app():
     if choice == "Nuevo Proyecto":
         st.subheader("📝 Registrar Nueva Orden")
 
-        # --- Definición de Z y cálculo de Largo ---
-        Z_PITCH_MM = 3.175  # 1/8 de pulgada en mm
-        # Usamos la lista de Zs proporcionada por el usuario
-        Z_UNITS_LIST = [63, 70, 76, 80, 82, 84, 85, 88, 90, 96, 106, 114, 120, 130]
-        Z_UNITS_MM = {z: round(z * Z_PITCH_MM, 3) for z in Z_UNITS_LIST}
-        
+        # --- IMPORTACIÓN MASIVA DE PEDIDOS (ver importacion.py) ---
+        exp_importar = st.expander("📥 Importar pedidos desde CSV / Excel", key="exp_importar", on_change="rerun")
+        if exp_importar.open:
+            with exp_importar:
+                st.caption(f"Una fila por pedido. Columnas obligatorias: {', '.join(importacion.OBLIGATORIAS)}. "
+                           "Sin Z se usa la sugerida; gap, metros y área se calculan como en el formulario. Los pedidos entran sin arte, "
+                           "en la primera etapa salvo que indiquen 'estado' (y 'maquina' en las etapas con máquinas).")
+                st.download_button("📄 Descargar plantilla", data=importacion.plantilla(), file_name="plantilla_pedidos.csv", mime="text/csv", key="plantilla_pedidos", on_click="ignore")
+                archivo_pedidos = st.file_uploader("Archivo de pedidos", type=['csv', 'xlsx'], key="archivo_pedidos")
+                if archivo_pedidos is not None:
+                    c_imp1, c_imp2, c_imp3 = st.columns(3)
+                    codificacion = c_imp1.selectbox("Codificación (CSV)", ['utf-8-sig', 'cp1252'], format_func=lambda c: "UTF-8" if c == 'utf-8-sig' else "Windows (Excel)", key="codificacion_pedidos")
+                    solo_validar = c_imp2.button("🔍 Solo validar", key="validar_pedidos")
+                    importar_pedidos = c_imp3.button("📥 Importar", key="importar_pedidos", type="primary")
+                    if importar_pedidos and st.session_state.get('pedidos_importados') == archivo_pedidos.file_id:
+                        st.warning("Este archivo ya se importó en esta sesión.")
+                    elif solo_validar or importar_pedidos:
+                        archivo_pedidos.seek(0)
+                        try:
+                            resumen = importacion.importar(archivo_pedidos, username, nombre=archivo_pedidos.name, simular=solo_validar, codificacion=codificacion)
+                        except ValueError as e:
+                            st.error(f"No se pudo leer el archivo: {e}")
+                        else:
+                            if solo_validar:
+                                st.info(f"{resumen['validas']} de {resumen['leidas']} filas son válidas (no se guardó nada).")
+                            else:
+                                st.session_state['pedidos_importados'] = archivo_pedidos.file_id
+                                st.success(f"✅ {resumen['importadas']} pedidos importados en {resumen['segundos']:.1f} s.")
+                            if not resumen['errores'].empty:
+                                st.warning(f"{resumen['errores']['fila'].nunique()} filas con errores no se importan:")
+                                st.dataframe(resumen['errores'], hide_index=True, use_container_width=True)
+                                st.download_button("Descargar errores", data=resumen['errores'].to_csv(index=False).encode('utf-8'), file_name="errores_importacion.csv",
+                                                   mime="text/csv", key="errores_pedidos", on_click="ignore")
+
+        # Las Z disponibles (Z_UNITS_LIST) están en optimizador.py; las fórmulas del montaje, en geometria.py
+        form_key = st.session_state['form_key']
+
         # --- SECCIÓN 1: INFORMACIÓN GENERAL ---
         with st.container(border=True):
             st.markdown("##### 📋 Información General del Pedido")
@@ -593,36 +521,31 @@ def main_app():
                 st.subheader("Dimensiones y Desarrollo")
                 ancho = st.number_input("Ancho (cavidad) (mm)", min_value=1.0, step=1.0, format="%.2f", key=f"ancho_{st.session_state['form_key']}")
                 gap_ancho = st.number_input("Gap al Ancho (mm)", min_value=0.0, step=0.1, format="%.2f", key=f"gap_ancho_{st.session_state['form_key']}")
-                cavidades = st.number_input("Cavidades al Ancho", min_value=1, step=1, value=1, key=f"cavidades_{st.session_state['form_key']}")
+                cavidades = st.number_input("Cavidades al Ancho", min_value=1, step=1, key=f"cavidades_{st.session_state['form_key']}")
                 largo = st.number_input("Largo (avance) (mm)", min_value=1.0, step=1.0, format="%.2f", key=f"largo_{st.session_state['form_key']}")
-                repeticiones = st.number_input("Número de Repeticiones", min_value=1, step=1, value=1, key=f"repeticiones_{st.session_state['form_key']}")
+                repeticiones = st.number_input("Número de Repeticiones", min_value=1, step=1, key=f"repeticiones_{st.session_state['form_key']}")
                 
                 # --- Lógica de Recomendación de Z ---
                 best_z_index = 0
                 recomendacion_info = ""
                 if largo > 0 and repeticiones > 0:
                     # Buscar la Z que ofrezca el menor desperdicio (Gap) pero que sea viable (Gap >= 2mm)
-                    posibles_z = []
-                    for idx, z in enumerate(Z_UNITS_LIST):
-                        circ = Z_UNITS_MM[z]
-                        gap_calc = (circ / repeticiones) - largo
-                        if gap_calc >= 2.0: # Margen mínimo de seguridad de 2mm
-                            posibles_z.append((gap_calc, idx, z))
-                    
-                    if posibles_z:
-                        posibles_z.sort() # Ordenar por menor gap (el primero es el más eficiente)
-                        best_z_index = posibles_z[0][1]
-                        recomendacion_info = f" | ⭐ Sugerido: Z{posibles_z[0][2]}"
-
+                    idx_sugerida = optimizador.z_recomendada(largo, repeticiones)
+                    if idx_sugerida is not None:
+                        best_z_index = idx_sugerida
+                        recomendacion_info = f" | ⭐ Sugerido: Z{Z_UNITS_LIST[idx_sugerida]}"
+
+                # El valor inicial va por session_state (sin index=): _aplicar_montaje también escribe esta key
+                key_z = f"z_sel_{st.session_state['form_key']}_{best_z_index}"
+                st.session_state.setdefault(key_z, Z_UNITS_LIST[best_z_index])
                 z_seleccionada = st.selectbox(
                     f"Unidad de Impresión (Z){recomendacion_info}",
                     options=Z_UNITS_LIST,
-                    index=best_z_index,
                     help="La 'Z' corresponde al número de dientes del engranaje del cilindro (1Z = 1/8 pulgada).",
-                    key=f"z_sel_{st.session_state['form_key']}_{best_z_index}"
+                    key=key_z
                 )
 
-                # --- Cálculos automáticos ---
+                # --- Cálculos automáticos (fórmulas en geometria.py) ---
                 gap = 0.0
                 metros_lineales = 0.0
                 area_preprensa_cm2 = 0.0
@@ -631,25 +554,13 @@ def main_app():
                 largo_montaje_mm = 0.0
 
                 if z_seleccionada and largo > 0 and repeticiones > 0:
-                    circunferencia_mm = Z_UNITS_MM[z_seleccionada]
-                    gap = (circunferencia_mm / repeticiones) - largo
-                    
-                    # Cálculo de metros lineales
-                    if cantidad_solicitada > 0 and repeticiones > 0:
-                        # Cada revolución del cilindro usa `circunferencia_mm` de material y produce `repeticiones` etiquetas.
-                        # Por tanto, la longitud de material por etiqueta es (circunferencia_mm / repeticiones).
-                        longitud_total_mm = cantidad_solicitada * (circunferencia_mm / repeticiones)
-                        metros_lineales = longitud_total_mm / 1000
-                    
-                    # Cálculo de Área de Preprensa (cm²)
-                    # Ancho Montaje (mm) = (ancho * cavidades) + gaps
-                    ancho_montaje_mm = (ancho * cavidades) + (gap_ancho * max(0, cavidades - 1))
-                    # Largo Montaje (mm) = circunferencia Z
+                    calculo = geometria.calcular(ancho, gap_ancho, cavidades, largo, z_seleccionada, repeticiones, cantidad_solicitada, numero_colores)
+                    circunferencia_mm = float(calculo['circunferencia_mm'])
+                    gap = float(calculo['gap_avance_mm'])
+                    metros_lineales = float(calculo['metros_lineales'])
+                    ancho_montaje_mm = float(calculo['ancho_montaje_mm'])
                     largo_montaje_mm = circunferencia_mm
-                    
-                    # Fórmula: ((Ancho cm + 4) * (Largo cm + 2)) * numero_colores
-                    area_placa_base = ((ancho_montaje_mm / 10) + 4) * ((largo_montaje_mm / 10) + 2)
-                    area_preprensa_cm2 = area_placa_base * numero_colores
+                    area_preprensa_cm2 = float(calculo['area_preprensa_cm2'])
 
                 st.text_input("Gap de Avance (mm)", value=f"{gap:.2f}", disabled=True, help="Separación vertical entre etiquetas. Se calcula: (Circunferencia Z / Repeticiones) - Largo.")
                 st.text_input("Metros Lineales Estimados", value=f"{metros_lineales:.2f}", disabled=True, help="Longitud total de material requerida para la cantidad solicitada.")
@@ -658,6 +569,20 @@ def main_app():
                 breakdown_msg = f"Ancho: ({ancho_montaje_mm/10:.2f}cm [incluye gaps] + 4) x Largo: ({largo_montaje_mm/10:.2f}cm + 2) x {numero_colores} col" if area_preprensa_cm2 > 0 else "Ingrese medidas..."
                 # Usamos el valor calculado en la key para forzar la actualización si cambian los inputs
                 area_preprensa_final = st.number_input("Área Plancha Total (cm²)", value=float(f"{area_preprensa_cm2:.2f}"), step=10.0, help=breakdown_msg, key=f"area_{st.session_state['form_key']}_{area_preprensa_cm2}")
+
+                # --- Optimizador de montaje (frontera de Pareto) ---
+                exp_optimizador = st.expander("🧮 Optimizar montaje (Z × repeticiones × cavidades)", key=f"exp_optimizador_{form_key}", on_change="rerun")
+                if exp_optimizador.open:
+                    with exp_optimizador:
+                        opciones_montaje = optimizador.optimizar(ancho, largo, cantidad_solicitada, numero_colores, gap_ancho, maquinas=maquinas_por_estado["Impresion"])
+                        if opciones_montaje.empty:
+                            st.info("Ningún montaje cabe en las impresoras con un gap de avance de al menos 2 mm.")
+                        else:
+                            st.caption("Montajes no dominados en metros lineales, área de plancha y desperdicio, del más equilibrado al menos.")
+                            st.dataframe(opciones_montaje.head(15), hide_index=True, use_container_width=True)
+                            fila_montaje = st.selectbox("Montaje", range(min(15, len(opciones_montaje))), format_func=lambda i: f"Z{opciones_montaje.at[i, 'z']} · {opciones_montaje.at[i, 'repeticiones']} reps · {opciones_montaje.at[i, 'cavidades']} cavs", key=f"montaje_sel_{form_key}")
+                            elegido = opciones_montaje.loc[fila_montaje]
+                            st.button("Aplicar montaje", key=f"aplicar_montaje_{form_key}", on_click=_aplicar_montaje, args=(form_key, largo, int(elegido['z']), int(elegido['repeticiones']), int(elegido['cavidades'])))
             
             with col_ing2:
                 estado = st.selectbox("Estado Inicial", lista_estados, key=f"estado_ini_{st.session_state['form_key']}")
@@ -665,33 +590,59 @@ def main_app():
                 # --- VISUALIZACIÓN DEL MONTAJE (Movid a la derecha y reducido) ---
                 if z_seleccionada and largo > 0 and repeticiones > 0:
                     st.markdown("---")
-                    fig = dibujar_montaje(ancho, largo, gap, repeticiones, circunferencia_mm, cavidades, gap_ancho)
-                    st.pyplot(fig, use_container_width=False)
+                    st.image(dibujar_montaje(ancho, largo, gap, repeticiones, circunferencia_mm, cavidades, gap_ancho))
+
+                # --- TROQUELES DEL INVENTARIO QUE SIRVEN (ver troqueles.py) ---
+                if ancho > 0 and largo > 0:
+                    st.markdown("---")
+                    radio_esquina = st.number_input("Radio de esquina (mm)", min_value=0.0, step=0.5, format="%.1f", help="Solo para buscar troqueles; 0 = cualquiera.", key=f"radio_{form_key}")
+                    with conexion() as conn:
+                        compatibles = troqueles.compatibles(conn, ancho, largo, cavidades, radio_esquina_mm=radio_esquina)
+                    if compatibles.empty:
+                        st.caption(f"Ningún troquel activo para {ancho:g} x {largo:g} mm y {cavidades} cavs (±{troqueles.TOLERANCIA_MM:g} mm).")
+                    else:
+                        st.caption(f"🔎 Troqueles que sirven (±{troqueles.TOLERANCIA_MM:g} mm)")
+                        st.dataframe(compatibles[['numero_troquel', 'numero_lamina', 'ancho_mm', 'largo_mm', 'usos', 'desgaste_pct']], hide_index=True, use_container_width=True)
+                        fila_troquel = st.selectbox("Troquel", range(len(compatibles)), format_func=lambda i: compatibles.at[i, 'numero_troquel'], key=f"troquel_sel_{form_key}")
+                        st.button("Usar este troquel", key=f"usar_troquel_{form_key}", on_click=_usar_troquel,
+                                  args=(form_key, compatibles.at[fila_troquel, 'numero_troquel'], compatibles.at[fila_troquel, 'numero_lamina'] or ""))
 
         uploaded_file = st.file_uploader("Cargar Arte / Imagen de referencia (PDF, JPG, PNG)", type=['png', 'jpg', 'jpeg', 'pdf'], key=f"file_{st.session_state['form_key']}")
         
+        ruta_subida = None
         if uploaded_file is not None:
             st.markdown("### 🖼️ Previsualización del Arte")
-            if uploaded_file.name.lower().endswith('.pdf'):
-                base64_pdf = base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
-                pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="500" type="application/pdf"></iframe>'
-                st.markdown(pdf_display, unsafe_allow_html=True)
+            # El archivo va al almacén una sola vez por subida, no en cada rerun del formulario.
+            # Si el formulario se abandona, el objeto queda sin referencias y lo recolecta almacen.recolectar().
+            subida = st.session_state.get('arte_subido')
+            if not subida or subida[0] != uploaded_file.file_id:
+                subida = st.session_state['arte_subido'] = (uploaded_file.file_id, almacen.guardar(uploaded_file))
+            ruta_subida = subida[1]
+            # La vista previa es un raster cacheado servido por URL, no el archivo incrustado en la página
+            vista_previa = derivados.ruta_derivado(ruta_subida, 'vista')
+            if derivados.es_pdf(ruta_subida):
+                if vista_previa:
+                    st.image(vista_previa, caption=f"Página 1 de {derivados.paginas_pdf(ruta_subida) or '?'}", use_container_width=True)
+                else:
+                    st.info("Vista previa de PDF no disponible en este servidor.")
+                st.download_button("📄 Ver PDF completo", data=lambda ruta=ruta_subida: derivados.leer_original(ruta), file_name=uploaded_file.name, mime="application/pdf", key="pdf_subido", on_click="ignore")
             else:
-                st.image(uploaded_file, caption="Arte cargado", use_container_width=True)
+                st.image(vista_previa or ruta_subida, caption="Arte cargado", use_container_width=True)
 
         if st.button("Guardar Proyecto"):
             if cliente and nombre and ancho > 0 and largo > 0 and uploaded_file is not None:
-                # Formateamos las medidas en un solo string para guardarlo
-                medidas = f"Ancho: {ancho}mm (Gap: {gap_ancho}mm) x {cavidades} cavs, Largo: {largo}mm | Z{z_seleccionada}, {repeticiones} reps, Gap Avance: {gap:.2f}mm"
+                # La geometría va en columnas numéricas; `medidas` queda como descripción legible
+                geo = {'ancho_mm': ancho, 'gap_ancho_mm': gap_ancho, 'cavidades': cavidades, 'largo_mm': largo,
+                       'z': z_seleccionada, 'repeticiones': repeticiones, 'gap_avance_mm': round(gap, 2)}
+                medidas = geometria.formatear(**geo)
                 
-                imagen_path = None
-                # Guardar la imagen (ya validamos que existe)
-                imagen_path = os.path.join("uploads", uploaded_file.name)
-                with open(imagen_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                # Ya está en el almacén desde la vista previa; guardar de nuevo no duplica nada y
+                # renueva su margen de gracia por si el formulario estuvo abierto mucho tiempo
+                imagen_path = almacen.guardar(uploaded_file)
+                derivados.generar(imagen_path)
                 
                 fecha_creacion = datetime.now()
-                agregar_proyecto(cliente, nombre, material, acabado, medidas, fecha, estado, username, imagen_path, cantidad_solicitada, metros_lineales, numero_pedido, orden_produccion, cavidades, fecha_creacion, posicion_etiqueta, cantidad_por_core, numero_core, area_preprensa_final, numero_colores, prioridad, None, troquel_existente, numero_troquel, numero_lamina)
+                agregar_proyecto(cliente, nombre, material, acabado, medidas, fecha, estado, username, imagen_path, cantidad_solicitada, metros_lineales, numero_pedido, orden_produccion, cavidades, fecha_creacion, posicion_etiqueta, cantidad_por_core, numero_core, area_preprensa_final, numero_colores, prioridad, None, troquel_existente, numero_troquel, numero_lamina, geo)
                 st.session_state['form_key'] += 1
                 st.rerun()
             else:
@@ -702,12 +653,77 @@ def main_app():
 
     elif choice == "Ver Listado":
         st.subheader("📋 Gestión de Proyectos y Estados")
-        df_proyectos = ver_proyectos()
+
+        # Operarios de una estación: por defecto ven solo su cola (ver cola_operario.py)
+        estacion = cola_operario.estacion_de(username) if get_user_role(username) == 'operario' else None
+        modo_cola = estacion is not None and st.toggle(f"🧰 Mi cola: {cola_operario.describir(estacion)}", value=True, key="modo_cola")
+
+        # El cursor del feed se toma antes que los datos: nada de lo que se muestra es posterior a él
+        with conexion() as conn:
+            st.session_state['feed_listado'] = eventos.ultimo_id(conn)
+        st.session_state['feed_otros'] = 0
+        if modo_cola:
+            df_proyectos = ver_cola_estacion(estacion)
+            siguiente_cursor, total_filtrados, filtros = None, len(df_proyectos), {}
+            # A la cola también entra lo que llega a la etapa anterior o a la propia
+            indice_estacion = lista_estados.index(estacion[0])
+            vigilar_cambios(set(df_proyectos['id']), estados=tuple(lista_estados[max(indice_estacion - 1, 0):indice_estacion + 1]))
+        else:
+            # --- FILTROS (SE APLICAN EN SQL; SOLO SE CARGA LA PÁGINA VISIBLE) ---
+            todas_maquinas = [m for maquinas in maquinas_por_estado.values() for m in maquinas]
+            with st.expander("🔎 Filtros y Búsqueda"):
+                f1, f2, f3 = st.columns(3)
+                f_activos = f1.toggle("Solo activos (ocultar Entregado)", value=True, key="f_activos",
+                                      disabled=bool(st.session_state.get('f_estados')), help="No aplica si se eligen estados")
+                f_estados = f2.multiselect("Estado", lista_estados + ["Pausado"], key="f_estados")
+                f_prioridades = f3.multiselect("Prioridad", ["Normal", "Alta", "Urgente"], key="f_prioridades")
+                f4, f5, f6 = st.columns(3)
+                f_cliente = f4.text_input("Cliente", key="f_cliente")
+                f_op = f5.text_input("Orden de Producción (OP)", key="f_op")
+                f_maquina = f6.selectbox("Máquina (proceso en curso)", ["Todas"] + todas_maquinas, key="f_maquina")
+                f7, f8 = st.columns([2, 1])
+                f_entrega = f7.date_input("Ventana de Entrega (desde - hasta)", value=(), key="f_entrega")
+                f_limite = f8.selectbox("Proyectos por página", [10, 20, 50], index=1, key="f_limite")
+                f9, f10 = st.columns(2)
+                f_anilox = f9.selectbox("Anilox (alguna unidad de color)", ["Todos"] + colores.ANILOX_OPCIONES, key="f_anilox")
+                f_color = f10.text_input("Código de color", key="f_color", placeholder="Ej. P-185C")
+
+            filtros = {
+                'solo_activos': f_activos,
+                'estados': f_estados,
+                'prioridades': f_prioridades,
+                'cliente': f_cliente.strip(),
+                'op': f_op.strip(),
+                'maquina': f_maquina if f_maquina != "Todas" else None,
+                'entrega_desde': f_entrega[0] if len(f_entrega) > 0 else None,
+                'entrega_hasta': f_entrega[1] if len(f_entrega) > 1 else None,
+                'anilox': f_anilox if f_anilox != "Todos" else None,
+                'codigo_color': f_color.strip(),
+            }
+            # Paginación por clave: pila con el cursor de inicio de cada página visitada
+            if st.session_state.get('listado_filtros') != (filtros, f_limite):
+                st.session_state['listado_filtros'] = (filtros, f_limite)
+                st.session_state['listado_cursores'] = [None]
+            cursores = st.session_state['listado_cursores']
+
+            df_proyectos, siguiente_cursor, total_filtrados = ver_pagina_proyectos(filtros, cursores[-1], f_limite)
+            # Los proyectos nuevos (id mayor) aparecen en la última página
+            vigilar_cambios(set(df_proyectos['id']), incluir_altas=siguiente_cursor is None)
+
         if df_proyectos.empty:
-            st.info("No hay proyectos registrados todavía.")
+            if modo_cola:
+                st.info("No hay trabajos en curso ni por llegar a tu estación.")
+            elif total_filtrados == 0 and not any(v for k, v in filtros.items() if k != 'solo_activos'):
+                st.info("No hay proyectos registrados todavía.")
+            else:
+                st.info("Ningún proyecto coincide con los filtros seleccionados.")
         else:
             # Obtener rol del usuario actual
             user_role = get_user_role(username)
+            plan_proyectos, _ = ver_plan()
+            en_riesgo = set(plan_proyectos.loc[plan_proyectos['en_riesgo'], 'id'])
+            # Los pedidos importados en bloque no tienen arte: None en lugar de NaN
+            df_proyectos = df_proyectos.assign(imagen_path=df_proyectos['imagen_path'].astype(object).where(df_proyectos['imagen_path'].notna(), None))
 
             for index, proyecto in df_proyectos.iterrows():
                 # --- Lógica de Alerta de Fecha ---
@@ -721,11 +737,20 @@ def main_app():
                             alerta_entrega = "🚨 "
                     except:
                         pass
+                # Según el plan de capacidad no llega a la fecha de entrega
+                if proyecto['id'] in en_riesgo:
+                    alerta_entrega += "⏳ "
 
+                # En modo cola: qué está en la máquina, qué está pausado y qué viene
+                posicion_icon = {cola_operario.EN_CURSO: "▶️ ", cola_operario.PAUSADO: "⏸️ ", cola_operario.SIGUIENTE: "⏭️ "}.get(proyecto.get('posicion'), "")
                 prioridad_icon = {"Alta": "🔴", "Urgente": "🔥", "Normal": "🟢"}.get(proyecto.get('prioridad', 'Normal'), "⚪")
                 op_display = f"OP: {proyecto['orden_produccion']} | " if proyecto['orden_produccion'] else ""
                 
-                with st.expander(f"{prioridad_icon} {alerta_entrega}{op_display}Cliente: {proyecto['cliente']} | {proyecto['nombre_proyecto']} | Estado: {proyecto['estado']}"):
+                # Expander "perezoso": los formularios solo se construyen cuando el proyecto está abierto
+                expander = st.expander(f"{posicion_icon}{prioridad_icon} {alerta_entrega}{op_display}Cliente: {proyecto['cliente']} | {proyecto['nombre_proyecto']} | Estado: {proyecto['estado']}", key=f"exp_{proyecto['id']}", on_change="rerun")
+                if not expander.open:
+                    continue
+                with expander:
                     
                     ver_imagen_grande = False
                     col1, col2 = st.columns([3, 1])
@@ -745,6 +770,14 @@ def main_app():
 
                         # --- GESTIÓN DE TROQUEL (EDICIÓN) ---
                         with st.expander("🛠️ Asignar / Editar Troquel"):
+                            if pd.notna(proyecto['ancho_mm']) and pd.notna(proyecto['largo_mm']):
+                                with conexion() as conn:
+                                    compatibles = troqueles.compatibles(conn, proyecto['ancho_mm'], proyecto['largo_mm'], _valor_numerico(proyecto['numero_cavidades'], None))
+                                if compatibles.empty:
+                                    st.caption(f"Ningún troquel activo para {proyecto['ancho_mm']:g} x {proyecto['largo_mm']:g} mm (±{troqueles.TOLERANCIA_MM:g} mm).")
+                                else:
+                                    st.caption("🔎 Troqueles del inventario que sirven para estas medidas")
+                                    st.dataframe(compatibles[['numero_troquel', 'numero_lamina', 'ancho_mm', 'largo_mm', 'cavidades', 'usos', 'desgaste_pct']], hide_index=True, use_container_width=True)
                             c_t1, c_t2, c_t3 = st.columns([2, 2, 1])
                             n_troquel = c_t1.text_input("N° Troquel", value=proyecto['numero_troquel'] if proyecto['numero_troquel'] else "", key=f"nt_{proyecto['id']}")
                             n_lamina = c_t2.text_input("N° Lámina", value=proyecto['numero_lamina'] if proyecto['numero_lamina'] else "", key=f"nl_{proyecto['id']}")
@@ -762,12 +795,8 @@ def main_app():
                         if proyecto['numero_colores'] and proyecto['numero_colores'] > 0:
                             with st.expander("🎨 Configuración de Colores y Anilox", expanded=False):
                                 # Cargar detalles existentes
-                                detalles_actuales = []
-                                if proyecto['detalles_impresion']:
-                                    try:
-                                        detalles_actuales = json.loads(proyecto['detalles_impresion'])
-                                    except:
-                                        pass
+                                with conexion() as conn:
+                                    detalles_actuales = colores.cargar(conn, [proyecto['id']]).get(proyecto['id'], [])
                                 
                                 # Rellenar lista si faltan datos
                                 while len(detalles_actuales) < proyecto['numero_colores']:
@@ -775,8 +804,8 @@ def main_app():
                                 
                                 with st.form(key=f"form_anilox_{proyecto['id']}"):
                                     nuevos_detalles = []
-                                    anilox_opts = ["XS", "S", "M", "L", "348", "440", "813", "914", "100", "711", "356", "559"]
-                                    tipo_opts = ["Policromía", "Pantone"]
+                                    anilox_opts = colores.ANILOX_OPCIONES
+                                    tipo_opts = colores.TIPOS_COLOR
 
                                     for i in range(proyecto['numero_colores']):
                                         st.markdown(f"**Unidad de Color {i+1}**")
@@ -807,20 +836,21 @@ def main_app():
                             if proyecto['estado'] == "Pausado":
                                 st.warning(f"⚠️ **PROYECTO PAUSADO** (Estado previo: {proyecto['estado_anterior']})")
                                 if st.button("▶️ REANUDAR OPERACIÓN", key=f"reanudar_{proyecto['id']}", type="primary"):
-                                    estado_previo = proyecto['estado_anterior'] if proyecto['estado_anterior'] else "Impresion"
-                                    cambiar_estado_proyecto(proyecto['id'], estado_previo, username, maquina="Reanudado")
-                                    st.rerun()
+                                    try:
+                                        transiciones.reanudar(proyecto['id'], username)
+                                        st.rerun()
+                                    except transiciones.ConflictoEstado as e:
+                                        st.warning(f"⚠️ {e}")
                             else:
                                 c_pause1, c_pause2 = st.columns([3, 1])
                                 motivo_pausa = c_pause1.selectbox("Motivo de Pausa", ["Desayuno", "Almuerzo", "Cena", "Fin de Turno", "Mantenimiento", "Otro"], key=f"motivo_{proyecto['id']}")
                                 if c_pause2.button("⏸️ PAUSAR", key=f"pausar_{proyecto['id']}"):
-                                    # Guardar estado actual antes de pausar
-                                    conn = sqlite3.connect('produccion.db', timeout=30)
-                                    conn.execute('UPDATE proyectos SET estado_anterior = ? WHERE id = ?', (proyecto['estado'], proyecto['id']))
-                                    conn.commit()
-                                    conn.close()
-                                    cambiar_estado_proyecto(proyecto['id'], "Pausado", username, maquina=f"Motivo: {motivo_pausa}")
-                                    st.rerun()
+                                    # Guarda el estado actual y pausa en una sola transacción
+                                    try:
+                                        transiciones.pausar(proyecto['id'], username, motivo_pausa, estado_esperado=proyecto['estado'])
+                                        st.rerun()
+                                    except transiciones.ConflictoEstado as e:
+                                        st.warning(f"⚠️ {e}")
                             st.markdown("---")
 
                         current_estado_index = -1
@@ -898,31 +928,43 @@ def main_app():
                             
 
                             if st.button("Avanzar Estado", key=f"avanzar_{proyecto['id']}"):
-                                cambiar_estado_proyecto(proyecto['id'], nuevo_estado, username, maquina=maquina_seleccionada, responsable=responsable, observaciones=observaciones, codigo_bobina=codigo_bobina, metros_impresos=metros_impresos, desperdicio=desperdicio, cantidad_cores=cantidad_cores, numero_cajas=numero_cajas, proveedor_preprensa=proveedor_preprensa)
-                                st.rerun()
+                                if cambiar_estado_proyecto(proyecto['id'], nuevo_estado, username, maquina=maquina_seleccionada, responsable=responsable, observaciones=observaciones, codigo_bobina=codigo_bobina, metros_impresos=metros_impresos, desperdicio=desperdicio, cantidad_cores=cantidad_cores, numero_cajas=numero_cajas, proveedor_preprensa=proveedor_preprensa, estado_esperado=proyecto['estado']):
+                                    st.rerun()
 
                         elif current_estado_index == len(lista_estados) - 1:
                             st.success("Este proyecto ha sido entregado y completado.")
                     
                     with col2:
                         if proyecto['imagen_path'] and os.path.exists(proyecto['imagen_path']):
-                            if proyecto['imagen_path'].lower().endswith('.pdf'):
-                                with open(proyecto['imagen_path'], "rb") as f:
-                                    pdf_data = f.read()
-                                st.download_button("📄 Ver/Descargar PDF", data=pdf_data, file_name=os.path.basename(proyecto['imagen_path']), mime="application/pdf", key=f"pdf_{proyecto['id']}")
+                            ruta_arte = proyecto['imagen_path']
+                            miniatura = derivados.ruta_derivado(ruta_arte, 'miniatura')
+                            if derivados.es_pdf(ruta_arte):
+                                if miniatura:
+                                    st.image(miniatura, width=150)
+                                    ver_imagen_grande = st.checkbox("🔍 Ampliar", key=f"zoom_{proyecto['id']}")
+                                # El PDF se lee recién al hacer clic (descarga diferida), no en cada rerun
+                                st.download_button("📄 Ver/Descargar PDF", data=lambda ruta=ruta_arte: derivados.leer_original(ruta), file_name=almacen.nombre_original(ruta_arte), mime="application/pdf", key=f"pdf_{proyecto['id']}", on_click="ignore")
                             else:
-                                st.image(proyecto['imagen_path'], width=150)
+                                st.image(miniatura or ruta_arte, width=150)
                                 ver_imagen_grande = st.checkbox("🔍 Ampliar", key=f"zoom_{proyecto['id']}")
                         else:
                             st.info("Sin imagen")
                     
-                    if ver_imagen_grande and proyecto['imagen_path'] and not proyecto['imagen_path'].lower().endswith('.pdf'):
-                        st.image(proyecto['imagen_path'], caption=f"Arte Ampliado: {proyecto['nombre_proyecto']}", use_container_width=True)
+                    if ver_imagen_grande:
+                        ruta_arte = proyecto['imagen_path']
+                        st.image(derivados.ruta_derivado(ruta_arte, 'vista') or ruta_arte, caption=f"Arte Ampliado: {proyecto['nombre_proyecto']}", use_container_width=True)
+                        if not derivados.es_pdf(ruta_arte):  # Los PDF ya tienen su botón de descarga
+                            st.download_button("⬇️ Descargar original", data=lambda ruta=ruta_arte: derivados.leer_original(ruta), file_name=almacen.nombre_original(ruta_arte), key=f"orig_{proyecto['id']}", on_click="ignore")
 
                     # --- SECCIÓN DE EDICIÓN (SOLO ADMIN Y VENTAS) ---
                     if user_role in ['admin', 'ventas']:
                         st.markdown("---")
                         with st.expander(f"✏️ Editar Datos del Pedido (Solo {user_role.capitalize()})"):
+                            # Montaje guardado (columnas de geometría, ver geometria.py)
+                            tiene_geometria = all(pd.notna(proyecto[k]) for k in ('ancho_mm', 'largo_mm', 'z', 'repeticiones'))
+                            if tiene_geometria:
+                                calculo_actual = geometria.calcular(proyecto['ancho_mm'], _valor_numerico(proyecto['gap_ancho_mm'], 0.0), _valor_numerico(proyecto['numero_cavidades'], 1), proyecto['largo_mm'], proyecto['z'], proyecto['repeticiones'])
+                                st.image(dibujar_montaje(proyecto['ancho_mm'], proyecto['largo_mm'], float(calculo_actual['gap_avance_mm']), int(proyecto['repeticiones']), float(calculo_actual['circunferencia_mm']), int(_valor_numerico(proyecto['numero_cavidades'], 1)), _valor_numerico(proyecto['gap_ancho_mm'], 0.0)), width=300)
                             with st.form(key=f"edit_form_{proyecto['id']}"):
                                 c1, c2, c3 = st.columns(3)
                                 new_cliente = c1.text_input("Cliente", value=proyecto['cliente'])
@@ -952,8 +994,21 @@ def main_app():
 
                                 # --- NUEVOS CAMPOS TÉCNICOS ---
                                 st.markdown("##### 📏 Medidas y Datos Técnicos")
+                                g1, g2, g3 = st.columns(3)
+                                new_ancho = g1.number_input("Ancho (cavidad) (mm)", min_value=0.0, step=1.0, format="%.2f", value=float(_valor_numerico(proyecto['ancho_mm'], 0.0)))
+                                new_gap_ancho = g2.number_input("Gap al Ancho (mm)", min_value=0.0, step=0.1, format="%.2f", value=float(_valor_numerico(proyecto['gap_ancho_mm'], 0.0)))
+                                new_cavidades = g3.number_input("Cavidades al Ancho", min_value=1, step=1, value=int(_valor_numerico(proyecto['numero_cavidades'], 1)))
+                                g4, g5, g6 = st.columns(3)
+                                new_largo = g4.number_input("Largo (avance) (mm)", min_value=0.0, step=1.0, format="%.2f", value=float(_valor_numerico(proyecto['largo_mm'], 0.0)))
+                                z_actual = int(_valor_numerico(proyecto['z'], 0))
+                                new_z = g5.selectbox("Unidad de Impresión (Z)", Z_UNITS_LIST, index=Z_UNITS_LIST.index(z_actual) if z_actual in Z_UNITS_LIST else 0)
+                                new_repeticiones = g6.number_input("Número de Repeticiones", min_value=1, step=1, value=int(_valor_numerico(proyecto['repeticiones'], 1)))
+                                new_medidas = proyecto['medidas']
+                                if not tiene_geometria:
+                                    # Proyecto viejo cuyo texto no se pudo interpretar: se conserva hasta que se carguen las medidas
+                                    new_medidas = st.text_input("Descripción de Medidas (texto anterior)", value=proyecto['medidas'])
                                 c14, c15 = st.columns([3, 1])
-                                new_medidas = c14.text_input("Descripción de Medidas", value=proyecto['medidas'])
+                                recalcular = c14.checkbox("Recalcular metros lineales y área de plancha con estas medidas", value=tiene_geometria)
                                 new_metros = c15.number_input("Metros Lineales", value=proyecto['metros_lineales'])
                                 
                                 c16, c17, c18, c19 = st.columns(4)
@@ -973,19 +1028,26 @@ def main_app():
                                 if not proyecto['imagen_path']:
                                     st.warning("⚠️ Este proyecto no tiene imagen. Sube una para completar el registro.")
                                 else:
-                                    st.caption(f"Archivo actual: {os.path.basename(proyecto['imagen_path'])}")
+                                    st.caption(f"Archivo actual: {almacen.nombre_original(proyecto['imagen_path'])}")
                                 new_uploaded_file = st.file_uploader("Cargar/Reemplazar Imagen (PDF, JPG, PNG)", type=['png', 'jpg', 'jpeg', 'pdf'], key=f"up_edit_{proyecto['id']}")
 
                                 if st.form_submit_button("💾 Guardar Cambios"):
                                     final_imagen_path = proyecto['imagen_path']
                                     if new_uploaded_file is not None:
-                                        if not os.path.exists("uploads"):
-                                            os.makedirs("uploads")
-                                        final_imagen_path = os.path.join("uploads", new_uploaded_file.name)
-                                        with open(final_imagen_path, "wb") as f:
-                                            f.write(new_uploaded_file.getbuffer())
+                                        final_imagen_path = almacen.guardar(new_uploaded_file)
+                                        derivados.generar(final_imagen_path)
                                     
-                                    actualizar_proyecto_info(proyecto['id'], new_cliente, new_nombre, new_material, new_acabado, new_cantidad, new_fecha, new_prioridad, new_op, new_pedido, new_pos, new_core, new_cant_core, new_colores, new_medidas, new_metros, new_area, new_troquel_existente, new_n_troquel, new_n_lamina, final_imagen_path, new_proveedor_preprensa)
+                                    geo = None
+                                    if new_ancho > 0 and new_largo > 0:
+                                        calculo = geometria.calcular(new_ancho, new_gap_ancho, new_cavidades, new_largo, new_z, new_repeticiones, new_cantidad, new_colores)
+                                        geo = {'ancho_mm': new_ancho, 'gap_ancho_mm': new_gap_ancho, 'cavidades': new_cavidades, 'largo_mm': new_largo,
+                                               'z': new_z, 'repeticiones': new_repeticiones, 'gap_avance_mm': round(float(calculo['gap_avance_mm']), 2)}
+                                        new_medidas = geometria.formatear(**geo)
+                                        if recalcular:
+                                            new_metros = round(float(calculo['metros_lineales']), 2)
+                                            new_area = round(float(calculo['area_preprensa_cm2']), 2)
+
+                                    actualizar_proyecto_info(proyecto['id'], new_cliente, new_nombre, new_material, new_acabado, new_cantidad, new_fecha, new_prioridad, new_op, new_pedido, new_pos, new_core, new_cant_core, new_colores, new_medidas, new_metros, new_area, new_troquel_existente, new_n_troquel, new_n_lamina, final_imagen_path, new_proveedor_preprensa, geo)
                                     st.rerun()
 
                     # --- BOTÓN DE ELIMINAR PROYECTO ---
@@ -994,6 +1056,17 @@ def main_app():
                         eliminar_proyecto(proyecto['id'])
                         st.rerun()
 
+        # --- PAGINACIÓN ---
+        if not modo_cola:
+            c_prev, c_info, c_next = st.columns([1, 2, 1])
+            if c_prev.button("⬅️ Anterior", key="pag_anterior", disabled=len(cursores) == 1):
+                cursores.pop()
+                st.rerun()
+            c_info.caption(f"Página {len(cursores)} | {total_filtrados} proyectos con los filtros actuales")
+            if c_next.button("Siguiente ➡️", key="pag_siguiente", disabled=siguiente_cursor is None):
+                cursores.append(siguiente_cursor)
+                st.rerun()
+
     elif choice == "Analíticas":
         st.subheader("📊 Analíticas de Tiempos por Proceso")
         proyectos_df = ver_proyectos()
@@ -1026,6 +1099,96 @@ def main_app():
             st.altair_chart(pie + text, use_container_width=True)
             st.markdown("---")
 
+            # --- PLANIFICACIÓN DE CAPACIDAD ---
+            st.markdown("### 📅 Planificación por Máquina (pronóstico de entregas)")
+            plan_proyectos, plan_tareas = ver_plan()
+            atrasados = plan_proyectos[plan_proyectos['en_riesgo']].sort_values('dias_atraso', ascending=False)
+            col_abiertos, col_riesgo, col_fin = st.columns(3)
+            col_abiertos.metric("Proyectos abiertos", len(plan_proyectos))
+            col_riesgo.metric("No llegan a la entrega", len(atrasados))
+            if not plan_proyectos.empty:
+                col_fin.metric("Cola vacía el", plan_proyectos['fin_previsto'].max().strftime('%Y-%m-%d %H:%M'))
+            if atrasados.empty:
+                st.success("Con la capacidad actual todos los proyectos abiertos llegan a su fecha de entrega.")
+            else:
+                st.dataframe(atrasados.drop(columns=['en_riesgo']), use_container_width=True, hide_index=True,
+                             column_config={'fin_previsto': st.column_config.DatetimeColumn("Fin previsto", format="YYYY-MM-DD HH:mm")})
+            exp_gantt = st.expander("Cola por máquina (diagrama de Gantt)", key="analitica_gantt", on_change="rerun")
+            if exp_gantt.open and not plan_tareas.empty:
+                with exp_gantt:
+                    etiquetas = plan_proyectos.set_index('id')['nombre_proyecto']
+                    gantt = plan_tareas.assign(proyecto=plan_tareas['proyecto_id'].map(etiquetas),
+                                               en_riesgo=plan_tareas['proyecto_id'].isin(atrasados['id']))
+                    grafico = alt.Chart(gantt).mark_bar().encode(
+                        x=alt.X('inicio:T', title="Inicio"), x2='fin:T', y=alt.Y('maquina:N', title="Máquina"),
+                        color=alt.Color('en_riesgo:N', title="No llega", scale=alt.Scale(domain=[False, True], range=['#60a5fa', '#ef4444'])),
+                        tooltip=['proyecto_id', 'proyecto', 'etapa', 'maquina', alt.Tooltip('inicio:T', format='%Y-%m-%d %H:%M'), alt.Tooltip('fin:T', format='%Y-%m-%d %H:%M')])
+                    st.altair_chart(grafico, use_container_width=True)
+            st.markdown("---")
+
+            # --- SECUENCIA DE IMPRESIÓN (CAMBIOS DE MÁQUINA) ---
+            st.markdown("### 🔁 Secuencia de Impresión (menos cambios de anilox, tintas, material y Z)")
+            secuencia, resumen_secuencia = ver_secuencia()
+            if secuencia.empty:
+                st.info("No hay trabajos en cola de impresión.")
+            else:
+                maquina_secuencia = st.selectbox("Impresora", resumen_secuencia['maquina'].tolist(), key="analitica_secuencia_maquina")
+                fila_secuencia = resumen_secuencia.set_index('maquina').loc[maquina_secuencia]
+                col_trabajos, col_cambios, col_ahorro = st.columns(3)
+                col_trabajos.metric("Trabajos en cola", int(fila_secuencia['trabajos']))
+                col_cambios.metric("Alistamiento con esta secuencia", f"{fila_secuencia['minutos_cambio'] / 60:.1f} h")
+                col_ahorro.metric("Ahorro frente al orden de la cola", f"{fila_secuencia['ahorro_min'] / 60:.1f} h")
+                st.dataframe(secuencia[secuencia['maquina'] == maquina_secuencia].drop(columns=['maquina']), use_container_width=True, hide_index=True,
+                             column_config={'fecha_entrega': st.column_config.DateColumn("Entrega"),
+                                            'cambio_min': st.column_config.NumberColumn("Cambio (min)", format="%.0f"),
+                                            'montado': st.column_config.CheckboxColumn("Montado")})
+                st.caption("Prioridad primero (Urgente, Alta, Normal); dentro de cada grupo, el orden que menos alistamiento suma desde lo último montado en la máquina.")
+            st.markdown("---")
+
+            # --- TIEMPOS DE PLANTA (TABLA kpi_diario) ---
+            st.markdown("### 🏭 Tiempos de Planta (etapas cerradas, sin pausas)")
+            nombres_dimension = {'estado': "Estado", 'maquina': "Máquina", 'responsable': "Responsable", 'dia': "Día", 'semana': "Semana"}
+            col_dim, col_rango = st.columns(2)
+            dimension = col_dim.selectbox("Agrupar por", list(nombres_dimension), format_func=nombres_dimension.get, key="analitica_dimension")
+            rango = col_rango.date_input("Cerradas entre", value=(), key="analitica_rango")
+            desde, hasta = (rango + (None, None))[:2] if isinstance(rango, tuple) else (rango, None)
+            with conexion() as conn:
+                tabla_planta = resumen_diario.kpis(conn, dimension, desde, hasta)
+            if tabla_planta.empty:
+                st.info("Todavía no hay etapas cerradas para analizar.")
+            else:
+                st.dataframe(tabla_planta, use_container_width=True, hide_index=True)
+                if dimension in ('dia', 'semana'):
+                    grafico = alt.Chart(tabla_planta).mark_line(point=True).encode(x=alt.X(f'{dimension}:T', title=nombres_dimension[dimension]), y=alt.Y('horas_totales', title="Horas"), tooltip=[dimension, 'etapas', 'horas_totales', 'metros_impresos', 'ratio_desperdicio'])
+                else:
+                    grafico = alt.Chart(tabla_planta).mark_bar().encode(x=alt.X(f'{dimension}:N', title=nombres_dimension[dimension], sort='-y'), y=alt.Y('horas_totales', title="Horas"), tooltip=[dimension, 'etapas', 'horas_totales', 'metros_impresos', 'ratio_desperdicio'])
+                st.altair_chart(grafico.properties(title="Horas de proceso"), use_container_width=True)
+
+                # Los percentiles no son sumables: salen del motor en memoria, solo si se abre la sección
+                exp_percentiles = st.expander("Distribución de duraciones (mediana y p95, todo el historial)", key="analitica_percentiles", on_change="rerun")
+                if exp_percentiles.open:
+                    with exp_percentiles:
+                        percentiles = analitica.resumen(dimension)
+                        datos_grafico = percentiles.melt(id_vars=[dimension], value_vars=['p50_min', 'p95_min'], var_name='Métrica', value_name='Minutos')
+                        if dimension in ('dia', 'semana'):
+                            grafico = alt.Chart(datos_grafico).mark_line(point=True).encode(x=alt.X(f'{dimension}:T', title=nombres_dimension[dimension]), y='Minutos', color='Métrica', tooltip=[dimension, 'Métrica', 'Minutos'])
+                        else:
+                            grafico = alt.Chart(datos_grafico).mark_bar().encode(x=alt.X(f'{dimension}:N', title=nombres_dimension[dimension]), xOffset='Métrica', y='Minutos', color='Métrica', tooltip=[dimension, 'Métrica', 'Minutos'])
+                        st.altair_chart(grafico.properties(title="Duración de etapas: mediana y p95"), use_container_width=True)
+            st.markdown("---")
+
+            # --- ENTREGAS POR PERIODO (THROUGHPUT) ---
+            st.markdown("### 🚚 Proyectos Entregados por Periodo")
+            periodo_entregas = st.radio("Periodo", ['dia', 'semana'], format_func={'dia': "Día", 'semana': "Semana"}.get, horizontal=True, key="analitica_periodo_entregas")
+            with conexion() as conn:
+                entregas = analitica.entregas_por_periodo(conn, periodo_entregas)
+            if entregas.empty:
+                st.info("Todavía no hay proyectos entregados.")
+            else:
+                grafico = alt.Chart(entregas).mark_bar().encode(x=alt.X('periodo:T', title="Día" if periodo_entregas == 'dia' else "Semana (lunes)"), y=alt.Y('entregados', title="Proyectos"), tooltip=['periodo', 'entregados'])
+                st.altair_chart(grafico.properties(title="Proyectos entregados"), use_container_width=True)
+            st.markdown("---")
+
             lista_proyectos = {f"{row['id']} - {row['nombre_proyecto']}": row['id'] for index, row in proyectos_df.iterrows()}
             proyecto_sel_nombre = st.selectbox("Selecciona un Proyecto para ver su historial:", options=lista_proyectos.keys())
             if proyecto_sel_nombre:
@@ -1058,24 +1221,74 @@ def main_app():
         local_ip = get_local_ip()
         st.info(f"📡 **Conexión de Tablets:**\n1. Asegúrate de que el PC y la Tablet estén en la misma red.\n2. Ingresa esta dirección en la tablet: **http://{local_ip}:8501**\n3. Si no carga, revisa el **Firewall de Windows** en el PC y asegura usar el puerto correcto (usualmente 8501).")
 
+        # --- ESTADO DEL ESQUEMA (INSTRUMENTACIÓN DE ARRANQUE) ---
+        st.markdown("### 🗄️ Esquema de Base de Datos")
+        if METRICAS_ESQUEMA['arranque_ms'] is not None:
+            st.caption(f"Versión v{METRICAS_ESQUEMA['version']} | Migraciones aplicadas al arrancar: {METRICAS_ESQUEMA['migraciones_aplicadas']} "
+                       f"({METRICAS_ESQUEMA['arranque_ms']:.1f} ms) | Verificación en reruns: {METRICAS_ESQUEMA['ultima_verificacion_ms']:.3f} ms "
+                       f"sin DDL ({METRICAS_ESQUEMA['verificaciones_en_caliente']} reruns)")
+
+        # --- INVENTARIO DE TROQUELES (ver troqueles.py) ---
+        st.markdown("### 🛠️ Inventario de Troqueles")
+        with conexion() as conn:
+            inventario_troqueles = troqueles.inventario(conn)
+        if inventario_troqueles.empty:
+            st.caption("Todavía no hay troqueles: se dan de alta al asignar un número de troquel a un proyecto.")
+        else:
+            st.caption("Usos y metros se suman al cerrar cada etapa de Troquelado. Cargue la vida útil (metros) para ver el desgaste y desactive los troqueles dados de baja.")
+            inventario_troqueles['activo'] = inventario_troqueles['activo'].astype(bool)
+            editables = ['numero_lamina', 'radio_esquina_mm', 'vida_util_metros', 'activo']
+            inventario_editado = st.data_editor(inventario_troqueles, key="editor_troqueles", hide_index=True, use_container_width=True,
+                                                disabled=[col for col in inventario_troqueles.columns if col not in editables],
+                                                column_config={'desgaste_pct': st.column_config.ProgressColumn("Desgaste", min_value=0, max_value=100, format="%.0f%%")})
+            if st.button("💾 Guardar inventario", key="guardar_troqueles"):
+                # Solo las filas que se tocaron en el editor
+                filas_editadas = sorted(st.session_state['editor_troqueles']['edited_rows'])
+                guardar_inventario_troqueles(inventario_editado.iloc[filas_editadas])
+                st.rerun()
+
         # --- COPIA DE SEGURIDAD ---
         st.markdown("### 💾 Respaldo de Información")
         st.caption("Descarga una copia de la base de datos para guardarla en otro lugar (USB, Nube) por seguridad.")
-        if os.path.exists("produccion.db"):
-            with open("produccion.db", "rb") as f:
-                st.download_button(
-                    label="📥 Descargar Copia de Seguridad (Base de Datos)",
-                    data=f,
-                    file_name=f"produccion_backup_{datetime.now().strftime('%Y-%m-%d_%H%M')}.db",
-                    mime="application/x-sqlite3"
-                )
+        if os.path.exists(archivos_bd()[0]):
+            # Descarga diferida: el checkpoint del WAL y la lectura del archivo se hacen recién al hacer clic
+            st.download_button(
+                label="📥 Descargar Copia de Seguridad (Base de Datos)",
+                data=contenido_bd,
+                file_name=f"produccion_backup_{datetime.now().strftime('%Y-%m-%d_%H%M')}.db",
+                mime="application/x-sqlite3",
+                on_click="ignore"
+            )
+
+        # --- EXPORTACIÓN PARA ERP / BI (ver exportacion.py) ---
+        st.markdown("### 📤 Exportar para ERP / BI")
+        st.caption(f"Proyectos o log de procesos en CSV/Parquet, escritos por bloques en la carpeta '{exportacion.DIR_EXPORTACIONES}' del servidor. "
+                   "La sincronización nocturna del ERP usa la consola: python exportacion.py proyectos_log --incremental erp")
+        c_exp1, c_exp2, c_exp3 = st.columns(3)
+        conjunto_exportar = c_exp1.selectbox("Datos", list(exportacion.CONJUNTOS), format_func=lambda c: "Proyectos" if c == 'proyectos' else "Log de procesos", key="conjunto_exportar")
+        formato_exportar = c_exp2.selectbox("Formato", exportacion.FORMATOS, format_func=str.upper, key="formato_exportar")
+        solo_nuevo = c_exp3.checkbox("Solo lo nuevo desde la última exportación desde aquí", key="exportar_incremental")
+        if st.button("📤 Exportar", key="exportar_datos"):
+            st.session_state['ultima_exportacion'] = exportacion.exportar(conjunto_exportar, formato_exportar, incremental="configuracion" if solo_nuevo else None)
+        ultima_exportacion = st.session_state.get('ultima_exportacion')
+        if ultima_exportacion and os.path.exists(ultima_exportacion['archivo']):
+            alcance = "completa" if ultima_exportacion['completa'] else "incremental"
+            st.success(f"✅ {ultima_exportacion['filas']} filas ({alcance}) en {ultima_exportacion['archivo']} ({ultima_exportacion['segundos']:.1f} s).")
+            # El archivo se lee recién al hacer clic (descarga diferida)
+            st.download_button("⬇️ Descargar exportación", data=lambda ruta=ultima_exportacion['archivo']: exportacion.leer(ruta), file_name=os.path.basename(ultima_exportacion['archivo']),
+                               key="descargar_exportacion", on_click="ignore")
 
         st.error("🚨 **Acción Peligrosa** 🚨")
         st.warning("Haz clic aquí solo si la app no funciona bien y sospechas que la DB está corrupta. **Se borrarán todos los datos.**")
         if st.button("Borrar y Reiniciar Base de Datos"):
-            db_file = "produccion.db"
             try:
-                if os.path.exists(db_file): os.remove(db_file)
+                cerrar_conexiones()
+                for db_file in archivos_bd():
+                    if os.path.exists(db_file): os.remove(db_file)
+                olvidar_esquema()
+                # Las cachés por versión de datos no sirven: el contador vuelve a 0 en la BD nueva
+                st.cache_data.clear()
+                analitica.olvidar()
                 
                 # Limpiar también las imágenes subidas para un reinicio limpio
                 if os.path.exists("uploads"):
@@ -1083,6 +1296,8 @@ def main_app():
                         ruta_archivo = os.path.join("uploads", archivo)
                         if os.path.isfile(ruta_archivo):
                             os.unlink(ruta_archivo)
+                derivados.limpiar()
+                almacen.limpiar()
                             
                 init_db()
                 st.session_state['logged_in_user'] = None  # Cerrar sesión para obligar a re-ingresar
@@ -1131,58 +1346,13 @@ def main():
     st.set_page_config(page_title="Gestión de Producción", layout="wide")
     init_db() 
 
-    # --- DIAGNOSTIC CODE ---
-    st.info("--- INICIO DE DIAGNÓSTICO ---")
-    try:
-        conn_diag = sqlite3.connect('produccion.db', timeout=10)
-        c = conn_diag.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='proyectos'")
-        if c.fetchone():
-            df_diag = pd.read_sql_query("SELECT * FROM proyectos", conn_diag)
-            st.success(f"✅ DIAGNÓSTICO: ¡Conexión exitosa! La tabla 'proyectos' existe y se encontraron {len(df_diag)} registros (proyectos) en ella.")
-        else:
-            st.warning("🟡 DIAGNÓSTICO: La conexión a la base de datos 'produccion.db' fue exitosa, pero la tabla 'proyectos' NO EXISTE.")
-        conn_diag.close()
-    except Exception as e:
-        st.error(f"❌ DIAGNÓSTICO: ¡ERROR! No se pudo leer la base de datos 'produccion.db'. Razón: {e}")
-    st.info("--- FIN DE DIAGNÓSTICO ---")
-    # --- END DIAGNOSTIC CODE ---
+    # --- SONDA DE SALUD (cacheada, sin escrituras) ---
+    salud_ok, salud_msg = sonda_salud()
+    if not salud_ok:
+        st.error(f"❌ DIAGNÓSTICO: ¡ERROR! No se pudo leer la base de datos 'produccion.db'. Razón: {salud_msg}")
 
     # --- AUTO-LOGIN (MODO DESARROLLO) ---
-    # Garantiza que exista el usuario 'admin' y lo loguea automáticamente al recargar (F5).
-    conn = sqlite3.connect('produccion.db', timeout=30)
-    c = conn.cursor()
-    try:
-        # Asegurar que admin tenga rol de admin
-        c.execute("SELECT * FROM usuarios WHERE username='admin'")
-        if not c.fetchone():
-            c.execute("INSERT INTO usuarios (username, password, rol) VALUES (?, ?, ?)", ('admin', make_hashes('admin'), 'admin'))
-        else:
-            c.execute("UPDATE usuarios SET rol='admin' WHERE username='admin'")
-        
-        # Crear usuario ventas para pruebas
-        c.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", ('ventas', make_hashes('ventas'), 'ventas'))
-        
-        # Crear usuarios operativos para tablets (Contraseña = Usuario)
-        lista_operarios = [
-            "IMPRESOR SP1", "IMPRESOR SUPER PRINT", "IMPRESOR FIT 350",
-            "JEFE PRODUCCION",
-            "CONTROLADOR 1", "CONTROLADOR 2", "CONTROLADOR 3", "CONTROLADOR 4", "CONTROLADOR 5", "CONTROLADOR 6",
-            "TROQUELADOR1", "TROQUELADOR 2",
-            "DESPACHO 1"
-        ]
-        for op_user in lista_operarios:
-            # Contraseña: minúsculas y espacios reemplazados por guiones
-            op_password = op_user.lower().replace(" ", "-")
-            c.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", (op_user, make_hashes(op_password), 'operario'))
-            # Actualizar contraseña por si el usuario ya existía con el formato anterior
-            c.execute("UPDATE usuarios SET password = ? WHERE username = ?", (make_hashes(op_password), op_user))
-
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass # El usuario ya existe, continuamos
-    conn.close()
-
+    # El usuario 'admin' lo crea la semilla (semilla.py) al arrancar; aquí solo se loguea al recargar (F5).
     if 'logged_in_user' not in st.session_state:
         st.session_state['logged_in_user'] = 'admin'
 
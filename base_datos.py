@@ -0,0 +1,193 @@
+"""Capa compartida de acceso a SQLite para el sistema de producción.
+
+Streamlit ejecuta el script completo en cada interacción y cada tablet es una
+sesión distinta, así que abrir una conexión nueva por consulta genera mucha
+contención ("database is locked"). Este módulo mantiene un pool pequeño de
+conexiones por archivo de base de datos, configura WAL y los PRAGMA de
+rendimiento una sola vez por conexión y expone dos context managers:
+
+- ``conexion()``: para lecturas (en WAL no bloquean a los escritores).
+- ``transaccion()``: abre ``BEGIN IMMEDIATE`` y hace COMMIT/ROLLBACK automático.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Ruta de la base de datos. Se puede cambiar con la variable de entorno
+# PRODUCCION_DB (útil para benchmarks o pruebas con una copia de la BD).
+DB_PATH = os.environ.get('PRODUCCION_DB', 'produccion.db')
+
+# Máximo de conexiones inactivas que se guardan por base de datos.
+POOL_MAX = 32
+
+# ruta -> (identidad del archivo, cola de conexiones inactivas)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _configurar(conn):
+    """Aplica los PRAGMA de rendimiento a una conexión recién abierta."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA cache_size = -16000")  # ~16 MB de caché de páginas
+    conn.execute("PRAGMA mmap_size = 134217728")  # 128 MB mapeados en memoria
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _nueva_conexion(ruta):
+    # isolation_level=None: modo autocommit, las transacciones se abren explícitamente en transaccion()
+    conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+    _configurar(conn)
+    return conn
+
+
+def _identidad(ruta):
+    """(dispositivo, inodo) del archivo, o None si no existe.
+
+    Mientras haya conexiones abiertas el inodo del archivo borrado no se
+    reutiliza, así que si cambia la BD fue borrada y creada de nuevo.
+    """
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def _vaciar(pool):
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def _pool(ruta):
+    identidad = _identidad(ruta)
+    with _pools_lock:
+        actual = _pools.get(ruta)
+        if actual is not None and actual[0] in (identidad, None):
+            # Identidad None: las conexiones del pool son las que crearon el archivo
+            _pools[ruta] = (identidad, actual[1])
+            return actual[1]
+        # Otro proceso (p. ej. el reinicio desde Configuración) recreó la BD:
+        # las conexiones guardadas siguen leyendo el archivo borrado
+        pool = queue.LifoQueue(maxsize=POOL_MAX)
+        _pools[ruta] = (identidad, pool)
+    if actual is not None:
+        _vaciar(actual[1])
+    return pool
+
+
+def _vigente(ruta, pool):
+    with _pools_lock:
+        actual = _pools.get(ruta)
+        return actual is not None and actual[1] is pool
+
+
+@contextmanager
+def conexion():
+    """Presta una conexión del pool y la devuelve al terminar."""
+    ruta = DB_PATH
+    pool = _pool(ruta)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _nueva_conexion(ruta)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            # Nunca devolver al pool una conexión con una transacción a medias
+            conn.rollback()
+        if not _vigente(ruta, pool):
+            conn.close()
+        else:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+@contextmanager
+def transaccion():
+    """Ejecuta un bloque de escritura dentro de una transacción ``BEGIN IMMEDIATE``.
+
+    El lock de escritura se toma al inicio, así dos tablets no pueden
+    intercalar escrituras sobre el mismo proyecto. Si el bloque lanza una
+    excepción se hace ROLLBACK y la excepción se propaga.
+    """
+    with conexion() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+
+def checkpoint():
+    """Vuelca el WAL al archivo principal (antes de copiar/descargar la BD)."""
+    with conexion() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def contenido_bd():
+    """Bytes del archivo de la BD con el WAL ya volcado (descarga de respaldo)."""
+    checkpoint()
+    with open(DB_PATH, 'rb') as f:
+        return f.read()
+
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones del pool (necesario antes de borrar la BD)."""
+    with _pools_lock:
+        pools = [pool for _, pool in _pools.values()]
+        _pools.clear()
+    for pool in pools:
+        _vaciar(pool)
+
+
+def archivos_bd(ruta=None):
+    """Lista el archivo de la BD y sus archivos auxiliares de WAL."""
+    ruta = ruta or DB_PATH
+    return [ruta, ruta + '-wal', ruta + '-shm']
+
+
+def marcar_cambio(conn, clave='version_datos'):
+    """Incrementa un contador de versión dentro de la transacción en curso.
+
+    Lo llaman todas las funciones que modifican proyectos; las cachés de
+    lectura (p. ej. el listado de proyectos) usan la versión como clave, así
+    que un cambio las invalida en todas las sesiones y procesos a la vez.
+    Otras claves permiten invalidaciones más finas (p. ej. 'log_borrados').
+    """
+    conn.execute('''
+        INSERT INTO sistema (clave, valor) VALUES (?, 1)
+        ON CONFLICT(clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+    ''', (clave,))
+
+
+def generacion_bd(conn):
+    """Identificador aleatorio del archivo de BD (migración 14).
+
+    Los contadores de ``version_datos`` vuelven a 0 si la BD se borra y se
+    recrea; las claves de caché que salen de otro proceso (ETags de la API)
+    deben incluir también este valor.
+    """
+    fila = conn.execute("SELECT valor FROM sistema WHERE clave = 'generacion_bd'").fetchone()
+    return fila[0] if fila else ''
+
+
+def version_datos(clave='version_datos', conn=None):
+    """Versión actual de un contador (0 si nunca hubo cambios)."""
+    if conn is None:
+        with conexion() as conn:
+            return version_datos(clave, conn)
+    fila = conn.execute("SELECT valor FROM sistema WHERE clave = ?", (clave,)).fetchone()
+    return int(fila[0]) if fila else 0
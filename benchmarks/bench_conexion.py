@@ -0,0 +1,158 @@
+"""Benchmark: conexión nueva por llamada vs. pool compartido con WAL.
+
+Simula tablets que hacen "reruns" de Streamlit (rol del usuario + listado
+de proyectos + historial de un proyecto) mientras N escritores avanzan
+estados en paralelo, y reporta reruns/seg para cada modo.
+
+Uso:
+    python benchmarks/bench_conexion.py --lectores 15 --escritores 4 --segundos 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import base_datos  # noqa: E402
+
+ESQUEMA = """
+CREATE TABLE usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL, rol TEXT);
+CREATE TABLE proyectos (id INTEGER PRIMARY KEY AUTOINCREMENT, cliente TEXT, nombre_proyecto TEXT, fecha_creacion DATETIME, estado TEXT, imagen_path TEXT, prioridad TEXT, estado_anterior TEXT);
+CREATE TABLE info_ventas (proyecto_id INTEGER PRIMARY KEY, cliente TEXT, nombre_proyecto TEXT, orden_produccion TEXT, fecha_entrega DATE);
+CREATE TABLE info_tecnica (proyecto_id INTEGER PRIMARY KEY, material TEXT, medidas TEXT, metros_lineales REAL);
+CREATE TABLE proyectos_log (id INTEGER PRIMARY KEY AUTOINCREMENT, proyecto_id INTEGER NOT NULL, estado TEXT NOT NULL, timestamp_inicio DATETIME NOT NULL, timestamp_fin DATETIME, usuario_id INTEGER, maquina_utilizada TEXT);
+"""
+
+SNAPSHOT = """
+    SELECT p.id, p.estado, v.cliente, v.orden_produccion, t.material, t.medidas
+    FROM proyectos p
+    LEFT JOIN info_ventas v ON p.id = v.proyecto_id
+    LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
+"""
+
+
+def preparar_bd(ruta, n_proyectos):
+    conn = sqlite3.connect(ruta)
+    conn.executescript(ESQUEMA)
+    conn.execute("INSERT INTO usuarios (username, password, rol) VALUES ('admin', 'x', 'admin')")
+    ahora = datetime.now().isoformat(' ')
+    for i in range(1, n_proyectos + 1):
+        conn.execute("INSERT INTO proyectos (id, cliente, nombre_proyecto, fecha_creacion, estado, prioridad) VALUES (?, ?, ?, ?, 'Diseño', 'Normal')", (i, f"Cliente {i}", f"Ref {i}", ahora))
+        conn.execute("INSERT INTO info_ventas VALUES (?, ?, ?, ?, '2030-01-01')", (i, f"Cliente {i}", f"Ref {i}", f"OP{i}"))
+        conn.execute("INSERT INTO info_tecnica VALUES (?, 'PPBB', '50x30', 120.0)", (i,))
+        conn.execute("INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id) VALUES (?, 'Diseño', ?, 1)", (i, ahora))
+    conn.commit()
+    conn.close()
+
+
+# --- Modo "antes": una conexión nueva por función, journal por defecto ---
+@contextmanager
+def _legacy_lectura(ruta):
+    conn = sqlite3.connect(ruta, timeout=30)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _legacy_escritura(ruta):
+    conn = sqlite3.connect(ruta, timeout=30)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _rerun(lectura, n_proyectos):
+    with lectura() as conn:
+        conn.execute("SELECT rol FROM usuarios WHERE username = ?", ('admin',)).fetchone()
+    with lectura() as conn:
+        conn.execute(SNAPSHOT).fetchall()
+    with lectura() as conn:
+        conn.execute("SELECT * FROM proyectos_log WHERE proyecto_id = ? ORDER BY timestamp_inicio", (random.randint(1, n_proyectos),)).fetchall()
+
+
+def _avanzar(lectura, escritura, n_proyectos):
+    proyecto_id = random.randint(1, n_proyectos)
+    ahora = datetime.now().isoformat(' ')
+    with lectura() as conn:
+        usuario_id = conn.execute("SELECT id FROM usuarios WHERE username = ?", ('admin',)).fetchone()[0]
+    with escritura() as conn:
+        conn.execute("UPDATE proyectos_log SET timestamp_fin = ? WHERE proyecto_id = ? AND timestamp_fin IS NULL", (ahora, proyecto_id))
+        conn.execute("INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id) VALUES (?, 'Impresion', ?, ?)", (proyecto_id, ahora, usuario_id))
+        conn.execute("UPDATE proyectos SET estado = 'Impresion' WHERE id = ?", (proyecto_id,))
+
+
+def correr(modo, lectores, escritores, segundos, n_proyectos):
+    tmp = tempfile.mkdtemp()
+    ruta = os.path.join(tmp, 'bench.db')
+    preparar_bd(ruta, n_proyectos)
+
+    if modo == 'antes':
+        lectura = lambda: _legacy_lectura(ruta)
+        escritura = lambda: _legacy_escritura(ruta)
+    else:
+        base_datos.DB_PATH = ruta
+        lectura = base_datos.conexion
+        escritura = base_datos.transaccion
+
+    fin = time.perf_counter() + segundos
+    contadores = {'reruns': 0, 'escrituras': 0, 'errores': 0}
+    lock = threading.Lock()
+
+    def lector():
+        n = 0
+        while time.perf_counter() < fin:
+            try:
+                _rerun(lectura, n_proyectos)
+                n += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    contadores['errores'] += 1
+        with lock:
+            contadores['reruns'] += n
+
+    def escritor():
+        n = 0
+        while time.perf_counter() < fin:
+            try:
+                _avanzar(lectura, escritura, n_proyectos)
+                n += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    contadores['errores'] += 1
+        with lock:
+            contadores['escrituras'] += n
+
+    hilos = [threading.Thread(target=lector) for _ in range(lectores)] + [threading.Thread(target=escritor) for _ in range(escritores)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    base_datos.cerrar_conexiones()
+    return {k: v / segundos if k != 'errores' else v for k, v in contadores.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lectores', type=int, default=15, help="Tablets simuladas haciendo reruns")
+    parser.add_argument('--escritores', type=int, default=4, help="Escritores concurrentes avanzando estados")
+    parser.add_argument('--segundos', type=float, default=5.0)
+    parser.add_argument('--proyectos', type=int, default=500)
+    args = parser.parse_args()
+
+    for modo in ('antes', 'despues'):
+        r = correr(modo, args.lectores, args.escritores, args.segundos, args.proyectos)
+        print(f"{modo:8s} reruns/seg: {r['reruns']:8.1f} | escrituras/seg: {r['escrituras']:7.1f} | errores 'locked': {r['errores']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark de la exportación por bloques: filas/s y memoria pico frente a leer todo de una vez.
+
+Llena una BD temporal con pedidos sintéticos (con ``importacion``) y un log
+de varias etapas por proyecto, y exporta ``proyectos`` y ``proyectos_log``
+a CSV y Parquet con ``exportacion.exportar``. La memoria pico de Python se
+mide con tracemalloc en una segunda pasada (los búferes internos de pyarrow
+no entran en la cuenta). Como referencia, la misma consulta con
+``pd.read_sql_query`` sin bloques y un solo ``to_csv``. Al final, una
+exportación incremental tras cerrar algunas etapas solo debe traer esas filas.
+
+Uso:
+    python benchmarks/bench_exportacion.py [--proyectos 50000] [--etapas 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+
+def poblar_log(conn, n_proyectos, etapas):
+    base = datetime(2025, 1, 1)
+    estados = ["Diseño", "Preprensa", "Impresion", "Control calidad", "Troquelado"]
+    filas = []
+    for pid in range(1, n_proyectos + 1):
+        inicio = base + timedelta(minutes=pid)
+        for k in range(etapas):
+            fin = inicio + timedelta(minutes=random.randint(10, 600))
+            filas.append((pid, estados[k % len(estados)], inicio, fin, 1, "SP1", "Operario", 1500.0, 30.0))
+            inicio = fin
+    conn.execute("BEGIN")
+    conn.executemany("""INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, timestamp_fin, usuario_id, maquina_utilizada,
+                        responsable, metros_impresos, desperdicio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", filas)
+    conn.execute("COMMIT")
+
+
+def medir(nombre, funcion):
+    # Dos pasadas: tracemalloc enlentece mucho, así que el tiempo se toma sin él
+    inicio = time.perf_counter()
+    filas = funcion()
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcion()
+    pico = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    print(f"  {nombre:42s} {filas:9d} filas {segundos:7.2f} s {filas / segundos:11,.0f} filas/s  pico {pico:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proyectos', type=int, default=50000)
+    parser.add_argument('--etapas', type=int, default=5, help="Etapas del log por proyecto")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    os.environ['PRODUCCION_DB'] = os.path.join(carpeta, 'bench_exportacion.db')
+    import base_datos
+    import bench_importacion
+    import exportacion
+    import importacion
+    import migraciones
+    migraciones.asegurar_esquema()
+    ruta_csv = os.path.join(carpeta, 'pedidos.csv')
+    bench_importacion.generar_csv(ruta_csv, args.proyectos)
+    importacion.importar(ruta_csv, 'admin')
+    random.seed(0)
+    with base_datos.conexion() as conn:
+        poblar_log(conn, args.proyectos, args.etapas)
+        total_log = conn.execute("SELECT COUNT(*) FROM proyectos_log").fetchone()[0]
+    print(f"BD con {args.proyectos} proyectos y {total_log} etapas de log\n")
+
+    salida = os.path.join(carpeta, 'exportaciones')
+    for conjunto in exportacion.CONJUNTOS:
+        print(conjunto)
+        for formato in exportacion.FORMATOS:
+            medir(f"exportar por bloques a {formato}", lambda: exportacion.exportar(conjunto, formato, salida)['filas'])
+
+        def todo_junto():
+            orden = "p.id" if conjunto == 'proyectos' else "pl.id"
+            with base_datos.conexion() as conn:
+                df = pd.read_sql_query(f"{exportacion.CONJUNTOS[conjunto][0]} ORDER BY {orden}", conn)
+            df.to_csv(os.path.join(carpeta, f"{conjunto}_todo.csv"), index=False)
+            return len(df)
+        medir("referencia: read_sql_query + to_csv", todo_junto)
+
+    # Incremental: primero la marca, después se cierran 1.000 etapas abiertas
+    exportacion.exportar('proyectos_log', 'csv', salida, incremental='bench')
+    with base_datos.transaccion() as conn:
+        conn.execute("UPDATE proyectos_log SET timestamp_fin = ? WHERE id IN (SELECT id FROM proyectos_log WHERE timestamp_fin IS NULL LIMIT 1000)",
+                     (datetime.now() + timedelta(hours=1),))
+    print()
+    inicio = time.perf_counter()
+    filas = exportacion.exportar('proyectos_log', 'csv', salida, incremental='bench')['filas']
+    print(f"  proyectos_log incremental tras 1.000 cierres: {filas} filas en {time.perf_counter() - inicio:.2f} s "
+          f"(las cerradas en los {exportacion.MARGEN_CIERRE.seconds // 60} min previos a la marca se repiten)")
+
+
+if __name__ == '__main__':
+    main()
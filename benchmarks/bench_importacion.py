@@ -0,0 +1,87 @@
+"""Benchmark de la importación masiva de pedidos (objetivo: al menos 10.000 pedidos/s).
+
+Genera un CSV sintético (1 % de filas con errores, un tercio con troquel de
+un juego chico, sin Z en la mitad para que se calcule la sugerida) y lo
+importa en una BD temporal con ``importacion.importar``. Como referencia,
+inserta una muestra con una transacción por pedido, que es lo que hace el
+formulario de alta.
+
+Uso:
+    python benchmarks/bench_importacion.py [--pedidos 50000] [--bloque 5000] [--muestra 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OBJETIVO_POR_SEGUNDO = 10000
+
+
+def generar_csv(ruta, n):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'cliente': rng.choice(["Lácteos Andinos", "Bebidas del Sur", "Farma Norte", "Cosmética Lúa"], n),
+        'nombre_proyecto': [f"Ref {i}" for i in range(n)],
+        'cantidad_solicitada': rng.integers(1, 200, n) * 1000,
+        'ancho_mm': rng.choice([40.0, 50.0, 60.0, 75.5, 100.0], n),
+        'largo_mm': rng.choice([25.0, 30.0, 40.0, 50.0, 70.0], n),
+        'gap_ancho_mm': 3.0,
+        'cavidades': rng.integers(1, 4, n),
+        'repeticiones': rng.integers(2, 5, n),
+        'z': np.where(rng.random(n) < 0.5, "", rng.choice(["96", "106", "120"], n)),
+        'numero_colores': rng.integers(1, 9, n),
+        'material': rng.choice(["PPBB", "Esmaltado", "PPT"], n),
+        'prioridad': rng.choice(["Normal", "Alta", "Urgente"], n, p=[0.8, 0.15, 0.05]),
+        'fecha_entrega': (pd.Timestamp('2026-11-01') + pd.to_timedelta(rng.integers(0, 60, n), unit='D')).strftime('%Y-%m-%d'),
+        'orden_produccion': [f"OP-{i}" for i in range(n)],
+        'numero_troquel': np.where(rng.random(n) < 1 / 3, [f"T-{k}" for k in rng.integers(0, 50, n)], ""),
+    })
+    malas = rng.random(n) < 0.01
+    df['cantidad_solicitada'] = df['cantidad_solicitada'].astype(str).where(~malas, "mil")
+    df.to_csv(ruta, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pedidos', type=int, default=50000)
+    parser.add_argument('--bloque', type=int, default=5000)
+    parser.add_argument('--muestra', type=int, default=2000, help="Pedidos insertados de a uno como referencia")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    os.environ['PRODUCCION_DB'] = os.path.join(carpeta, 'bench_importacion.db')
+    import base_datos
+    import importacion
+    import migraciones
+    migraciones.asegurar_esquema()
+    ruta_csv = os.path.join(carpeta, 'pedidos.csv')
+    generar_csv(ruta_csv, args.pedidos)
+
+    resumen = importacion.importar(ruta_csv, 'admin', filas_por_bloque=args.bloque)
+    por_segundo = resumen['importadas'] / resumen['segundos']
+    print(f"{resumen['leidas']} filas: {resumen['importadas']} importadas, {len(resumen['errores'])} errores "
+          f"en {resumen['segundos']:.2f} s ({por_segundo:,.0f} pedidos/s)")
+
+    # Referencia: una transacción por pedido, como el formulario
+    pedidos, _ = importacion.validar(next(importacion.leer(ruta_csv, filas_por_bloque=args.muestra)))
+    inicio = time.perf_counter()
+    for i in range(len(pedidos)):
+        with base_datos.transaccion() as conn:
+            importacion.insertar(conn, pedidos.iloc[i:i + 1], 'admin')
+    uno_a_uno = len(pedidos) / (time.perf_counter() - inicio)
+    print(f"De a uno (una transacción por pedido): {uno_a_uno:,.0f} pedidos/s; en bloque {por_segundo / uno_a_uno:.0f}x más rápido")
+
+    with base_datos.conexion() as conn:
+        huerfanos = conn.execute("SELECT COUNT(*) FROM proyectos p LEFT JOIN info_tecnica t ON t.proyecto_id = p.id WHERE t.proyecto_id IS NULL").fetchone()[0]
+    print(f"{'OK' if por_segundo >= OBJETIVO_POR_SEGUNDO and not huerfanos else 'FALLA'}: objetivo {OBJETIVO_POR_SEGUNDO:,} pedidos/s, "
+          f"{huerfanos} proyectos sin tablas satélite")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark: duraciones del log fila a fila vs. vectorizadas, y N consultas vs. una.
+
+1. Cálculo de 'Duracion (minutos)' sobre N filas de log (por defecto 1M):
+   el antiguo ``df.apply`` con ``datetime.now()`` por fila frente a
+   ``consultas.calcular_duraciones``.
+2. Lectura de los logs de muchos proyectos: una consulta por proyecto
+   (como hacía ver_log_procesos) frente a ``consultas.logs_proyectos``.
+
+Uso:
+    python benchmarks/bench_log_duraciones.py [--filas 1000000] [--proyectos 1000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import consultas  # noqa: E402
+
+
+def generar_log(filas, n_proyectos):
+    rng = np.random.default_rng(0)
+    inicio = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, filas), unit='min')
+    fin = inicio + pd.to_timedelta(rng.integers(5, 600, filas), unit='min')
+    fin = fin.where(rng.random(filas) > 0.05)  # ~5% de entradas abiertas
+    return pd.DataFrame({
+        'proyecto_id': rng.integers(1, n_proyectos + 1, filas),
+        'estado': rng.choice(["Diseño", "Impresion", "Troquelado"], filas),
+        'usuario_id': 1,
+        'timestamp_inicio': inicio.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'timestamp_fin': pd.Series(fin).dt.strftime('%Y-%m-%d %H:%M:%S.%f'),
+    })
+
+
+def duracion_fila_a_fila(df):
+    df = df.copy()
+    df['timestamp_inicio'] = pd.to_datetime(df['timestamp_inicio'], format='ISO8601')
+    df['timestamp_fin'] = pd.to_datetime(df['timestamp_fin'], format='ISO8601')
+    df['Duracion (minutos)'] = df.apply(
+        lambda row: round(((row['timestamp_fin'] if pd.notna(row['timestamp_fin']) else datetime.now()) - row['timestamp_inicio']).total_seconds() / 60, 2),
+        axis=1
+    )
+    return df
+
+
+def cronometrar(nombre, funcion):
+    t0 = time.perf_counter()
+    resultado = funcion()
+    print(f"  {nombre:45s} {time.perf_counter() - t0:8.3f} s")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--proyectos', type=int, default=1000)
+    args = parser.parse_args()
+
+    df = generar_log(args.filas, args.proyectos)
+
+    print(f"Duraciones sobre {args.filas:,} filas:")
+    muestra = min(len(df), 100_000)
+    # El método fila a fila se mide sobre una muestra: con 1M de filas tarda minutos
+    cronometrar(f"df.apply fila a fila ({muestra:,} filas)", lambda: duracion_fila_a_fila(df.iloc[:muestra]))
+    cronometrar(f"calcular_duraciones ({len(df):,} filas)", lambda: consultas.calcular_duraciones(df.copy()))
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'bench_log.db')
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE usuarios (id INTEGER PRIMARY KEY, username TEXT)")
+    conn.execute("""CREATE TABLE proyectos_log (id INTEGER PRIMARY KEY AUTOINCREMENT, proyecto_id INTEGER NOT NULL, estado TEXT NOT NULL,
+        timestamp_inicio DATETIME NOT NULL, timestamp_fin DATETIME, usuario_id INTEGER, maquina_utilizada TEXT, responsable TEXT,
+        observaciones TEXT, codigo_bobina TEXT, metros_impresos REAL, desperdicio REAL, cantidad_cores INTEGER, numero_cajas INTEGER)""")
+    conn.execute("INSERT INTO usuarios VALUES (1, 'admin')")
+    df.to_sql('proyectos_log', conn, if_exists='append', index=False)
+    conn.execute("CREATE INDEX idx_log_proyecto_inicio ON proyectos_log (proyecto_id, timestamp_inicio)")
+    conn.commit()
+
+    ids = list(range(1, args.proyectos + 1))
+    print(f"\nLogs de {len(ids):,} proyectos ({args.filas:,} filas en la BD):")
+
+    def una_por_proyecto():
+        partes = []
+        for pid in ids:
+            d = pd.read_sql_query(consultas.SQL_LOG_PROCESOS + " WHERE pl.proyecto_id = ? ORDER BY pl.timestamp_inicio", conn, params=(pid,))
+            partes.append(duracion_fila_a_fila(d))
+        return partes
+
+    cronometrar("una consulta + apply por proyecto (N viajes)", una_por_proyecto)
+    cronometrar("logs_proyectos (una consulta, vectorizado)", lambda: consultas.logs_proyectos(conn, ids))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
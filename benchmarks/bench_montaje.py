@@ -0,0 +1,96 @@
+"""Benchmark del dibujo del montaje en el cilindro.
+
+Compara, para montajes grandes (por defecto 12 repeticiones x 10 cavidades):
+
+1. El dibujo anterior: figura de pyplot con un ``Rectangle`` por etiqueta y
+   por gap, renderizada a PNG como hace ``st.pyplot`` y sin cerrar la figura.
+2. ``montaje.figura_montaje`` (colecciones vectorizadas) renderizada a PNG.
+3. ``montaje.dibujar_montaje`` con la caché caliente (un rerun sin cambios).
+
+También informa cuántas figuras deja abiertas cada variante.
+
+Uso:
+    python benchmarks/bench_montaje.py [--repeticiones 12] [--cavidades 10] [--vueltas 20]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.patches as patches  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import montaje  # noqa: E402
+
+
+def dibujar_montaje_anterior(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho):
+    """Copia del dibujo original de app_empresa.py (una figura de pyplot por llamada)."""
+    fig, ax = plt.subplots(figsize=(2.5, 3.5))
+    margen_x = 2
+    ancho_contenido = (ancho * cavidades) + (gap_ancho * max(0, cavidades - 1))
+    ancho_total = ancho_contenido + (margen_x * 2)
+    ax.add_patch(patches.Rectangle((0, 0), ancho_total, z_mm, linewidth=0, facecolor='#f1f5f9'))
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=1)
+    ax.axhline(y=z_mm, color='black', linestyle='-', linewidth=1)
+    paso = z_mm / repeticiones
+    for i in range(int(repeticiones)):
+        y_pos = i * paso
+        for j in range(int(cavidades)):
+            x_pos = margen_x + (j * (ancho + gap_ancho))
+            ax.add_patch(patches.Rectangle((x_pos, y_pos), ancho, largo, linewidth=0.5, edgecolor='#1e40af', facecolor='#60a5fa', alpha=0.8))
+            if j == 0:
+                ax.text(x_pos + ancho/2, y_pos + largo/2, f"{int(largo)}", ha='center', va='center', fontsize=6, color='white', fontweight='bold')
+            if gap_avance > 0.1:
+                ax.add_patch(patches.Rectangle((x_pos, y_pos + largo), ancho, gap_avance, linewidth=0, facecolor='#fca5a5', alpha=0.4, hatch='///'))
+    ax.set_xlim(0, ancho_total)
+    ax.set_ylim(0, z_mm + (z_mm * 0.05))
+    ax.set_title(f"Z ({z_mm:.1f}mm) x {int(cavidades)} cavs", fontsize=8)
+    ax.set_ylabel("Avance", fontsize=7)
+    ax.set_xticks([])
+    ax.tick_params(axis='y', labelsize=6)
+    ax.set_aspect('equal', adjustable='box')
+    return fig
+
+
+def a_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=montaje.DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def medir(nombre, funcion, vueltas):
+    funcion()  # Calentamiento (fuentes, caché de matplotlib)
+    inicio = time.perf_counter()
+    for _ in range(vueltas):
+        funcion()
+    ms = (time.perf_counter() - inicio) * 1000 / vueltas
+    print(f"{nombre:<45} {ms:9.2f} ms/rerun   figuras abiertas: {len(plt.get_fignums())}")
+    return ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=12)
+    parser.add_argument('--cavidades', type=int, default=10)
+    parser.add_argument('--vueltas', type=int, default=20)
+    args = parser.parse_args()
+
+    # Etiqueta de 50 x 30 mm en Z96 (304.8 mm)
+    z_mm = 96 * 3.175
+    largo = 20.0
+    params = (30.0, largo, z_mm / args.repeticiones - largo, args.repeticiones, z_mm, args.cavidades, 3.0)
+    print(f"Montaje de {args.repeticiones} x {args.cavidades} = {args.repeticiones * args.cavidades} etiquetas, {args.vueltas} vueltas\n")
+
+    anterior = medir("pyplot + un Rectangle por etiqueta", lambda: a_png(dibujar_montaje_anterior(*params)), args.vueltas)
+    plt.close('all')
+    nuevo = medir("PolyCollection vectorizada (sin caché)", lambda: a_png(montaje.figura_montaje(*params)), args.vueltas)
+    cache = medir("dibujar_montaje, caché caliente", lambda: montaje.dibujar_montaje(*params), args.vueltas)
+    print(f"\nColecciones: {anterior / nuevo:.1f}x más rápido; con caché: {anterior / cache:.0f}x.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Benchmark del optimizador de montaje (objetivo: < 50 ms por tecla).
+
+Evalúa ``optimizador.optimizar`` sobre varios pedidos típicos y extremos y
+reporta el tiempo medio, la cantidad de candidatos evaluados y el tamaño de
+la frontera de Pareto.
+
+Uso:
+    python benchmarks/bench_optimizador.py [--vueltas 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import optimizador  # noqa: E402
+
+MAQUINAS = ["SP1", "FIT 350", "SUPERPRINT", "MARK ANDY"]
+
+# (ancho, largo, cantidad, colores, gap_ancho)
+PEDIDOS = [
+    (50.0, 30.0, 10000, 4, 3.0),
+    (100.0, 80.0, 50000, 6, 2.0),
+    (20.0, 15.0, 1000000, 2, 2.5),  # Etiqueta pequeña: frontera grande
+    (300.0, 200.0, 5000, 8, 0.0),   # Casi no cabe en ninguna máquina
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vueltas', type=int, default=50)
+    args = parser.parse_args()
+
+    candidatos = len(optimizador.Z_UNITS_LIST) * optimizador.MAX_REPETICIONES * optimizador.MAX_CAVIDADES
+    print(f"{candidatos} candidatos por llamada ({len(MAQUINAS)} máquinas)\n")
+    peor = 0.0
+    for pedido in PEDIDOS:
+        optimizador.optimizar(*pedido, maquinas=MAQUINAS)
+        inicio = time.perf_counter()
+        for _ in range(args.vueltas):
+            resultado = optimizador.optimizar(*pedido, maquinas=MAQUINAS)
+        ms = (time.perf_counter() - inicio) * 1000 / args.vueltas
+        peor = max(peor, ms)
+        print(f"ancho={pedido[0]:>5} largo={pedido[1]:>5} cantidad={pedido[2]:>8}: {ms:6.2f} ms, {len(resultado)} montajes en la frontera")
+    print(f"\nPeor caso: {peor:.2f} ms ({'OK' if peor < 50 else 'supera'} el objetivo de 50 ms)")
+
+
+if __name__ == '__main__':
+    main()
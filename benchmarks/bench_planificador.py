@@ -0,0 +1,76 @@
+"""Benchmark del planificador de capacidad (objetivo: < 1 s con miles de proyectos abiertos).
+
+Crea una base temporal con N proyectos abiertos repartidos por todas las
+etapas (una parte corriendo en una máquina, otra pausada) y un historial de
+etapas cerradas en ``kpi_diario``, y mide ``planificador.planificar``.
+
+Uso:
+    python benchmarks/bench_planificador.py [--proyectos 5000] [--vueltas 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def poblar(conn, planificador, n):
+    random.seed(0)
+    ahora = datetime.now()
+    etapas = planificador.ESTADOS_FLUJO[:-1]
+    proyectos, ventas, tecnica, log = [], [], [], []
+    for pid in range(1, n + 1):
+        etapa = random.choice(etapas)
+        pausado = random.random() < 0.05
+        inicio = ahora - timedelta(minutes=random.randint(0, 600))
+        maquinas = planificador.MAQUINAS_POR_ESTADO.get(etapa)
+        maquina = random.choice(maquinas) if maquinas else None
+        proyectos.append((pid, "Pausado" if pausado else etapa, etapa if pausado else None, random.choice(["Normal", "Normal", "Alta", "Urgente"])))
+        ventas.append((pid, f"Cliente {pid % 50}", f"Ref {pid}", f"OP{pid}", (date.today() + timedelta(days=random.randint(-2, 30))).isoformat()))
+        tecnica.append((pid, float(random.randint(200, 20000))))
+        log.append((pid, etapa, inicio - timedelta(minutes=30), inicio, maquina))
+        log.append((pid, "Pausado" if pausado else etapa, inicio, None, "Motivo: Almuerzo" if pausado else maquina))
+    conn.executemany("INSERT INTO proyectos (id, estado, estado_anterior, prioridad) VALUES (?, ?, ?, ?)", proyectos)
+    conn.executemany("INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, orden_produccion, fecha_entrega) VALUES (?, ?, ?, ?, ?)", ventas)
+    conn.executemany("INSERT INTO info_tecnica (proyecto_id, metros_lineales) VALUES (?, ?)", tecnica)
+    conn.executemany("INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, timestamp_fin, maquina_utilizada) VALUES (?, ?, ?, ?, ?)", log)
+    # Historial para el modelo de duraciones: una fila de kpi_diario por etapa y máquina
+    for estado in etapas:
+        for maquina in planificador.MAQUINAS_POR_ESTADO.get(estado, ['']):
+            metros = 5000.0 if estado == "Impresion" else 0.0
+            conn.execute("INSERT INTO kpi_diario (dia, estado, maquina, responsable, etapas, minutos, metros_impresos, desperdicio, cantidad_cores, numero_cajas) VALUES (?, ?, ?, '', ?, ?, ?, 0, 0, 0)",
+                         (date.today().isoformat(), estado, maquina, 20, 20 * random.randint(30, 240), metros))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proyectos', type=int, default=5000)
+    parser.add_argument('--vueltas', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['PRODUCCION_DB'] = os.path.join(tempfile.mkdtemp(), 'bench_planificador.db')
+    import base_datos
+    import migraciones
+    import planificador
+    migraciones.asegurar_esquema()
+    with base_datos.conexion() as conn:
+        poblar(conn, planificador, args.proyectos)
+        planificador.planificar(conn)
+        inicio = time.perf_counter()
+        for _ in range(args.vueltas):
+            proyectos, tareas = planificador.planificar(conn)
+        ms = (time.perf_counter() - inicio) * 1000 / args.vueltas
+
+    print(f"{len(proyectos)} proyectos abiertos, {len(tareas)} tareas de máquina: {ms:.1f} ms por plan")
+    print(f"{int(proyectos['en_riesgo'].sum())} no llegan a la entrega; cola vacía el {proyectos['fin_previsto'].max():%Y-%m-%d %H:%M}")
+    print(f"{'OK' if ms < 1000 else 'Supera'} el objetivo de 1 s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark del secuenciador de impresión (objetivo: cientos de trabajos por máquina de forma interactiva).
+
+Genera trabajos sintéticos (material, Z y 4-8 unidades de color tomados de
+conjuntos chicos, como en planta) y mide ``componentes_cambio`` +
+``ordenar`` para varias longitudes de cola. Compara los minutos de cambio
+de la secuencia con los del orden de llegada y con el vecino más cercano
+solo (sin 2-opt).
+
+Uso:
+    python benchmarks/bench_secuenciador.py [--trabajos 100 300 600] [--vueltas 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MATERIALES = ["PPBB", "PP Transparente", "Couche", "Térmico", "PET Metalizado"]
+Z = [76, 80, 88, 96, 106, 120]
+ANILOX = ["348", "440", "813", "914"]
+PANTONES = [f"P-{n}C" for n in (185, 286, 354, 109, 21, 32, 300, 7406, 485, 347, 2945, 165)]
+
+
+def trabajos_sinteticos(n):
+    trabajos = pd.DataFrame({
+        'proyecto_id': range(1, n + 1),
+        'material': [random.choice(MATERIALES) for _ in range(n)],
+        'z': [random.choice(Z) for _ in range(n)],
+    })
+    colores_por_id = {}
+    for pid in trabajos['proyecto_id']:
+        unidades = random.randint(4, 8)
+        colores_por_id[pid] = [{'anilox': random.choice(ANILOX), 'tipo_color': "Policromía" if slot < 4 else "Pantone",
+                                'codigo_color': "" if slot < 4 else random.choice(PANTONES)} for slot in range(unidades)]
+    return trabajos, colores_por_id
+
+
+def vecino_mas_cercano(costos):
+    n = len(costos)
+    ruta, pendientes = [0], np.ones(n, dtype=bool)
+    pendientes[0] = False
+    for _ in range(n - 1):
+        siguiente = int(np.argmin(np.where(pendientes, costos[ruta[-1]], np.inf)))
+        ruta.append(siguiente)
+        pendientes[siguiente] = False
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trabajos', type=int, nargs='+', default=[100, 300, 600])
+    parser.add_argument('--vueltas', type=int, default=3)
+    args = parser.parse_args()
+
+    import secuenciador
+    random.seed(0)
+    for n in args.trabajos:
+        trabajos, colores_por_id = trabajos_sinteticos(n)
+        inicio = time.perf_counter()
+        for _ in range(args.vueltas):
+            costos = secuenciador.matriz_costos(secuenciador.componentes_cambio(trabajos, colores_por_id))
+            ruta = secuenciador.ordenar(costos)
+        ms = (time.perf_counter() - inicio) * 1000 / args.vueltas
+        llegada = secuenciador._costo_ruta(costos, list(range(n)))
+        voraz = secuenciador._costo_ruta(costos, vecino_mas_cercano(costos))
+        propuesta = secuenciador._costo_ruta(costos, ruta)
+        print(f"{n:5d} trabajos: {ms:7.1f} ms | cambio {llegada / 60:6.1f} h en orden de llegada, "
+              f"{voraz / 60:6.1f} h vecino más cercano, {propuesta / 60:6.1f} h con 2-opt ({1 - propuesta / llegada:.0%} menos)")
+
+
+if __name__ == '__main__':
+    main()
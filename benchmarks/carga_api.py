@@ -0,0 +1,143 @@
+"""Prueba de carga de la API de solo lectura (api.py) contra una instancia local.
+
+Sin ``--url`` arranca ``api.py`` como proceso aparte sobre una BD sintética
+(mismo poblado que verificar_planes.py). N clientes con conexión persistente
+simulan kioscos que consultan en bucle una mezcla de rutas, reenviando el
+último ETag en ``If-None-Match`` y aceptando gzip. Con ``--escrituras`` un
+hilo más marca cambios de datos cada tanto (como si una tablet avanzara un
+proyecto) para forzar respuestas completas.
+
+Informa peticiones por segundo, latencia p50/p95, proporción de 304 y bytes
+transferidos.
+
+Uso:
+    python benchmarks/carga_api.py [--clientes 20] [--segundos 10] [--escrituras 1.0] [--url http://host:8502] [--token SECRETO]
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RUTAS = [
+    "/api/salud",
+    "/api/proyectos?estado=Impresion&limite=50",
+    "/api/proyectos?maquina=SP1",
+    "/api/proyectos?prioridad=Urgente&limite=100",
+    "/api/proyectos/{id}",
+    "/api/proyectos/{id}/log",
+    "/api/kpis?por=maquina",
+    "/api/kpis?por=semana",
+]
+
+
+def kiosco(host, puerto, fin, n_proyectos, resultados, latencias, token=None):
+    conn = http.client.HTTPConnection(host, puerto, timeout=30)
+    etags = {}
+    # Cada kiosco mira siempre los mismos pocos proyectos, como una pantalla fija
+    ids = [random.randint(1, n_proyectos) for _ in range(3)]
+    while time.monotonic() < fin:
+        ruta = random.choice(RUTAS).format(id=random.choice(ids))
+        cabeceras = {'Accept-Encoding': 'gzip'}
+        if token:
+            cabeceras['Authorization'] = f"Bearer {token}"
+        if ruta in etags:
+            cabeceras['If-None-Match'] = etags[ruta]
+        inicio = time.perf_counter()
+        conn.request('GET', ruta, headers=cabeceras)
+        respuesta = conn.getresponse()
+        cuerpo = respuesta.read()
+        latencias.append(time.perf_counter() - inicio)
+        resultados[respuesta.status] += 1
+        resultados['bytes'] += len(cuerpo)
+        if respuesta.getheader('ETag'):
+            etags[ruta] = respuesta.getheader('ETag')
+    conn.close()
+
+
+def escritor(fin, intervalo):
+    import base_datos
+    while time.monotonic() < fin:
+        time.sleep(intervalo)
+        with base_datos.transaccion() as conn:
+            base_datos.marcar_cambio(conn)
+
+
+def esperar_puerto(host, puerto, segundos=30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            conn = http.client.HTTPConnection(host, puerto, timeout=1)
+            conn.request('GET', '/api/salud')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"La API no respondió en {host}:{puerto}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=20)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--escrituras', type=float, default=1.0, help="Segundos entre cambios de datos (0 = sin escrituras)")
+    parser.add_argument('--proyectos', type=int, default=10000)
+    parser.add_argument('--url', help="API ya levantada (no se crea BD ni proceso)")
+    parser.add_argument('--puerto', type=int, default=8599)
+    parser.add_argument('--token', default=os.environ.get('PRODUCCION_API_TOKEN'), help="Token de la API (default: PRODUCCION_API_TOKEN)")
+    args = parser.parse_args()
+
+    proceso = None
+    if args.url:
+        partes = urlsplit(args.url)
+        host, puerto = partes.hostname, partes.port or 80
+    else:
+        ruta = os.path.join(tempfile.mkdtemp(), 'carga_api.db')
+        os.environ['PRODUCCION_DB'] = ruta
+        import migraciones
+        import resumen_diario
+        from verificar_planes import poblar
+        migraciones.asegurar_esquema()
+        poblar(ruta, args.proyectos, args.proyectos * 10)
+        resumen_diario.reconstruir()
+        host, puerto = '127.0.0.1', args.puerto
+        proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, 'api.py'), '--host', host, '--puerto', str(puerto)],
+                                   env={**os.environ, 'PRODUCCION_DB': ruta, 'PRODUCCION_API_TOKEN': args.token or ''}, stdout=subprocess.DEVNULL)
+    try:
+        esperar_puerto(host, puerto)
+        fin = time.monotonic() + args.segundos
+        por_cliente = [(Counter(), []) for _ in range(args.clientes)]
+        hilos = [threading.Thread(target=kiosco, args=(host, puerto, fin, args.proyectos, r, l, args.token)) for r, l in por_cliente]
+        if args.escrituras > 0 and not args.url:
+            hilos.append(threading.Thread(target=escritor, args=(fin, args.escrituras)))
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+    finally:
+        if proceso:
+            proceso.terminate()
+            proceso.wait()
+
+    resultados = sum((r for r, _ in por_cliente), Counter())
+    latencias = sorted(x for _, l in por_cliente for x in l)
+    total = len(latencias)
+    print(f"{args.clientes} kioscos, {segundos:.1f} s: {total} peticiones ({total / segundos:.0f}/s)")
+    print(f"Latencia p50 {latencias[total // 2] * 1000:.1f} ms, p95 {latencias[int(total * 0.95)] * 1000:.1f} ms")
+    print(f"200: {resultados[200]}  304: {resultados[304]} ({resultados[304] / total:.0%})  otros: {total - resultados[200] - resultados[304]}")
+    print(f"Transferido: {resultados['bytes'] / 1024:.0f} KB ({resultados['bytes'] / total:.0f} B por petición)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Prueba de estrés de transiciones de estado con escritores concurrentes.
+
+Varios hilos (como varias tablets sobre el mismo servidor Streamlit) avanzan,
+pausan y reanudan al azar un puñado de proyectos compartidos, siempre
+indicando el estado que "vieron" (concurrencia optimista). Al final se
+verifican los invariantes del log:
+
+- cada proyecto tiene exactamente una entrada abierta y coincide con ``proyectos.estado``;
+- la cadena del log no tiene huecos ni solapes (cada cierre es el inicio de la siguiente);
+- se agregó exactamente una fila de log por transición exitosa;
+- ningún proyecto pausado recuerda 'Pausado' como estado anterior;
+- ``kpi_diario`` coincide con una reconstrucción completa.
+
+Termina con código 1 si alguno falla.
+
+Uso:
+    python benchmarks/estres_transiciones.py [--hilos 8] [--proyectos 5] [--operaciones 200]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ESTADOS = ["Diseño", "Preprensa", "Impresion", "Control calidad", "Troquelado", "Despacho"]
+
+
+def escritor(transiciones, base_datos, proyectos, operaciones, resultados, barrera):
+    """Un hilo = una tablet. ``resultados`` es un Counter propio del hilo."""
+    barrera.wait()
+    for _ in range(operaciones):
+        pid = random.choice(proyectos)
+        with base_datos.conexion() as conn:
+            visto = conn.execute("SELECT estado FROM proyectos WHERE id = ?", (pid,)).fetchone()[0]
+        time.sleep(random.random() * 0.002)  # El operario "piensa": otra tablet puede adelantarse
+        try:
+            if visto == transiciones.ESTADO_PAUSA:
+                transiciones.reanudar(pid, 'admin')
+            elif random.random() < 0.3:
+                transiciones.pausar(pid, 'admin', "Almuerzo", estado_esperado=visto)
+            else:
+                siguiente = ESTADOS[(ESTADOS.index(visto) + 1) % len(ESTADOS)]
+                transiciones.cambiar_estado(pid, siguiente, 'admin', estado_esperado=visto, maquina="SP1",
+                                            responsable="estres", metros_impresos=10.0, desperdicio=1.0)
+            resultados['ok'] += 1
+        except transiciones.ConflictoEstado:
+            resultados['conflictos'] += 1
+
+
+def verificar(conn, filas_iniciales, exitos, resumen_diario):
+    fallos = []
+    abiertos = conn.execute('''
+        SELECT p.id, p.estado, COUNT(pl.id), MAX(pl.estado)
+        FROM proyectos p LEFT JOIN proyectos_log pl ON pl.proyecto_id = p.id AND pl.timestamp_fin IS NULL
+        GROUP BY p.id
+    ''').fetchall()
+    for pid, estado, n_abiertos, estado_log in abiertos:
+        if n_abiertos != 1 or estado_log != estado:
+            fallos.append(f"proyecto {pid}: {n_abiertos} entradas abiertas, log en '{estado_log}', proyecto en '{estado}'")
+    huecos = conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT timestamp_fin, LEAD(timestamp_inicio) OVER (PARTITION BY proyecto_id ORDER BY id) AS siguiente
+            FROM proyectos_log
+        ) WHERE siguiente IS NOT NULL AND (timestamp_fin IS NULL OR timestamp_fin <> siguiente)
+    ''').fetchone()[0]
+    if huecos:
+        fallos.append(f"{huecos} cierres del log no coinciden con el inicio de la etapa siguiente")
+    total = conn.execute("SELECT COUNT(*) FROM proyectos_log").fetchone()[0]
+    if total != filas_iniciales + exitos:
+        fallos.append(f"{total} filas de log, se esperaban {filas_iniciales + exitos}")
+    pausas_mal = conn.execute("SELECT COUNT(*) FROM proyectos WHERE estado = 'Pausado' AND (estado_anterior IS NULL OR estado_anterior = 'Pausado')").fetchone()[0]
+    if pausas_mal:
+        fallos.append(f"{pausas_mal} proyectos pausados sin estado al que volver")
+
+    incremental = conn.execute("SELECT dia, estado, maquina, responsable, tramos, etapas, ROUND(minutos, 6), metros_impresos FROM kpi_diario ORDER BY 1, 2, 3, 4").fetchall()
+    conn.execute("BEGIN")
+    resumen_diario.reconstruir_tabla(conn.cursor())
+    reconstruido = conn.execute("SELECT dia, estado, maquina, responsable, tramos, etapas, ROUND(minutos, 6), metros_impresos FROM kpi_diario ORDER BY 1, 2, 3, 4").fetchall()
+    conn.execute("ROLLBACK")
+    if incremental != reconstruido:
+        fallos.append("kpi_diario incremental no coincide con la reconstrucción completa")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--proyectos', type=int, default=5, help="Pocos proyectos = más choques entre tablets")
+    parser.add_argument('--operaciones', type=int, default=200, help="Operaciones por hilo")
+    args = parser.parse_args()
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'estres.db')
+    os.environ['PRODUCCION_DB'] = ruta
+    logging.disable(logging.WARNING)  # Streamlit en modo "bare" avisa por cada st.* sin sesión
+
+    import base_datos
+    import resumen_diario
+    import transiciones
+    import app_empresa
+    base_datos.DB_PATH = ruta
+    app_empresa.init_db()
+    for i in range(args.proyectos):
+        app_empresa.agregar_proyecto(f"Cliente {i}", f"Ref {i}", "PPBB", "Lam Mate", "50x30", date.today(), ESTADOS[0], 'admin', None, 1000, 10.0, "P", f"OP{i}", 1, datetime.now(), "R1", 1000, "1 pulgada", 100.0, 4, "Normal", None, "No", "", "")
+    with base_datos.conexion() as conn:
+        proyectos = [fila[0] for fila in conn.execute("SELECT id FROM proyectos")]
+        filas_iniciales = conn.execute("SELECT COUNT(*) FROM proyectos_log").fetchone()[0]
+
+    por_hilo = [Counter() for _ in range(args.hilos)]
+    barrera = threading.Barrier(args.hilos)
+    hilos = [threading.Thread(target=escritor, args=(transiciones, base_datos, proyectos, args.operaciones, r, barrera))
+             for r in por_hilo]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    segundos = time.perf_counter() - inicio
+    resultados = sum(por_hilo, Counter())
+
+    with base_datos.conexion() as conn:
+        fallos = verificar(conn, filas_iniciales, resultados['ok'], resumen_diario)
+    intentos = args.hilos * args.operaciones
+    print(f"{intentos} intentos en {segundos:.2f} s ({intentos / segundos:.0f}/s): "
+          f"{resultados['ok']} aplicados, {resultados['conflictos']} rechazados por conflicto")
+    for f in fallos:
+        print(f"FALLO  {f}")
+    print("Invariantes OK." if not fallos else f"{len(fallos)} invariantes violados.")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == '__main__':
+    main()
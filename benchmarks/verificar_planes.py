@@ -0,0 +1,195 @@
+"""Verificación de planes de consulta (regresión de índices).
+
+Crea una BD sintética (por defecto 10.000 proyectos y 100.000 filas de
+log), ejecuta las funciones de datos reales de app_empresa.py registrando
+cada sentencia SQL que llega a SQLite, y corre ``EXPLAIN QUERY PLAN`` sobre
+cada una. Termina con código 1 si alguna hace un recorrido completo de
+tabla (``SCAN tabla`` sin índice) que no esté en la lista de lecturas
+completas intencionales.
+
+Es una herramienta manual para revisar toda la app con volumen; la
+verificación automática de las funciones de consulta está en
+tests/test_planes.py (``python -m pytest tests``).
+
+Uso:
+    python benchmarks/verificar_planes.py [--proyectos 10000] [--logs 100000]
+"""
+import argparse
+import io
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Lecturas completas intencionales: (patrón de la sentencia, motivo)
+SCANS_PERMITIDOS = [
+    (r"^\s*SELECT\s+p\.id, p\.fecha_creacion.*FROM proyectos p\s+LEFT JOIN.*LEFT JOIN info_troquel tr ON p\.id = tr\.proyecto_id\s*$",
+     "snapshot completo de ver_proyectos (cacheado por versión de datos)"),
+    (r"ORDER BY p\.id LIMIT \d+\s*$", "página del listado: recorrido por rowid acotado por LIMIT"),
+    (r"^SELECT COUNT\(\*\) FROM proyectos$", "sonda de salud (cacheada 60 s)"),
+    (r"FROM kpi_diario\s", "tablero: kpi_diario tiene una fila por día/estado/máquina/responsable"),
+    (r"FROM proyectos p\s+LEFT JOIN.*WHERE p\.estado <> \S+\s*$", "planificador: todos los proyectos abiertos (cacheado por versión de datos)"),
+    (r"FROM troqueles\s+ORDER BY desgaste_pct IS NULL", "inventario de troqueles en Configuración (una fila por troquel físico)"),
+    (r"SELECT seq FROM sqlite_sequence WHERE name = 'proyectos'", "importación en bloque: sqlite_sequence tiene una fila por tabla AUTOINCREMENT"),
+    (r"LEFT JOIN info_troquel tr ON p\.id = tr\.proyecto_id\s+ORDER BY p\.id\s*$", "exportación completa de proyectos: recorrido por rowid en bloques"),
+    (r"FROM proyectos_log pl\s+LEFT JOIN usuarios u ON .*\s+ORDER BY pl\.id\s*$", "exportación completa del log: recorrido por rowid en bloques"),
+]
+
+ESTADOS = ["Por aprobar", "Diseño", "Preprensa", "Impresion", "Control calidad", "Troquelado", "Despacho", "Entregado"]
+MAQUINAS = ["SP1", "FIT 350", "SUPERPRINT", "MARK ANDY", "Controladora 1", "Troqueladora Plana"]
+
+
+def poblar(ruta, n_proyectos, n_logs):
+    conn = sqlite3.connect(ruta)
+    base = datetime(2024, 1, 1)
+    proyectos, ventas, tecnica, preprensa, troquel, colores = [], [], [], [], [], []
+    for i in range(1, n_proyectos + 1):
+        estado = random.choice(ESTADOS)
+        proyectos.append((i, f"Cliente {i % 300}", f"Ref {i}", base + timedelta(hours=i), estado, None, random.choice(["Normal", "Alta", "Urgente"])))
+        ventas.append((i, f"Cliente {i % 300}", f"Ref {i}", f"P{i}", f"OP{i}", (date(2024, 1, 1) + timedelta(days=i % 900)).isoformat(), 10000))
+        ancho, largo = random.randint(20, 120), random.randint(20, 120)
+        tecnica.append((i, "PPBB", "Lam Mate", f"{ancho}x{largo}", 120.0, 2, ancho, largo))
+        preprensa.append((i, "IFLEXO", 500.0, 4))
+        troquel.append((i, "Si", f"T-{ancho}-{largo}", "") if i % 3 else (i, "No", "", ""))
+        colores.extend((i, slot, random.choice(["348", "440", "813"]), "Pantone", f"P-{random.randint(100, 999)}C") for slot in range(1, 5))
+    conn.executemany("INSERT INTO proyectos (id, cliente, nombre_proyecto, fecha_creacion, estado, imagen_path, prioridad) VALUES (?, ?, ?, ?, ?, ?, ?)", proyectos)
+    conn.executemany("INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada) VALUES (?, ?, ?, ?, ?, ?, ?)", ventas)
+    conn.executemany("INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, ancho_mm, largo_mm) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", tecnica)
+    conn.executemany("INSERT INTO info_preprensa (proyecto_id, proveedor_preprensa, area_preprensa_cm2, numero_colores) VALUES (?, ?, ?, ?)", preprensa)
+    conn.executemany("INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina) VALUES (?, ?, ?, ?)", troquel)
+    conn.executemany("INSERT INTO impresion_colores (proyecto_id, slot, anilox, tipo_color, codigo_color) VALUES (?, ?, ?, ?, ?)", colores)
+
+    logs = []
+    por_proyecto = max(1, n_logs // n_proyectos)
+    for i in range(1, n_proyectos + 1):
+        t = base + timedelta(hours=i)
+        for k in range(por_proyecto):
+            fin = t + timedelta(minutes=random.randint(5, 600))
+            abierto = k == por_proyecto - 1
+            logs.append((i, ESTADOS[k % len(ESTADOS)], t, None if abierto else fin, 1, random.choice(MAQUINAS)))
+            t = fin
+    conn.executemany("INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, timestamp_fin, usuario_id, maquina_utilizada) VALUES (?, ?, ?, ?, ?, ?)", logs)
+    # El inventario de troqueles y su uso los arman las migraciones (13 en adelante) sobre estos datos
+    import migraciones
+    conn.execute(f"PRAGMA user_version = {migraciones.MIGRACIONES.index(migraciones._m013_inventario_troqueles)}")
+    conn.commit()
+    conn.close()
+    migraciones.aplicar_migraciones(notificar=lambda mensaje: None)
+
+
+def ejercitar(app, n_proyectos):
+    """Llama a las funciones de datos de la app como lo haría la interfaz."""
+    pid = random.randint(1, n_proyectos)
+    app.get_user_id('admin')
+    app.get_user_role('admin')
+    app.login_user('admin', 'admin')
+    app.sonda_salud()
+    app.ver_proyectos()
+    filtros_base = {'solo_activos': True}
+    df, siguiente, _ = app.ver_pagina_proyectos(filtros_base, None, 20)
+    app.ver_pagina_proyectos(filtros_base, siguiente, 20)
+    for extra in [
+        {'estados': ['Impresion']},
+        {'prioridades': ['Urgente']},
+        {'cliente': 'Cliente 1'},
+        {'op': 'OP12'},
+        {'maquina': 'SP1'},
+        {'anilox': '440'},
+        {'codigo_color': 'p-185c'},
+        {'entrega_desde': date(2024, 3, 1), 'entrega_hasta': date(2024, 3, 7)},
+    ]:
+        app.ver_pagina_proyectos({**filtros_base, **extra}, None, 20)
+    app.ver_log_procesos(pid)
+    with app.conexion() as conn:
+        app.resumen_diario.kpis(conn, 'maquina', date(2024, 3, 1), date(2024, 3, 31))
+        app.analitica.entregas_por_periodo(conn, 'semana')
+    app.ver_plan()
+    app.ver_secuencia()
+    app.ver_cola_estacion(('Impresion', ('SP1',)))
+    app.ver_cola_estacion(('Despacho', ()))
+    with app.conexion() as conn:
+        app.colores.proyectos_con(conn, '440', estados=['Preprensa', 'Impresion'])
+        app.colores.proyectos_con(conn, codigo_color='P-185C')
+        app.troqueles.compatibles(conn, 50.0, 30.0, 2, radio_esquina_mm=2.0)
+        app.troqueles.inventario(conn)
+    exportaciones = tempfile.mkdtemp()
+    for conjunto in app.exportacion.CONJUNTOS:
+        app.exportacion.exportar(conjunto, 'csv', exportaciones, incremental='planes')
+    app.cambiar_estado_proyecto(pid, "Impresion", 'admin', maquina="SP1", proveedor_preprensa="IFLEXO")
+    app.guardar_detalles_impresion(pid, [{"anilox": "440", "tipo_color": "Pantone", "codigo_color": "P-185C"}])
+    app.actualizar_troquel(pid, "T-1", "L-1")
+    app.actualizar_proyecto_info(pid, "Cliente X", "Ref X", "PPBB", "Lam Mate", 1000, date.today(), "Normal", "OP", "P", "R1", "1 pulgada", 1000, 4, "50x30", 10.0, 100.0, "Si", "T-1", "L-1", None, "IFLEXO")
+    app.agregar_proyecto("Cliente Y", "Ref Y", "PPBB", "Lam Mate", "50x30", date.today(), "Diseño", 'admin', None, 1000, 10.0, "P", "OP", 1, datetime.now(), "R1", 1000, "1 pulgada", 100.0, 4, "Normal", None, "No", "", "")
+    app.importacion.importar(io.BytesIO(app.importacion.plantilla()), 'admin', nombre='pedidos.csv')
+    for conjunto in app.exportacion.CONJUNTOS:
+        app.exportacion.exportar(conjunto, app.exportacion.FORMATOS[-1], exportaciones, incremental='planes')
+    app.eliminar_proyecto(pid)
+
+
+def es_permitido(sql):
+    for patron, _motivo in SCANS_PERMITIDOS:
+        if re.search(patron, sql, re.DOTALL):
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proyectos', type=int, default=10000)
+    parser.add_argument('--logs', type=int, default=100000)
+    args = parser.parse_args()
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'planes.db')
+    os.environ['PRODUCCION_DB'] = ruta
+    logging.disable(logging.WARNING)  # Streamlit en modo "bare" avisa por cada st.* sin sesión
+
+    import base_datos
+    base_datos.DB_PATH = ruta
+    sentencias = []
+    nueva_conexion_original = base_datos._nueva_conexion
+
+    def nueva_conexion_trazada(r):
+        conn = nueva_conexion_original(r)
+        conn.set_trace_callback(sentencias.append)
+        return conn
+
+    import app_empresa
+    app_empresa.init_db()
+    poblar(ruta, args.proyectos, args.logs)
+
+    base_datos.cerrar_conexiones()
+    base_datos._nueva_conexion = nueva_conexion_trazada
+    ejercitar(app_empresa, args.proyectos)
+    base_datos._nueva_conexion = nueva_conexion_original
+
+    conn = sqlite3.connect(ruta)
+    fallos = 0
+    vistas = set()
+    for sql in sentencias:
+        sql_limpio = sql.strip()
+        if sql_limpio in vistas or re.match(r"^(BEGIN|COMMIT|ROLLBACK|PRAGMA)\b", sql_limpio, re.IGNORECASE):
+            continue
+        vistas.add(sql_limpio)
+        plan = [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql_limpio}")]
+        scans = [p for p in plan if re.match(r"^SCAN \w+( AS \w+)?$", p)]
+        resumen = " ".join(sql_limpio.split())[:110]
+        if scans and not es_permitido(sql_limpio):
+            fallos += 1
+            print(f"FALLO  {resumen}\n       plan: {' | '.join(plan)}")
+        else:
+            print(f"ok     {resumen}")
+    conn.close()
+
+    print(f"\n{len(vistas)} sentencias verificadas, {fallos} con recorrido completo no permitido.")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Cola por estación para las cuentas de operario (tablets de máquina).
+
+Cada operario ("IMPRESOR SP1", "CONTROLADOR 3", "TROQUELADOR1", ...) se
+asocia a una etapa y a sus máquinas según ``MAQUINAS_POR_ESTADO``. Su cola
+es lo que le toca ver en la tablet, en este orden:
+
+1. lo que está en su etapa y en su máquina (``proyectos.maquina_actual``),
+2. lo pausado en su etapa y máquina,
+3. lo que está en su etapa sin máquina asignada (dado de alta directamente
+   en la etapa o importado): aparece en todas las máquinas de la etapa,
+4. lo que está en la etapa anterior (lo siguiente que le llega),
+
+cada grupo por prioridad y fecha de entrega; 3 y 4 son "siguiente". Cada rama del WHERE usa el
+índice ``(estado, maquina_actual)``, así que el costo depende del tamaño de
+la cola y no del total de proyectos. Sin dependencia de Streamlit.
+"""
+import json
+import re
+
+import pandas as pd
+
+from consultas import SQL_PROYECTOS
+from planificador import ESTADO_PAUSA, ESTADOS_FLUJO, MAQUINAS_POR_ESTADO
+
+# Prefijo del nombre de usuario (sin espacios, en mayúsculas) -> etapa que atiende
+PREFIJOS_ESTACION = [
+    ("IMPRESOR", "Impresion"),
+    ("CONTROLADOR", "Control calidad"),
+    ("TROQUELADOR", "Troquelado"),
+    ("DESPACHO", "Despacho"),
+]
+
+EN_CURSO = 'en_curso'
+PAUSADO = 'pausado'
+SIGUIENTE = 'siguiente'
+
+
+def _normalizar(nombre):
+    return re.sub(r"\s+", "", str(nombre)).upper()
+
+
+def estacion_de(username, maquinas_por_estado=None):
+    """``(estado, maquinas)`` que atiende el usuario, o None si no es de una estación.
+
+    Lo que sigue al prefijo elige la máquina: el nombre completo ("SP1",
+    "SUPERPRINT") o el número final ("CONTROLADOR 3" -> "Controladora 3").
+    Si no coincide con ninguna, la estación son todas las máquinas de la etapa.
+    """
+    maquinas_por_estado = maquinas_por_estado or MAQUINAS_POR_ESTADO
+    nombre = _normalizar(username)
+    for prefijo, estado in PREFIJOS_ESTACION:
+        if not nombre.startswith(prefijo):
+            continue
+        resto = nombre[len(prefijo):]
+        maquinas = maquinas_por_estado.get(estado, [])
+        propias = [m for m in maquinas if resto and (_normalizar(m) == resto or (resto.isdigit() and _normalizar(m).endswith(resto)))]
+        return estado, tuple(propias or maquinas)
+    return None
+
+
+def describir(estacion):
+    estado, maquinas = estacion
+    return f"{estado} · {', '.join(maquinas)}" if maquinas else estado
+
+
+def cola_estacion(conn, estado, maquinas=(), limite=50):
+    """Proyectos de la cola de la estación, con la columna ``posicion`` (en_curso, pausado, siguiente)."""
+    indice = ESTADOS_FLUJO.index(estado)
+    previo = ESTADOS_FLUJO[indice - 1] if indice > 0 else None
+    maquinas_json = json.dumps(list(maquinas))
+    if maquinas:
+        en_maquina = "p.maquina_actual IN (SELECT value FROM json_each(?))"
+        clausulas = [f"(p.estado = ? AND {en_maquina})", f"(p.estado = ? AND p.estado_anterior = ? AND {en_maquina})",
+                     "(p.estado = ? AND p.maquina_actual IS NULL)"]
+        params = [estado, maquinas_json, ESTADO_PAUSA, estado, maquinas_json, estado]
+        # Los de la etapa sin máquina van después de los pausados
+        orden_etapa = "CASE WHEN p.estado = ? AND p.maquina_actual IS NULL THEN 2 WHEN p.estado = ? THEN 0 WHEN p.estado = ? THEN 1 ELSE 3 END"
+        params_orden = [estado, estado, ESTADO_PAUSA]
+    else:
+        clausulas = ["p.estado = ?", "(p.estado = ? AND p.estado_anterior = ?)"]
+        params = [estado, ESTADO_PAUSA, estado]
+        orden_etapa = "CASE p.estado WHEN ? THEN 0 WHEN ? THEN 1 ELSE 2 END"
+        params_orden = [estado, ESTADO_PAUSA]
+    if previo:
+        clausulas.append("p.estado = ?")
+        params.append(previo)
+    query = f"""{SQL_PROYECTOS}
+        WHERE {' OR '.join(clausulas)}
+        ORDER BY {orden_etapa},
+                 CASE p.prioridad WHEN 'Urgente' THEN 0 WHEN 'Alta' THEN 1 ELSE 2 END,
+                 v.fecha_entrega IS NULL, v.fecha_entrega, p.id
+        LIMIT ?
+    """
+    df = pd.read_sql_query(query, conn, params=params + params_orden + [limite])
+    df['posicion'] = df['estado'].map({estado: EN_CURSO, ESTADO_PAUSA: PAUSADO}).fillna(SIGUIENTE)
+    if maquinas:
+        df.loc[(df['estado'] == estado) & df['maquina_actual'].isna(), 'posicion'] = SIGUIENTE
+    return df
@@ -0,0 +1,67 @@
+"""Colores de impresión normalizados: una fila por unidad de color del proyecto.
+
+Antes la lista de anilox/tipo/código de cada proyecto vivía como texto JSON
+en ``info_impresion.detalles_impresion``: había que parsear cada fila para
+saber, por ejemplo, qué trabajos abiertos usan el anilox 440. La tabla
+``impresion_colores`` (proyecto_id, slot) tiene índices por anilox y por
+código de color, así que esas preguntas son búsquedas por índice. Sin
+dependencia de Streamlit.
+"""
+import json
+
+import pandas as pd
+
+ANILOX_OPCIONES = ["XS", "S", "M", "L", "348", "440", "813", "914", "100", "711", "356", "559"]
+TIPOS_COLOR = ["Policromía", "Pantone"]
+
+
+def guardar(c, proyecto_id, detalles):
+    """Upsert de todas las unidades de color en un solo ``executemany`` y borra las que sobran."""
+    c.executemany('''
+        INSERT INTO impresion_colores (proyecto_id, slot, anilox, tipo_color, codigo_color) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (proyecto_id, slot) DO UPDATE SET
+            anilox = excluded.anilox, tipo_color = excluded.tipo_color, codigo_color = excluded.codigo_color
+    ''', [(proyecto_id, slot, d.get('anilox'), d.get('tipo_color'), (d.get('codigo_color') or '').strip())
+          for slot, d in enumerate(detalles, start=1)])
+    c.execute("DELETE FROM impresion_colores WHERE proyecto_id = ? AND slot > ?", (proyecto_id, len(detalles)))
+
+
+def borrar(c, proyecto_id):
+    c.execute("DELETE FROM impresion_colores WHERE proyecto_id = ?", (proyecto_id,))
+
+
+def cargar(conn, proyecto_ids):
+    """``{proyecto_id: [{anilox, tipo_color, codigo_color}, ...]}`` en orden de unidad, en una consulta."""
+    filas = conn.execute('''
+        SELECT proyecto_id, anilox, tipo_color, codigo_color FROM impresion_colores
+        WHERE proyecto_id IN (SELECT value FROM json_each(?))
+        ORDER BY proyecto_id, slot
+    ''', (json.dumps([int(i) for i in proyecto_ids]),)).fetchall()
+    colores = {}
+    for proyecto_id, anilox, tipo_color, codigo_color in filas:
+        colores.setdefault(proyecto_id, []).append({"anilox": anilox, "tipo_color": tipo_color, "codigo_color": codigo_color})
+    return colores
+
+
+def proyectos_con(conn, anilox=None, codigo_color=None, estados=None):
+    """Proyectos que usan un anilox y/o un código de color (sin distinguir mayúsculas), con sus unidades."""
+    clausulas, params = [], []
+    if anilox:
+        clausulas.append("ic.anilox = ?")
+        params.append(anilox)
+    if codigo_color:
+        clausulas.append("ic.codigo_color = ? COLLATE NOCASE")
+        params.append(codigo_color.strip())
+    if estados:
+        clausulas.append("p.estado IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(estados)))
+    where = f"WHERE {' AND '.join(clausulas)}" if clausulas else ""
+    return pd.read_sql_query(f'''
+        SELECT ic.proyecto_id, v.orden_produccion, v.cliente, v.nombre_proyecto, p.estado, p.maquina_actual,
+               v.fecha_entrega, ic.slot, ic.anilox, ic.tipo_color, ic.codigo_color
+        FROM impresion_colores ic
+        JOIN proyectos p ON p.id = ic.proyecto_id
+        LEFT JOIN info_ventas v ON v.proyecto_id = ic.proyecto_id
+        {where}
+        ORDER BY v.fecha_entrega IS NULL, v.fecha_entrega, ic.proyecto_id, ic.slot
+    ''', conn, params=params)
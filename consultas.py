@@ -0,0 +1,151 @@
+"""Consultas de solo lectura sobre proyectos, sin dependencia de Streamlit.
+
+Las usan la interfaz (app_empresa.py) y cualquier otro proceso que lea la
+misma base de datos. Todas reciben una conexión abierta (ver base_datos.py).
+"""
+import json
+
+import pandas as pd
+
+# JOIN masivo para reconstruir la vista completa del proyecto
+SQL_PROYECTOS = """
+    SELECT
+        p.id, p.fecha_creacion, p.estado, p.imagen_path, p.prioridad, p.estado_anterior, p.maquina_actual,
+        v.cliente, v.nombre_proyecto, v.numero_pedido, v.orden_produccion, v.fecha_entrega, v.cantidad_solicitada, v.logo_cliente_path,
+        t.material, t.acabado, t.medidas, t.metros_lineales, t.numero_cavidades, t.posicion_etiqueta, t.numero_core, t.cantidad_por_core,
+        t.ancho_mm, t.gap_ancho_mm, t.largo_mm, t.z, t.repeticiones, t.gap_avance_mm,
+        pp.proveedor_preprensa, pp.area_preprensa_cm2, pp.numero_colores,
+        tr.troquel_existente, tr.numero_troquel, tr.numero_lamina
+    FROM proyectos p
+    LEFT JOIN info_ventas v ON p.id = v.proyecto_id
+    LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
+    LEFT JOIN info_preprensa pp ON p.id = pp.proyecto_id
+    LEFT JOIN info_troquel tr ON p.id = tr.proyecto_id
+"""
+
+ESTADO_FINAL = "Entregado"
+
+
+def _where_filtros(filtros):
+    """Traduce el diccionario de filtros del listado a cláusulas WHERE con parámetros.
+
+    Claves reconocidas (todas opcionales):
+      solo_activos (bool), estados (lista), prioridades (lista), cliente (texto parcial),
+      op (texto parcial), entrega_desde / entrega_hasta (date o 'YYYY-MM-DD'),
+      maquina (máquina del proceso abierto en proyectos_log),
+      anilox / codigo_color (alguna unidad de color lo usa; ver colores.py).
+    Si se piden ``estados`` explícitos, ``solo_activos`` no se aplica (elegir
+    "Entregado" debe mostrar los entregados).
+    """
+    filtros = filtros or {}
+    clausulas, params = [], []
+    if filtros.get('solo_activos') and not filtros.get('estados'):
+        clausulas.append("p.estado <> ?")
+        params.append(ESTADO_FINAL)
+    if filtros.get('estados'):
+        estados = list(filtros['estados'])
+        clausulas.append(f"p.estado IN ({','.join('?' * len(estados))})")
+        params.extend(estados)
+    if filtros.get('prioridades'):
+        prioridades = list(filtros['prioridades'])
+        clausulas.append(f"p.prioridad IN ({','.join('?' * len(prioridades))})")
+        params.extend(prioridades)
+    if filtros.get('cliente'):
+        clausulas.append("v.cliente LIKE ?")
+        params.append(f"%{filtros['cliente']}%")
+    if filtros.get('op'):
+        clausulas.append("v.orden_produccion LIKE ?")
+        params.append(f"%{filtros['op']}%")
+    if filtros.get('entrega_desde'):
+        clausulas.append("v.fecha_entrega >= ?")
+        params.append(str(filtros['entrega_desde']))
+    if filtros.get('entrega_hasta'):
+        clausulas.append("v.fecha_entrega <= ?")
+        params.append(str(filtros['entrega_hasta']))
+    if filtros.get('maquina'):
+        clausulas.append("""EXISTS (
+            SELECT 1 FROM proyectos_log pl
+            WHERE pl.proyecto_id = p.id AND pl.timestamp_fin IS NULL AND pl.maquina_utilizada = ?
+        )""")
+        params.append(filtros['maquina'])
+    if filtros.get('anilox'):
+        clausulas.append("p.id IN (SELECT proyecto_id FROM impresion_colores WHERE anilox = ?)")
+        params.append(filtros['anilox'])
+    if filtros.get('codigo_color'):
+        clausulas.append("p.id IN (SELECT proyecto_id FROM impresion_colores WHERE codigo_color = ? COLLATE NOCASE)")
+        params.append(filtros['codigo_color'])
+    return clausulas, params
+
+
+def listar_proyectos(conn, filtros=None, despues_de=None, limite=20):
+    """Devuelve una página del listado filtrado con paginación por clave (keyset).
+
+    ``despues_de`` es el último ``id`` de la página anterior (None para la
+    primera). Devuelve ``(df, siguiente)``, donde ``siguiente`` es el cursor
+    de la próxima página o None si no hay más.
+    """
+    clausulas, params = _where_filtros(filtros)
+    if despues_de is not None:
+        clausulas.append("p.id > ?")
+        params.append(despues_de)
+    where = f"WHERE {' AND '.join(clausulas)}" if clausulas else ""
+    # Se pide una fila extra solo para saber si existe otra página
+    query = f"{SQL_PROYECTOS} {where} ORDER BY p.id LIMIT ?"
+    df = pd.read_sql_query(query, conn, params=params + [limite + 1])
+    siguiente = None
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        siguiente = int(df['id'].iloc[-1])
+    return df, siguiente
+
+
+def contar_proyectos(conn, filtros=None):
+    """Número total de proyectos que cumplen los filtros."""
+    clausulas, params = _where_filtros(filtros)
+    where = f"WHERE {' AND '.join(clausulas)}" if clausulas else ""
+    query = f"""
+        SELECT COUNT(*) FROM proyectos p
+        LEFT JOIN info_ventas v ON p.id = v.proyecto_id
+        {where}
+    """
+    return conn.execute(query, params).fetchone()[0]
+
+
+SQL_LOG_PROCESOS = """
+    SELECT pl.id, pl.proyecto_id, pl.estado, u.username, pl.maquina_utilizada, pl.timestamp_inicio, pl.timestamp_fin,
+           pl.responsable, pl.observaciones, pl.codigo_bobina, pl.metros_impresos, pl.desperdicio,
+           pl.cantidad_cores, pl.numero_cajas
+    FROM proyectos_log pl
+    LEFT JOIN usuarios u ON pl.usuario_id = u.id
+"""
+
+
+def calcular_duraciones(df, ahora=None):
+    """Convierte los timestamps del log y agrega ``duracion_min`` de forma vectorizada.
+
+    Las entradas abiertas (sin ``timestamp_fin``) se miden hasta ``ahora``
+    (por defecto, el momento de la llamada; un único valor para todas las filas).
+    """
+    ahora = pd.Timestamp(ahora) if ahora is not None else pd.Timestamp.now()
+    df['timestamp_inicio'] = pd.to_datetime(df['timestamp_inicio'], format='ISO8601')
+    df['timestamp_fin'] = pd.to_datetime(df['timestamp_fin'], format='ISO8601')
+    fin = df['timestamp_fin'].fillna(ahora)
+    df['duracion_min'] = ((fin - df['timestamp_inicio']).dt.total_seconds() / 60).round(2)
+    return df
+
+
+def logs_proyectos(conn, proyecto_ids=None, ahora=None):
+    """Logs de muchos proyectos en una sola consulta, con duraciones calculadas.
+
+    ``proyecto_ids`` puede ser cualquier iterable de ids (o None para todos).
+    Los ids viajan como un solo parámetro JSON, así no hay límite de variables
+    de SQLite y la búsqueda sigue usando el índice por ``proyecto_id``.
+    """
+    query = SQL_LOG_PROCESOS
+    params = []
+    if proyecto_ids is not None:
+        query += " WHERE pl.proyecto_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps([int(i) for i in proyecto_ids]))
+    query += " ORDER BY pl.proyecto_id, pl.timestamp_inicio"
+    df = pd.read_sql_query(query, conn, params=params)
+    return calcular_duraciones(df, ahora)
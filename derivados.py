@@ -0,0 +1,161 @@
+"""Derivados del arte subido: miniaturas y vistas medianas en caché.
+
+El listado mostraba cada arte a resolución completa en cada rerun (fotos
+de varios MB hacia tablets por Wi-Fi). Aquí se generan una vez versiones
+reducidas en WebP y se guardan en ``uploads/.derivados`` con el hash del
+contenido como nombre, así que dos proyectos con el mismo arte comparten
+derivados y un archivo reemplazado nunca sirve una miniatura vieja.
+
+Se generan al subir el archivo (``generar``) y, para archivos antiguos, la
+primera vez que se piden (``ruta_derivado``). De los PDF se rasteriza la
+primera página con pypdfium2; si no está instalado, los PDF no tienen
+derivado. El original completo se sirve solo bajo demanda (``leer_original``).
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+from PIL import Image, ImageOps
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Sin rasterizador: los PDF se ofrecen solo para descarga
+    pdfium = None
+
+import almacen
+
+DIR_UPLOADS = "uploads"
+DIR_DERIVADOS = os.path.join(DIR_UPLOADS, ".derivados")
+
+# Lado mayor en píxeles. La miniatura se muestra a 150 px: el doble para pantallas densas.
+TAMANOS = {
+    'miniatura': 300,
+    'vista': 1200,
+}
+CALIDAD_WEBP = 80
+EXTENSIONES_IMAGEN = ('.png', '.jpg', '.jpeg')
+EXTENSION_PDF = '.pdf'
+BLOQUE_HASH = 1024 * 1024
+# Archivos corruptos o ilegibles: se registran y se muestra el original o nada
+_ERRORES_LECTURA = (OSError, Image.DecompressionBombError) + ((pdfium.PdfiumError,) if pdfium else ())
+
+# Hash ya calculado por archivo: (ruta, tamaño, mtime) -> sha256. Evita releer el original en cada rerun.
+_hashes = {}
+_lock = threading.Lock()
+
+
+def es_imagen(ruta):
+    return bool(ruta) and ruta.lower().endswith(EXTENSIONES_IMAGEN)
+
+
+def es_pdf(ruta):
+    return bool(ruta) and ruta.lower().endswith(EXTENSION_PDF)
+
+
+def admite_derivado(ruta):
+    return es_imagen(ruta) or (pdfium is not None and es_pdf(ruta))
+
+
+def hash_contenido(ruta):
+    """SHA-256 del archivo leído por bloques, memorizado mientras no cambie en disco."""
+    sha = almacen.sha_de_ruta(ruta)
+    if sha:
+        return sha  # Objeto del almacén: el hash ya es su nombre
+    info = os.stat(ruta)
+    clave = (os.path.abspath(ruta), info.st_size, info.st_mtime_ns)
+    sha = _hashes.get(clave)
+    if sha is None:
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(BLOQUE_HASH), b''):
+                h.update(bloque)
+        sha = _hashes[clave] = h.hexdigest()
+    return sha
+
+
+def _rasterizar_pdf(ruta, lado):
+    """Primera página del PDF como imagen PIL con su lado mayor cerca de ``lado`` píxeles."""
+    pdf = pdfium.PdfDocument(ruta)
+    try:
+        pagina = pdf[0]
+        ancho, alto = pagina.get_size()  # En puntos (1/72 de pulgada)
+        return pagina.render(scale=lado / max(ancho, alto, 1)).to_pil()
+    finally:
+        pdf.close()
+
+
+def paginas_pdf(ruta):
+    """Número de páginas de un PDF (None si no se puede leer)."""
+    if pdfium is None:
+        return None
+    try:
+        with _lock:  # pdfium no admite llamadas concurrentes
+            pdf = pdfium.PdfDocument(ruta)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    except _ERRORES_LECTURA:
+        return None
+
+
+def _crear(ruta, tamano, destino):
+    if es_pdf(ruta):
+        img = _rasterizar_pdf(ruta, TAMANOS[tamano])
+    else:
+        img = Image.open(ruta)
+    with img:
+        img = ImageOps.exif_transpose(img)  # Fotos de celular: respetar la orientación
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if img.mode in ('LA', 'P', 'PA') or 'transparency' in img.info else 'RGB')
+        img.thumbnail((TAMANOS[tamano], TAMANOS[tamano]), Image.LANCZOS)
+        # Escritura atómica: otra sesión puede estar leyendo el mismo derivado
+        temporal = f"{destino}.{threading.get_ident()}.tmp"
+        img.save(temporal, 'WEBP', quality=CALIDAD_WEBP, method=4)
+    os.replace(temporal, destino)
+
+
+def ruta_derivado(ruta, tamano='miniatura'):
+    """Ruta del derivado (lo genera si falta). None si no es una imagen o no se pudo leer."""
+    if not admite_derivado(ruta) or not os.path.exists(ruta):
+        return None
+    try:
+        sha = hash_contenido(ruta)
+        destino = os.path.join(DIR_DERIVADOS, f"{sha}_{tamano}.webp")
+        if not os.path.exists(destino):
+            os.makedirs(DIR_DERIVADOS, exist_ok=True)
+            with _lock:
+                if not os.path.exists(destino):
+                    _crear(ruta, tamano, destino)
+        return destino
+    except _ERRORES_LECTURA as e:
+        print(f"No se pudo generar el derivado '{tamano}' de {ruta}: {e}")
+        return None
+
+
+def generar(ruta):
+    """Genera todos los derivados de un archivo recién subido."""
+    for tamano in TAMANOS:
+        ruta_derivado(ruta, tamano)
+
+
+def leer_original(ruta):
+    """Contenido completo del archivo (para descargas diferidas)."""
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+
+def borrar(sha):
+    """Borra los derivados de un contenido que ya no se usa."""
+    for tamano in TAMANOS:
+        destino = os.path.join(DIR_DERIVADOS, f"{sha}_{tamano}.webp")
+        if os.path.exists(destino):
+            os.remove(destino)
+
+
+def limpiar():
+    """Borra todos los derivados (se regeneran bajo demanda)."""
+    shutil.rmtree(DIR_DERIVADOS, ignore_errors=True)
+    with _lock:
+        _hashes.clear()
@@ -0,0 +1,53 @@
+"""Feed de cambios: tabla ``eventos`` de solo inserción, sin dependencia de Streamlit.
+
+Cada escritura sobre un proyecto (alta, edición, cambio de estado, baja)
+agrega una fila en la misma transacción que el cambio, así que el feed
+nunca muestra algo que no se confirmó. Los lectores guardan el último
+``id`` visto y piden lo posterior: es un rango sobre la clave primaria,
+barato aunque lo consulten veinte pantallas cada pocos segundos.
+
+La tabla se recorta sola: cada ``PURGAR_CADA`` eventos se borran los de
+más de ``RETENCION_DIAS``.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+RETENCION_DIAS = 7
+PURGAR_CADA = 1000
+
+ALTA = 'alta'
+EDICION = 'edicion'
+ESTADO = 'estado'
+BAJA = 'baja'
+
+
+def registrar(c, tipo, proyecto_id, estado=None, usuario=None, momento=None):
+    """Agrega un evento (llamar dentro de la transacción del cambio). Devuelve su id."""
+    momento = momento or datetime.now()
+    evento_id = c.execute("INSERT INTO eventos (momento, tipo, proyecto_id, estado, usuario) VALUES (?, ?, ?, ?, ?) RETURNING id",
+                          (momento, tipo, proyecto_id, estado, usuario)).fetchone()[0]
+    if evento_id % PURGAR_CADA == 0:
+        c.execute("DELETE FROM eventos WHERE momento < ?", (momento - timedelta(days=RETENCION_DIAS),))
+    return evento_id
+
+
+def registrar_varios(c, tipo, filas, usuario=None, momento=None):
+    """Como ``registrar`` para muchos proyectos a la vez; ``filas`` son pares (proyecto_id, estado)."""
+    momento = momento or datetime.now()
+    antes = ultimo_id(c)
+    c.executemany("INSERT INTO eventos (momento, tipo, proyecto_id, estado, usuario) VALUES (?, ?, ?, ?, ?)",
+                  [(momento, tipo, proyecto_id, estado, usuario) for proyecto_id, estado in filas])
+    if ultimo_id(c) // PURGAR_CADA > antes // PURGAR_CADA:
+        c.execute("DELETE FROM eventos WHERE momento < ?", (momento - timedelta(days=RETENCION_DIAS),))
+
+
+def ultimo_id(conn):
+    """Id del último evento (0 si no hay): el punto de partida de un lector nuevo."""
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+
+
+def posteriores(conn, despues_de, limite=500):
+    """Eventos con ``id > despues_de`` en orden, como DataFrame."""
+    return pd.read_sql_query("SELECT id, momento, tipo, proyecto_id, estado, usuario FROM eventos WHERE id > ? ORDER BY id LIMIT ?",
+                             conn, params=[despues_de, limite])
@@ -0,0 +1,249 @@
+"""Exportación de proyectos y del log de procesos a CSV o Parquet para ERP y BI.
+
+La única salida era descargar ``produccion.db`` entero. Aquí cada conjunto
+se lee con un cursor por bloques (``fetchmany``) y se escribe bloque a
+bloque, así que la memoria no crece con el tamaño de la base:
+
+- ``proyectos``: la vista completa de ``consultas.SQL_PROYECTOS``, una fila
+  por proyecto.
+- ``proyectos_log``: las etapas del log con el nombre del usuario.
+
+Exportación incremental: cada destino (p. ej. ``erp``) guarda una marca por
+conjunto en la tabla ``sistema``: el último evento del feed (eventos.py), el
+último id del log y el último ``timestamp_fin``. La siguiente exportación
+solo trae los proyectos con eventos posteriores y las etapas nuevas o
+cerradas desde entonces. Una etapa puede salir dos veces (al abrirse y al cerrarse), y las
+cerradas dentro de ``MARGEN_CIERRE`` antes de la marca se repiten, así que el
+destino debe hacer upsert por ``id``. Si los eventos de la marca ya se
+purgaron (``eventos.RETENCION_DIAS``), los proyectos salen completos.
+
+La marca se lee en la misma instantánea que los datos y se guarda solo si el
+archivo quedó escrito, así que un fallo a mitad de camino no pierde filas.
+
+Uso desde consola (p. ej. en el cron nocturno del ERP):
+    python exportacion.py proyectos_log --formato parquet --incremental erp
+    python exportacion.py proyectos --salida /srv/bi/proyectos.csv
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow solo se exporta a CSV
+    pa = pq = None
+
+import base_datos
+import eventos
+import migraciones
+from consultas import SQL_PROYECTOS
+
+DIR_EXPORTACIONES = "exportaciones"
+FILAS_POR_BLOQUE = 10000
+FORMATOS = ['csv', 'parquet'] if pq else ['csv']
+MARGEN_CIERRE = timedelta(minutes=5)
+
+SQL_LOG = """
+    SELECT pl.id, pl.proyecto_id, pl.estado, pl.timestamp_inicio, pl.timestamp_fin, pl.usuario_id, u.username AS usuario,
+           pl.maquina_utilizada, pl.responsable, pl.observaciones, pl.codigo_bobina, pl.metros_impresos, pl.desperdicio,
+           pl.cantidad_cores, pl.numero_cajas
+    FROM proyectos_log pl
+    LEFT JOIN usuarios u ON u.id = pl.usuario_id
+"""
+
+# Conjunto -> (consulta base, tablas de donde salen los tipos de sus columnas)
+CONJUNTOS = {
+    'proyectos': (SQL_PROYECTOS, ['proyectos', 'info_ventas', 'info_tecnica', 'info_preprensa', 'info_troquel']),
+    'proyectos_log': (SQL_LOG, ['proyectos_log', 'usuarios']),
+}
+
+
+def _clave_marca(destino, conjunto):
+    return f"exportacion:{destino}:{conjunto}"
+
+
+def leer_marca(conn, destino, conjunto):
+    """Marca de la última exportación incremental de ``conjunto`` a ``destino`` (None si nunca se exportó)."""
+    fila = conn.execute("SELECT valor FROM sistema WHERE clave = ?", (_clave_marca(destino, conjunto),)).fetchone()
+    return json.loads(fila[0]) if fila else None
+
+
+def borrar_marca(destino, conjunto):
+    """La próxima exportación incremental de ``conjunto`` a ``destino`` vuelve a ser completa."""
+    with base_datos.transaccion() as conn:
+        conn.execute("DELETE FROM sistema WHERE clave = ?", (_clave_marca(destino, conjunto),))
+
+
+def _marca_actual(conn):
+    return {
+        'evento_id': eventos.ultimo_id(conn),
+        'log_id': conn.execute("SELECT COALESCE(MAX(id), 0) FROM proyectos_log").fetchone()[0],
+        'log_fin': conn.execute("SELECT MAX(timestamp_fin) FROM proyectos_log WHERE timestamp_fin IS NOT NULL").fetchone()[0],
+        'momento': datetime.now().isoformat(' ', 'seconds'),
+    }
+
+
+def _consulta(conn, conjunto, marca):
+    """SQL y parámetros del conjunto completo o de lo posterior a ``marca``. También si salió completo."""
+    base = CONJUNTOS[conjunto][0]
+    if conjunto == 'proyectos':
+        primer_evento = conn.execute("SELECT MIN(id) FROM eventos").fetchone()[0]
+        # Sin marca, o con eventos posteriores a ella ya purgados: no se sabe qué cambió
+        if not marca or (primer_evento or 0) > marca['evento_id'] + 1:
+            return f"{base} ORDER BY p.id", [], True
+        return f"{base} WHERE p.id IN (SELECT proyecto_id FROM eventos WHERE id > ?) ORDER BY p.id", [marca['evento_id']], False
+    if not marca:
+        return f"{base} ORDER BY pl.id", [], True
+    # Etapas nuevas, y etapas viejas cerradas después de la marca (con margen por cierres que confirmaron tarde)
+    desde_fin = marca['log_fin']
+    if desde_fin:
+        desde_fin = (datetime.fromisoformat(desde_fin) - MARGEN_CIERRE).isoformat(' ')
+    return f"""
+        {base} WHERE pl.id > ?
+        UNION ALL
+        {base} WHERE pl.timestamp_fin > ? AND pl.id <= ?
+        ORDER BY 1
+    """, [marca['log_id'], desde_fin or '', marca['log_id']], False
+
+
+def _bloques(cursor, filas_por_bloque):
+    columnas = [d[0] for d in cursor.description]
+    while filas := cursor.fetchmany(filas_por_bloque):
+        yield pd.DataFrame.from_records(filas, columns=columnas)
+
+
+def _tipo_arrow(declarado):
+    declarado = (declarado or '').upper()
+    if 'INT' in declarado:
+        return pa.int64()
+    if any(t in declarado for t in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    if 'TIMESTAMP' in declarado or 'DATETIME' in declarado:
+        return pa.timestamp('us')
+    if 'DATE' in declarado:
+        return pa.date32()
+    return pa.string()
+
+
+def _esquema(conn, conjunto, columnas):
+    """Esquema Parquet a partir de los tipos declarados en las tablas (SQLite no tipa los resultados)."""
+    declarados = {}
+    for tabla in reversed(CONJUNTOS[conjunto][1]):
+        declarados.update({col: tipo for _, col, tipo, *_ in conn.execute(f"PRAGMA table_info({tabla})")})
+    return pa.schema([(col, _tipo_arrow(declarados.get(col))) for col in columnas])
+
+
+def _a_arrow(df, esquema):
+    """Convierte un bloque a los tipos del esquema; lo que no se pueda convertir queda nulo."""
+    for campo in esquema:
+        col = df[campo.name]
+        if pa.types.is_integer(campo.type):
+            df[campo.name] = pd.to_numeric(col, errors='coerce').astype('Int64')
+        elif pa.types.is_floating(campo.type):
+            df[campo.name] = pd.to_numeric(col, errors='coerce').astype(float)
+        elif pa.types.is_timestamp(campo.type) or pa.types.is_date(campo.type):
+            fechas = pd.to_datetime(col, format='ISO8601', errors='coerce')
+            df[campo.name] = fechas.dt.date if pa.types.is_date(campo.type) else fechas
+        else:
+            df[campo.name] = col.astype('string')
+    return pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+
+
+def _escribir(cursor, ruta, formato, esquema, filas_por_bloque):
+    """Escribe el cursor bloque a bloque en ``ruta``. Devuelve cuántas filas escribió."""
+    filas = 0
+    if formato == 'parquet':
+        with pq.ParquetWriter(ruta, esquema, compression='zstd') as escritor:
+            for bloque in _bloques(cursor, filas_por_bloque):
+                escritor.write_table(_a_arrow(bloque, esquema))
+                filas += len(bloque)
+        return filas
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        pd.DataFrame(columns=[d[0] for d in cursor.description]).to_csv(f, index=False)
+        for bloque in _bloques(cursor, filas_por_bloque):
+            bloque.to_csv(f, index=False, header=False)
+            filas += len(bloque)
+    return filas
+
+
+def exportar(conjunto, formato='csv', salida=DIR_EXPORTACIONES, incremental=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Exporta ``conjunto`` ('proyectos' o 'proyectos_log') a CSV o Parquet.
+
+    ``salida`` es un directorio (el archivo se nombra con conjunto y fecha) o la ruta del archivo.
+    Con ``incremental`` (nombre del destino, p. ej. 'erp') solo sale lo posterior a su marca, que se
+    actualiza al terminar. Devuelve un diccionario con ``archivo``, ``filas``, ``completa``,
+    ``marca`` y ``segundos``.
+    """
+    if conjunto not in CONJUNTOS:
+        raise ValueError(f"Conjunto desconocido: {conjunto}. Opciones: {', '.join(CONJUNTOS)}")
+    if formato not in FORMATOS:
+        raise ValueError("Para exportar a Parquet hace falta el paquete pyarrow (pip install pyarrow)." if formato == 'parquet'
+                         else f"Formato desconocido: {formato}")
+    inicio = time.perf_counter()
+    if os.path.isdir(salida) or not os.path.splitext(salida)[1]:
+        os.makedirs(salida, exist_ok=True)
+        sufijo = f"_{incremental}" if incremental else ""
+        base = os.path.join(salida, f"{conjunto}{sufijo}_{datetime.now():%Y%m%d_%H%M%S}")
+        salida, n = f"{base}.{formato}", 1
+        # Nunca pisar una exportación anterior: la marca ya avanzó con ella
+        while os.path.exists(salida):
+            n += 1
+            salida = f"{base}_{n}.{formato}"
+    temporal = salida + ".tmp"
+
+    with base_datos.conexion() as conn:
+        # Una sola instantánea (WAL): la marca y las filas exportadas coinciden aunque otros escriban
+        conn.execute("BEGIN")
+        marca = leer_marca(conn, incremental, conjunto) if incremental else None
+        nueva_marca = _marca_actual(conn)
+        sql, params, completa = _consulta(conn, conjunto, marca)
+        cursor = conn.execute(sql, params)
+        esquema = _esquema(conn, conjunto, [d[0] for d in cursor.description]) if formato == 'parquet' else None
+        try:
+            filas = _escribir(cursor, temporal, formato, esquema, filas_por_bloque)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        conn.execute("COMMIT")
+    os.replace(temporal, salida)
+
+    if incremental:
+        with base_datos.transaccion() as conn:
+            conn.execute("INSERT OR REPLACE INTO sistema (clave, valor) VALUES (?, ?)", (_clave_marca(incremental, conjunto), json.dumps(nueva_marca)))
+    return {'archivo': salida, 'filas': filas, 'completa': completa, 'marca': nueva_marca, 'segundos': time.perf_counter() - inicio}
+
+
+def leer(ruta):
+    """Contenido de un archivo exportado (descarga diferida desde Configuración)."""
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta proyectos o el log de procesos a CSV/Parquet para ERP y BI.")
+    parser.add_argument('conjunto', choices=list(CONJUNTOS))
+    parser.add_argument('--formato', choices=['csv', 'parquet'], help="Por defecto, la extensión de --salida o csv")
+    parser.add_argument('--salida', default=DIR_EXPORTACIONES, help=f"Directorio o archivo de salida (default: {DIR_EXPORTACIONES}/)")
+    parser.add_argument('--incremental', metavar='DESTINO', help="Solo lo nuevo desde la última exportación de este destino (p. ej. erp)")
+    parser.add_argument('--reiniciar', action='store_true', help="Con --incremental: olvidar la marca y exportar todo de nuevo")
+    parser.add_argument('--bloque', type=int, default=FILAS_POR_BLOQUE, help="Filas por lectura del cursor")
+    args = parser.parse_args()
+
+    migraciones.asegurar_esquema()
+    extension = os.path.splitext(args.salida)[1].lstrip('.').lower()
+    formato = args.formato or (extension if extension in ('csv', 'parquet') and not os.path.isdir(args.salida) else 'csv')
+    if args.incremental and args.reiniciar:
+        borrar_marca(args.incremental, args.conjunto)
+    resumen = exportar(args.conjunto, formato, args.salida, args.incremental, args.bloque)
+    alcance = "completo" if resumen['completa'] else "incremental"
+    print(f"{resumen['filas']} filas ({alcance}) en {resumen['archivo']} en {resumen['segundos']:.2f} s.")
+
+
+if __name__ == '__main__':
+    main()
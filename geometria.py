@@ -0,0 +1,86 @@
+"""Geometría de la etiqueta en columnas numéricas de ``info_tecnica``.
+
+El formulario de alta juntaba ancho, gap al ancho, cavidades, largo, Z,
+repeticiones y gap de avance en el texto ``medidas`` ("Ancho: 50.0mm (Gap:
+3.0mm) x 2 cavs, Largo: 40.0mm | Z96, 4 reps, Gap Avance: 36.20mm"), y la
+edición lo mostraba como texto libre: nada se podía filtrar ni reutilizar
+sin expresiones regulares. Ahora cada valor tiene su columna (la de
+cavidades es la ``numero_cavidades`` que ya existía) y ``medidas`` queda
+como descripción para mostrar, generada con ``formatear``.
+
+- ``extraer`` parsea textos ``medidas`` (el formato del formulario o "50x30")
+  cuando al alta o a la edición solo llega el texto.
+- ``calcular`` tiene las fórmulas del formulario (gap de avance, metros
+  lineales, área de plancha) y acepta escalares o arrays de NumPy/pandas;
+  el optimizador de montaje (optimizador.py) las usa sobre toda su grilla.
+- El índice ``(ancho_mm, largo_mm)`` deja filtrar proyectos por medidas;
+  los troqueles tienen su propio inventario por geometría (troqueles.py).
+
+Sin dependencia de Streamlit.
+"""
+import numpy as np
+import pandas as pd
+
+Z_PITCH_MM = 3.175  # 1/8 de pulgada en mm
+
+# Columnas de info_tecnica ('cavidades' es numero_cavidades)
+CAMPOS = ['ancho_mm', 'gap_ancho_mm', 'cavidades', 'largo_mm', 'z', 'repeticiones', 'gap_avance_mm']
+
+_NUMERO = r"(\d+(?:[.,]\d+)?)"
+PATRONES = {
+    'ancho_mm': rf"Ancho:\s*{_NUMERO}\s*mm",
+    'gap_ancho_mm': rf"\(Gap:\s*{_NUMERO}\s*mm\)",
+    'cavidades': r"(\d+)\s*cavs?\b",
+    'largo_mm': rf"Largo:\s*{_NUMERO}\s*mm",
+    'z': r"\bZ\s*(\d+)",
+    'repeticiones': r"(\d+)\s*reps?\b",
+    'gap_avance_mm': r"Gap Avance:\s*(-?\d+(?:[.,]\d+)?)\s*mm",
+}
+# Texto libre "ancho x largo" (p. ej. "50x30" o "50,5 x 30 mm")
+PATRON_SIMPLE = rf"^\s*{_NUMERO}\s*[xX×]\s*{_NUMERO}\s*(?:mm)?\s*$"
+
+
+def extraer(medidas):
+    """DataFrame con ``CAMPOS`` a partir de una Series de textos ``medidas`` (NaN si no aparece)."""
+    textos = pd.Series(medidas, dtype=object).fillna('').astype(str)
+    geo = pd.DataFrame(index=textos.index)
+    for campo, patron in PATRONES.items():
+        geo[campo] = pd.to_numeric(textos.str.extract(patron, expand=False).str.replace(',', '.'), errors='coerce')
+    simple = textos.str.extract(PATRON_SIMPLE)
+    for columna, campo in ((0, 'ancho_mm'), (1, 'largo_mm')):
+        geo[campo] = geo[campo].fillna(pd.to_numeric(simple[columna].str.replace(',', '.'), errors='coerce'))
+    return geo
+
+
+def desde_texto(medidas):
+    """Diccionario con ``CAMPOS`` (None si falta) para un solo texto ``medidas``."""
+    fila = extraer([medidas]).iloc[0]
+    return {campo: None if pd.isna(valor) else (int(valor) if campo in ('cavidades', 'z', 'repeticiones') else float(valor))
+            for campo, valor in fila.items()}
+
+
+def formatear(ancho_mm, gap_ancho_mm, cavidades, largo_mm, z, repeticiones, gap_avance_mm):
+    """Texto ``medidas`` en el formato del formulario de alta."""
+    return (f"Ancho: {ancho_mm}mm (Gap: {gap_ancho_mm}mm) x {cavidades} cavs, Largo: {largo_mm}mm | "
+            f"Z{z}, {repeticiones} reps, Gap Avance: {gap_avance_mm:.2f}mm")
+
+
+def calcular(ancho_mm, gap_ancho_mm, cavidades, largo_mm, z, repeticiones, cantidad=0, numero_colores=1):
+    """Circunferencia, gap de avance, metros lineales y área de plancha; escalares o arrays.
+
+    Cada vuelta del cilindro usa su circunferencia de material y da
+    ``repeticiones`` x ``cavidades`` etiquetas; los metros son las vueltas
+    enteras que hacen falta para ``cantidad``.
+    Área: ((ancho de montaje cm + 4) x (circunferencia cm + 2)) x colores.
+    """
+    circunferencia = np.round(np.asarray(z, dtype=float) * Z_PITCH_MM, 3)
+    paso = circunferencia / np.asarray(repeticiones, dtype=float)
+    vueltas = np.ceil(np.asarray(cantidad, dtype=float) / (np.asarray(repeticiones, dtype=float) * np.asarray(cavidades, dtype=float)))
+    ancho_montaje = np.asarray(ancho_mm, dtype=float) * cavidades + np.asarray(gap_ancho_mm, dtype=float) * np.maximum(np.asarray(cavidades) - 1, 0)
+    return {
+        'circunferencia_mm': circunferencia,
+        'gap_avance_mm': paso - largo_mm,
+        'metros_lineales': vueltas * circunferencia / 1000,
+        'ancho_montaje_mm': ancho_montaje,
+        'area_preprensa_cm2': ((ancho_montaje / 10) + 4) * ((circunferencia / 10) + 2) * numero_colores,
+    }
@@ -0,0 +1,346 @@
+"""Importación masiva de pedidos desde CSV o Excel (.xlsx).
+
+El formulario da de alta un proyecto por vez y ``agregar_proyecto`` hace
+cinco INSERT más una consulta del usuario en otra conexión por proyecto.
+Aquí el archivo se lee por bloques (``pd.read_csv(chunksize=...)`` o
+``openpyxl`` en modo solo lectura) y cada bloque:
+
+1. se valida de forma vectorizada; las filas con errores se informan con su
+   número de fila del archivo y no se insertan,
+2. calcula gap de avance, metros lineales y área de plancha con las mismas
+   fórmulas del formulario (``geometria.calcular`` sobre arrays) y, si no
+   trae Z, la sugerida (menor gap >= 2 mm),
+3. se inserta en ``proyectos`` y todas sus tablas satélite con
+   ``executemany`` dentro de una sola transacción por bloque.
+
+Los proyectos importados no tienen arte; se carga después desde la edición.
+Por defecto entran en la primera etapa del flujo. Un pedido importado en una
+etapa posterior (columna ``estado``) no pasa por las anteriores: su historial
+empieza en esa etapa y no tiene proveedor de preprensa (se elige al salir de
+Diseño). En las etapas con máquinas, la columna ``maquina`` (una de
+``MAQUINAS_POR_ESTADO`` para esa etapa) lo pone en la cola de esa máquina;
+sin ella aparece en todas las de la etapa (ver cola_operario.py).
+
+Uso desde consola:
+    python importacion.py pedidos.csv --usuario ventas
+    python importacion.py pedidos.xlsx --usuario ventas --simular --errores errores.csv
+"""
+import argparse
+import io
+import itertools
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import openpyxl
+except ImportError:  # Sin openpyxl solo se aceptan archivos CSV
+    openpyxl = None
+
+import base_datos
+import eventos
+import geometria
+import migraciones
+import troqueles
+from geometria import Z_PITCH_MM
+from optimizador import GAP_MINIMO_MM, Z_UNITS_LIST
+from planificador import ESTADOS_FLUJO, MAQUINAS_POR_ESTADO
+
+FILAS_POR_BLOQUE = 5000
+PRIORIDADES = ["Normal", "Alta", "Urgente"]
+
+OBLIGATORIAS = ['cliente', 'nombre_proyecto', 'cantidad_solicitada', 'ancho_mm', 'largo_mm']
+# Columna numérica -> (valor si viene vacía, mínimo, entera)
+NUMERICAS = {
+    'cantidad_solicitada': (None, 1, True),
+    'ancho_mm': (None, 0.01, False),
+    'largo_mm': (None, 0.01, False),
+    'gap_ancho_mm': (0.0, 0, False),
+    'cavidades': (1, 1, True),
+    'repeticiones': (1, 1, True),
+    'z': (None, 1, True),
+    'numero_colores': (1, 1, True),
+    'cantidad_por_core': (None, 1, True),
+}
+TEXTOS = ['cliente', 'nombre_proyecto', 'numero_pedido', 'orden_produccion', 'material', 'acabado',
+          'posicion_etiqueta', 'numero_core', 'prioridad', 'estado', 'maquina', 'numero_troquel', 'numero_lamina']
+COLUMNAS = OBLIGATORIAS + [col for col in list(NUMERICAS) + TEXTOS + ['fecha_entrega'] if col not in OBLIGATORIAS]
+# Encabezados habituales en las planillas de ventas
+ALIAS = {
+    'nombre': 'nombre_proyecto', 'proyecto': 'nombre_proyecto', 'referencia': 'nombre_proyecto',
+    'cantidad': 'cantidad_solicitada', 'ancho': 'ancho_mm', 'largo': 'largo_mm', 'gap_ancho': 'gap_ancho_mm',
+    'numero_cavidades': 'cavidades', 'colores': 'numero_colores', 'op': 'orden_produccion', 'pedido': 'numero_pedido',
+    'fecha': 'fecha_entrega', 'troquel': 'numero_troquel', 'lamina': 'numero_lamina', 'core': 'numero_core',
+    'posicion': 'posicion_etiqueta', 'máquina': 'maquina',
+}
+
+
+def _nombre_columna(encabezado):
+    nombre = str(encabezado).strip().lower().replace(' ', '_').replace('°', '').replace('º', '')
+    return ALIAS.get(nombre, nombre)
+
+
+def _primera_linea(origen):
+    if hasattr(origen, 'read'):
+        posicion = origen.tell()
+        linea = origen.readline()
+        origen.seek(posicion)
+        return linea.decode('utf-8-sig', errors='replace') if isinstance(linea, bytes) else linea
+    with open(origen, encoding='utf-8-sig', errors='replace') as f:
+        return f.readline()
+
+
+def leer(origen, nombre=None, filas_por_bloque=FILAS_POR_BLOQUE, codificacion='utf-8-sig'):
+    """Genera DataFrames de hasta ``filas_por_bloque`` filas con las columnas renombradas a ``COLUMNAS``.
+
+    ``origen`` es una ruta o un archivo abierto (p. ej. la subida de Streamlit); ``nombre`` define el
+    formato por su extensión. Los CSV pueden venir separados por coma o por punto y coma; los que
+    guarda Excel como "CSV (delimitado por comas)" en Windows necesitan ``codificacion='cp1252'``.
+    """
+    nombre = nombre or getattr(origen, 'name', None) or str(origen)
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        if openpyxl is None:
+            raise ValueError("Para importar Excel hace falta el paquete openpyxl (pip install openpyxl); o guarde la hoja como CSV.")
+        libro = openpyxl.load_workbook(origen, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezado = [_nombre_columna(col) for col in next(filas, ())]
+            while bloque := list(itertools.islice(filas, filas_por_bloque)):
+                yield pd.DataFrame(bloque, columns=encabezado, dtype=object)
+        finally:
+            libro.close()
+        return
+    encabezado = _primera_linea(origen)
+    separador = ';' if encabezado.count(';') > encabezado.count(',') else ','
+    lector = pd.read_csv(origen, sep=separador, dtype=str, keep_default_na=False, encoding=codificacion,
+                         skipinitialspace=True, chunksize=filas_por_bloque)
+    with lector:
+        for bloque in lector:
+            bloque.columns = [_nombre_columna(col) for col in bloque.columns]
+            yield bloque
+
+
+def _texto(serie):
+    """Celdas como texto sin espacios en los extremos; NA si están vacías (números y fechas de Excel incluidos)."""
+    texto = serie.astype(str).str.strip()
+    return texto.where(serie.notna() & (texto != ''))
+
+
+def _z_sugeridas(largo_mm, repeticiones):
+    """Z de menor gap de avance >= ``GAP_MINIMO_MM`` por fila (NaN si ninguna cabe); como ``optimizador.z_recomendada``."""
+    z = np.asarray(Z_UNITS_LIST, dtype=float)
+    gaps = (z * Z_PITCH_MM)[None, :] / repeticiones[:, None] - largo_mm[:, None]
+    gaps = np.where(gaps >= GAP_MINIMO_MM, gaps, np.inf)
+    return np.where(np.isfinite(gaps).any(axis=1), z[np.argmin(gaps, axis=1)], np.nan)
+
+
+def validar(bloque, primera_fila=2):
+    """Normaliza un bloque leído. Devuelve ``(pedidos, errores)``.
+
+    ``pedidos`` tiene solo las filas válidas con tipos definitivos y los cálculos del formulario;
+    ``errores`` es una lista de ``{'fila': n, 'error': texto}`` (fila del archivo, el encabezado es la 1).
+    """
+    bloque = bloque.reset_index(drop=True)
+    faltantes = [col for col in OBLIGATORIAS if col not in bloque.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    # Cada columna se pasa a texto una sola vez; las que no vienen en el archivo quedan vacías
+    texto = pd.DataFrame({col: _texto(bloque[col]) if col in bloque.columns else pd.Series(None, index=bloque.index, dtype=str)
+                          for col in COLUMNAS})
+    # Las filas en blanco (frecuentes al final de una hoja de Excel) se saltan sin error
+    filas = np.arange(len(bloque)) + primera_fila
+    en_blanco = texto.isna().all(axis=1).to_numpy()
+    texto, filas = texto[~en_blanco].reset_index(drop=True), filas[~en_blanco]
+    invalida = np.zeros(len(texto), dtype=bool)
+    errores = []
+
+    def rechazar(mascara, mensaje):
+        mascara = np.asarray(mascara, dtype=bool)
+        invalida[:] |= mascara
+        errores.extend({'fila': int(fila), 'error': mensaje} for fila in filas[mascara])
+
+    p = texto[TEXTOS].copy()
+    rechazar(p['cliente'].isna(), "falta el cliente")
+    rechazar(p['nombre_proyecto'].isna(), "falta el nombre del proyecto")
+
+    for col, (defecto, minimo, entera) in NUMERICAS.items():
+        vacio = texto[col].isna()
+        valor = pd.to_numeric(texto[col].str.replace(',', '.', regex=False), errors='coerce')
+        if defecto is not None:
+            valor = valor.where(~vacio, defecto)
+        if col in OBLIGATORIAS:
+            rechazar(vacio, f"falta {col}")
+        rechazar(~vacio & valor.isna(), f"{col} no es un número")
+        rechazar(valor.notna() & (valor < minimo), f"{col} debe ser al menos {minimo:g}")
+        if entera:
+            rechazar(valor.notna() & (valor % 1 != 0), f"{col} debe ser entero")
+        p[col] = valor if entera else valor.astype(float)
+
+    # Prioridad y estado sin distinguir mayúsculas
+    for col, opciones in (('prioridad', PRIORIDADES), ('estado', ESTADOS_FLUJO)):
+        valor = p[col].str.lower().map({opcion.lower(): opcion for opcion in opciones})
+        rechazar(p[col].notna() & valor.isna(), f"{col} debe ser uno de: {', '.join(opciones)}")
+        p[col] = valor.fillna(opciones[0])
+
+    # Máquina: una de las de su etapa, sin distinguir mayúsculas
+    indicada = p['maquina'].notna()
+    maquina = (p['estado'] + '|' + p['maquina'].str.lower()).map(
+        {f"{estado}|{m.lower()}": m for estado, maquinas in MAQUINAS_POR_ESTADO.items() for m in maquinas})
+    rechazar(indicada & ~p['estado'].isin(list(MAQUINAS_POR_ESTADO)),
+             f"maquina solo se indica en las etapas con máquinas: {', '.join(MAQUINAS_POR_ESTADO)}")
+    for estado, maquinas in MAQUINAS_POR_ESTADO.items():
+        rechazar(indicada & (p['estado'] == estado) & maquina.isna(), f"maquina en {estado} debe ser una de: {', '.join(maquinas)}")
+    p['maquina'] = maquina
+
+    # Fechas: ISO (2026-10-20) o día/mes/año; las celdas de Excel ya vienen como fecha
+    crudo = texto['fecha_entrega']
+    vacio = crudo.isna()
+    fecha = pd.to_datetime(crudo, format='ISO8601', errors='coerce')
+    fecha = fecha.fillna(pd.to_datetime(crudo.where(fecha.isna()), format='%d/%m/%Y', errors='coerce'))
+    rechazar(~vacio & fecha.isna(), "fecha_entrega no es una fecha (use AAAA-MM-DD o DD/MM/AAAA)")
+    p['fecha_entrega'] = fecha.dt.strftime('%Y-%m-%d').where(fecha.notna(), None)
+
+    # Z: la indicada debe existir; si falta, la sugerida como en el formulario.
+    # Las filas ya rechazadas pueden tener repeticiones en 0: sin avisos de división por cero
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sugerida = _z_sugeridas(p['largo_mm'].to_numpy(float), p['repeticiones'].to_numpy(float))
+    rechazar(p['z'].notna() & ~p['z'].isin(Z_UNITS_LIST), "z no es una Z disponible")
+    rechazar(p['z'].isna() & np.isnan(sugerida) & p['largo_mm'].notna(),
+             f"ninguna Z deja un gap de avance de {GAP_MINIMO_MM:g} mm con esas repeticiones")
+    p['z'] = p['z'].fillna(pd.Series(sugerida, index=p.index))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        calculo = geometria.calcular(p['ancho_mm'], p['gap_ancho_mm'], p['cavidades'], p['largo_mm'], p['z'],
+                                     p['repeticiones'], p['cantidad_solicitada'], p['numero_colores'])
+    p['gap_avance_mm'] = np.round(np.asarray(calculo['gap_avance_mm'], dtype=float), 2)
+    p['metros_lineales'] = np.asarray(calculo['metros_lineales'], dtype=float)
+    p['area_preprensa_cm2'] = np.round(np.asarray(calculo['area_preprensa_cm2'], dtype=float), 2)
+    rechazar(p['gap_avance_mm'] < 0, "la etiqueta no cabe en esa Z con esas repeticiones (gap de avance negativo)")
+
+    p['fila'] = filas
+    p = p[~invalida].copy()
+    for col in ('cantidad_solicitada', 'cavidades', 'repeticiones', 'z', 'numero_colores', 'cantidad_por_core'):
+        p[col] = p[col].astype('Int64')
+    p['medidas'] = [geometria.formatear(*geo) for geo in
+                    zip(p['ancho_mm'], p['gap_ancho_mm'], p['cavidades'], p['largo_mm'], p['z'], p['repeticiones'], p['gap_avance_mm'])]
+    p['troquel_existente'] = np.where(p['numero_troquel'].notna(), "Si", "No")
+    errores.sort(key=lambda e: e['fila'])
+    return p, errores
+
+
+def _valores(df):
+    """Columnas como listas de valores de Python (None en vez de NaN/NA), listas para ``executemany``."""
+    return {col: df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns}
+
+
+def _filas(valores, columnas):
+    return zip(*(valores[col] for col in columnas))
+
+
+def insertar(c, pedidos, usuario, usuario_id=None, momento=None):
+    """Inserta un bloque validado en ``proyectos`` y sus tablas satélite (llamar dentro de una transacción).
+
+    Como en el formulario, el log empieza con una fila abierta en el estado
+    del pedido (con su máquina, si la trae). Los ids se reservan de una vez a continuación del último: la transacción tiene el lock de escritura.
+    """
+    momento = momento or datetime.now()
+    ultimo = c.execute('''
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'proyectos'), 0), COALESCE((SELECT MAX(id) FROM proyectos), 0))
+    ''').fetchone()[0]
+    # El momento como texto, igual que lo guarda el adaptador de datetime de sqlite3 (pandas lo pasaría a Timestamp)
+    pedidos = pedidos.assign(proyecto_id=np.arange(ultimo + 1, ultimo + 1 + len(pedidos)), momento=momento.isoformat(' '), usuario_id=usuario_id)
+
+    # Un alta por troquel distinto; la geometría la pone el primer pedido que lo usa
+    con_troquel = pedidos[pedidos['numero_troquel'].notna()].drop_duplicates('numero_troquel')
+    ids_troquel = {numero: troqueles.registrar(c, numero, lamina, {'ancho_mm': ancho, 'largo_mm': largo, 'cavidades': int(cavs), 'repeticiones': int(reps)})
+                   for numero, lamina, ancho, largo, cavs, reps in _filas(_valores(con_troquel), ['numero_troquel', 'numero_lamina', 'ancho_mm', 'largo_mm', 'cavidades', 'repeticiones'])}
+    pedidos['troquel_id'] = pedidos['numero_troquel'].map(ids_troquel).astype('Int64')
+    valores = _valores(pedidos)
+
+    c.executemany("INSERT INTO proyectos (id, cliente, nombre_proyecto, fecha_creacion, estado, prioridad, maquina_actual) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  _filas(valores, ['proyecto_id', 'cliente', 'nombre_proyecto', 'momento', 'estado', 'prioridad', 'maquina']))
+    eventos.registrar_varios(c, eventos.ALTA, _filas(valores, ['proyecto_id', 'estado']), usuario, momento)
+    c.executemany('INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                  _filas(valores, ['proyecto_id', 'cliente', 'nombre_proyecto', 'numero_pedido', 'orden_produccion', 'fecha_entrega', 'cantidad_solicitada']))
+    c.executemany('INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core, ancho_mm, gap_ancho_mm, largo_mm, z, repeticiones, gap_avance_mm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                  _filas(valores, ['proyecto_id', 'material', 'acabado', 'medidas', 'metros_lineales', 'cavidades', 'posicion_etiqueta', 'numero_core', 'cantidad_por_core',
+                                   'ancho_mm', 'gap_ancho_mm', 'largo_mm', 'z', 'repeticiones', 'gap_avance_mm']))
+    c.executemany('INSERT INTO info_preprensa (proyecto_id, area_preprensa_cm2, numero_colores) VALUES (?, ?, ?)',
+                  _filas(valores, ['proyecto_id', 'area_preprensa_cm2', 'numero_colores']))
+    c.executemany('INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina, troquel_id) VALUES (?, ?, ?, ?, ?)',
+                  _filas(valores, ['proyecto_id', 'troquel_existente', 'numero_troquel', 'numero_lamina', 'troquel_id']))
+    c.executemany('INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id, maquina_utilizada) VALUES (?, ?, ?, ?, ?)',
+                  _filas(valores, ['proyecto_id', 'estado', 'momento', 'usuario_id', 'maquina']))
+    base_datos.marcar_cambio(c)
+    return len(pedidos)
+
+
+def importar(origen, usuario, nombre=None, filas_por_bloque=FILAS_POR_BLOQUE, simular=False, codificacion='utf-8-sig'):
+    """Valida e inserta todos los pedidos de ``origen``, una transacción por bloque.
+
+    Un bloque que falla en la base de datos se revierte entero y sus filas se informan como error; los
+    demás bloques se conservan. Con ``simular`` solo valida. Devuelve un diccionario con ``leidas``, ``validas``,
+    ``importadas``, ``errores`` (DataFrame fila/error) y ``segundos``.
+    """
+    inicio = time.perf_counter()
+    with base_datos.conexion() as conn:
+        fila = conn.execute("SELECT id FROM usuarios WHERE username = ?", (usuario,)).fetchone()
+    usuario_id = fila[0] if fila else None
+    leidas = validas = importadas = 0
+    errores = []
+    for bloque in leer(origen, nombre, filas_por_bloque, codificacion):
+        pedidos, errores_bloque = validar(bloque, primera_fila=leidas + 2)
+        leidas += len(bloque)
+        validas += len(pedidos)
+        errores += errores_bloque
+        if simular or pedidos.empty:
+            continue
+        try:
+            with base_datos.transaccion() as conn:
+                importadas += insertar(conn, pedidos, usuario, usuario_id)
+        except sqlite3.Error as e:
+            errores += [{'fila': int(n), 'error': f"bloque no guardado: {e}"} for n in pedidos['fila']]
+    return {'leidas': leidas, 'validas': validas, 'importadas': importadas,
+            'errores': pd.DataFrame(errores, columns=['fila', 'error']), 'segundos': time.perf_counter() - inicio}
+
+
+def plantilla():
+    """CSV con los encabezados aceptados y un pedido de ejemplo, para descargar."""
+    ejemplo = {'cliente': "Cliente S.A.", 'nombre_proyecto': "Etiqueta frontal 500 ml", 'cantidad_solicitada': 50000,
+               'ancho_mm': 50, 'largo_mm': 30, 'gap_ancho_mm': 3, 'cavidades': 2, 'repeticiones': 8, 'numero_colores': 4,
+               'material': "PPBB", 'acabado': "Lam Mate", 'prioridad': "Normal", 'estado': ESTADOS_FLUJO[0], 'fecha_entrega': "2026-12-31"}
+    salida = io.StringIO()
+    pd.DataFrame([ejemplo], columns=COLUMNAS).to_csv(salida, index=False)
+    return salida.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa pedidos en bloque desde un CSV o Excel (.xlsx).")
+    parser.add_argument('archivo', help=f"Columnas obligatorias: {', '.join(OBLIGATORIAS)}; opcionales: {', '.join(COLUMNAS[len(OBLIGATORIAS):])}")
+    parser.add_argument('--usuario', default='admin', help="Usuario que figura en el alta (default: admin)")
+    parser.add_argument('--bloque', type=int, default=FILAS_POR_BLOQUE, help="Filas por transacción")
+    parser.add_argument('--codificacion', default='utf-8-sig', help="Codificación del CSV (p. ej. cp1252 para CSV de Excel en Windows)")
+    parser.add_argument('--simular', action='store_true', help="Solo validar, sin escribir en la base de datos")
+    parser.add_argument('--errores', help="Guardar las filas con error en este CSV")
+    args = parser.parse_args()
+
+    migraciones.asegurar_esquema()
+    resumen = importar(args.archivo, args.usuario, filas_por_bloque=args.bloque, simular=args.simular, codificacion=args.codificacion)
+    accion = "válidas (simulación, nada guardado)" if args.simular else "importadas"
+    cantidad = resumen['validas'] if args.simular else resumen['importadas']
+    print(f"{os.path.basename(args.archivo)}: {resumen['leidas']} filas leídas, {cantidad} {accion}, "
+          f"{len(resumen['errores'])} errores en {resumen['segundos']:.2f} s.")
+    if args.errores and not resumen['errores'].empty:
+        resumen['errores'].to_csv(args.errores, index=False)
+        print(f"Errores guardados en {args.errores}.")
+    else:
+        for fila, error in resumen['errores'].head(20).itertuples(index=False):
+            print(f"  fila {fila}: {error}")
+
+
+if __name__ == '__main__':
+    main()
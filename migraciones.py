@@ -0,0 +1,631 @@
+"""Migraciones versionadas del esquema de ``produccion.db``.
+
+La versión del esquema se guarda en ``PRAGMA user_version``. Cada migración
+es una función que recibe un cursor dentro de la transacción de migración y
+se ejecuta una sola vez, en orden. ``asegurar_esquema()`` se llama en cada
+rerun de Streamlit, pero después de la primera llamada del proceso no toca
+la base de datos (guardia a nivel de módulo, que sobrevive a los reruns).
+
+Para cambiar el esquema: agregar una función ``_mNNN_...`` al final y
+registrarla en ``MIGRACIONES``. Nunca modificar una migración ya publicada.
+Por eso cada migración lleva su propia copia del SQL y del backfill en vez
+de llamar a los módulos (resumen_diario, colores, troqueles...), que siguen
+cambiando.
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import base_datos
+
+
+def _agregar_columna(c, table, column, type, notificar):
+    """Añade una columna solo si no existe (bases creadas antes del versionado)."""
+    c.execute(f"PRAGMA table_info({table})")
+    if not any(col[1] == column for col in c.fetchall()):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type}")
+        notificar(f"Agregada columna '{column}' a la tabla '{table}'.")
+
+
+def _m001_tablas_base(c, notificar):
+    """Tabla maestra, tablas satélite, usuarios y log de procesos."""
+    # --- 1. TABLA MAESTRA (EJE) ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS proyectos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente TEXT, 
+            nombre_proyecto TEXT,
+            fecha_creacion DATETIME,
+            estado TEXT,
+            imagen_path TEXT,
+            prioridad TEXT,
+            estado_anterior TEXT
+        )
+    ''')
+
+    # --- 2. TABLA VENTAS (PEDIDOS) ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS info_ventas (
+            proyecto_id INTEGER PRIMARY KEY,
+            cliente TEXT,
+            nombre_proyecto TEXT,
+            numero_pedido TEXT,
+            orden_produccion TEXT,
+            fecha_entrega DATE,
+            cantidad_solicitada INTEGER,
+            logo_cliente_path TEXT,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # --- 3. TABLA TÉCNICA (INGENIERÍA) ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS info_tecnica (
+            proyecto_id INTEGER PRIMARY KEY,
+            material TEXT,
+            acabado TEXT,
+            medidas TEXT,
+            metros_lineales REAL,
+            numero_cavidades INTEGER,
+            posicion_etiqueta TEXT,
+            numero_core TEXT,
+            cantidad_por_core INTEGER,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # --- 4. TABLA PREPRENSA ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS info_preprensa (
+            proyecto_id INTEGER PRIMARY KEY,
+            proveedor_preprensa TEXT,
+            area_preprensa_cm2 REAL,
+            numero_colores INTEGER,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        )
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS proyectos_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            proyecto_id INTEGER NOT NULL,
+            estado TEXT NOT NULL,
+            timestamp_inicio DATETIME NOT NULL,
+            timestamp_fin DATETIME,
+            usuario_id INTEGER,
+            maquina_utilizada TEXT,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    ''')
+
+    # --- 5. TABLA IMPRESIÓN (CONFIGURACIÓN) ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS info_impresion (
+            proyecto_id INTEGER PRIMARY KEY,
+            detalles_impresion TEXT,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # --- 6. TABLA TROQUELADO (HERRAMENTAL) ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS info_troquel (
+            proyecto_id INTEGER PRIMARY KEY,
+            troquel_existente TEXT,
+            numero_troquel TEXT,
+            numero_lamina TEXT,
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        )
+    ''')
+
+
+def _m002_migrar_esquema_monolitico(c, notificar):
+    """Copia los datos del antiguo ``proyectos`` de una sola tabla a las tablas satélite."""
+    try:
+        # Verificamos si la tabla info_ventas está vacía y si proyectos tiene datos antiguos
+        c.execute("SELECT COUNT(*) FROM info_ventas")
+        count_new = c.fetchone()[0]
+
+        # Verificar columnas existentes en proyectos para saber si migrar
+        c.execute("PRAGMA table_info(proyectos)")
+        columns_proyectos = [info[1] for info in c.fetchall()]
+
+        # Si la tabla nueva está vacía y la vieja tiene la columna 'material' (indicador de esquema viejo), migramos
+        if count_new == 0 and 'material' in columns_proyectos:
+            notificar("⏳ Migrando base de datos a nueva estructura... No cierres la app.")
+
+            # 1. Migrar Ventas
+            # Nota: Usamos COALESCE o nombres directos si existen. Asumimos que existen por el check anterior.
+            # SQLite permite seleccionar columnas que existen.
+            c.execute('INSERT INTO info_ventas (proyecto_id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path) SELECT id, cliente, nombre_proyecto, numero_pedido, orden_produccion, fecha_entrega, cantidad_solicitada, logo_cliente_path FROM proyectos')
+
+            # 2. Migrar Técnica
+            c.execute('INSERT INTO info_tecnica (proyecto_id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core) SELECT id, material, acabado, medidas, metros_lineales, numero_cavidades, posicion_etiqueta, numero_core, cantidad_por_core FROM proyectos')
+
+            # 3. Migrar Preprensa
+            c.execute('INSERT INTO info_preprensa (proyecto_id, proveedor_preprensa, area_preprensa_cm2, numero_colores) SELECT id, proveedor_preprensa, area_preprensa_cm2, numero_colores FROM proyectos')
+
+            # 4. Migrar Impresión
+            c.execute('INSERT INTO info_impresion (proyecto_id, detalles_impresion) SELECT id, detalles_impresion FROM proyectos')
+
+            # 5. Migrar Troquel
+            c.execute('INSERT INTO info_troquel (proyecto_id, troquel_existente, numero_troquel, numero_lamina) SELECT id, troquel_existente, numero_troquel, numero_lamina FROM proyectos')
+
+            notificar("✅ Base de datos optimizada y datos migrados correctamente.")
+    except Exception as e:
+        # Si ocurre un error (ej. columnas no existen), lo ignoramos silenciosamente o mostramos en consola
+        print(f"Nota de migración: {e}")
+
+
+def _m003_columnas_rol_y_cierre(c, notificar):
+    """Rol de usuario y datos de cierre de proceso en ``proyectos_log``."""
+    _agregar_columna(c, 'usuarios', 'rol', 'TEXT', notificar)
+    for column, type in [
+        ('maquina_utilizada', 'TEXT'),
+        ('responsable', 'TEXT'),
+        ('observaciones', 'TEXT'),
+        ('codigo_bobina', 'TEXT'),
+        ('metros_impresos', 'REAL'),
+        ('desperdicio', 'REAL'),
+        ('cantidad_cores', 'INTEGER'),
+        ('numero_cajas', 'INTEGER'),
+    ]:
+        _agregar_columna(c, 'proyectos_log', column, type, notificar)
+
+
+def _m004_tabla_sistema(c, notificar):
+    """Parámetros clave/valor del sistema (p. ej. versión de la semilla de usuarios)."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sistema (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+    ''')
+
+
+def _m005_indices_log_y_filtros(c, notificar):
+    """Índices para los accesos frecuentes: log por proyecto, log abierto y filtros del listado."""
+    # Historial de un proyecto (ver_log_procesos) y borrado por proyecto
+    c.execute("CREATE INDEX IF NOT EXISTS idx_log_proyecto_inicio ON proyectos_log (proyecto_id, timestamp_inicio)")
+    # Entrada abierta de cada proyecto (cierre en cambiar_estado_proyecto, filtro por máquina)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_log_abiertos ON proyectos_log (proyecto_id, maquina_utilizada) WHERE timestamp_fin IS NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_proyectos_estado ON proyectos (estado)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_proyectos_prioridad_estado ON proyectos (prioridad, estado)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ventas_fecha_entrega ON info_ventas (fecha_entrega)")
+
+
+def _m006_indices_analitica(c, notificar):
+    """Índices para la analítica incremental: cierres recientes y entregas por fecha."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_log_fin ON proyectos_log (timestamp_fin) WHERE timestamp_fin IS NOT NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_log_estado_inicio ON proyectos_log (estado, timestamp_inicio)")
+
+
+def _m007_kpi_diario(c, notificar):
+    """Tabla materializada de KPIs diarios, con backfill desde el log existente."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS kpi_diario (
+            dia TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            maquina TEXT NOT NULL,
+            responsable TEXT NOT NULL,
+            etapas INTEGER NOT NULL,
+            minutos REAL NOT NULL,
+            metros_impresos REAL NOT NULL,
+            desperdicio REAL NOT NULL,
+            cantidad_cores INTEGER NOT NULL,
+            numero_cajas INTEGER NOT NULL,
+            PRIMARY KEY (dia, estado, maquina, responsable)
+        )
+    ''')
+    c.execute("DELETE FROM kpi_diario")
+    # 'Reanudado' como máquina hereda la del tramo anterior del mismo proyecto y estado
+    c.execute("""
+        INSERT INTO kpi_diario (dia, estado, maquina, responsable, etapas, minutos, metros_impresos, desperdicio, cantidad_cores, numero_cajas)
+        SELECT date(pl.timestamp_fin), pl.estado,
+               COALESCE(NULLIF(pl.maquina_utilizada, 'Reanudado'), (
+                   SELECT prev.maquina_utilizada FROM proyectos_log prev
+                   WHERE prev.proyecto_id = pl.proyecto_id AND prev.estado = pl.estado
+                     AND prev.timestamp_inicio < pl.timestamp_inicio
+                     AND prev.maquina_utilizada IS NOT NULL AND prev.maquina_utilizada <> 'Reanudado'
+                   ORDER BY prev.timestamp_inicio DESC LIMIT 1
+               ), ''),
+               COALESCE(pl.responsable, ''),
+               COUNT(*),
+               SUM((julianday(pl.timestamp_fin) - julianday(pl.timestamp_inicio)) * 1440),
+               SUM(COALESCE(pl.metros_impresos, 0)),
+               SUM(COALESCE(pl.desperdicio, 0)),
+               SUM(COALESCE(pl.cantidad_cores, 0)),
+               SUM(COALESCE(pl.numero_cajas, 0))
+        FROM proyectos_log pl
+        WHERE pl.timestamp_fin IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+    filas = c.execute("SELECT COUNT(*) FROM kpi_diario").fetchone()[0]
+    if filas:
+        notificar(f"KPIs diarios reconstruidos desde el historial ({filas} filas).")
+
+
+def _m008_almacen_archivos(c, notificar):
+    """Almacén direccionado por contenido: objetos con contador de referencias y hash en el proyecto."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS archivos (
+            sha256 TEXT PRIMARY KEY,
+            extension TEXT,
+            nombre_original TEXT,
+            tamano INTEGER,
+            referencias INTEGER NOT NULL DEFAULT 0,
+            creado TIMESTAMP
+        )
+    ''')
+    _agregar_columna(c, 'proyectos', 'imagen_sha256', 'TEXT', notificar)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_proyectos_imagen_sha ON proyectos (imagen_sha256)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archivos_sin_referencias ON archivos (sha256) WHERE referencias <= 0")
+
+
+def _m009_eventos(c, notificar):
+    """Feed de cambios (ver eventos.py) para refrescar las pantallas sin rerun completo."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            momento TIMESTAMP NOT NULL,
+            tipo TEXT NOT NULL,
+            proyecto_id INTEGER NOT NULL,
+            estado TEXT,
+            usuario TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_eventos_momento ON eventos (momento)")
+
+
+def _m010_maquina_actual(c, notificar):
+    """Máquina de la etapa en curso en el proyecto (la conserva al pausar), para las colas por estación."""
+    _agregar_columna(c, 'proyectos', 'maquina_actual', 'TEXT', notificar)
+    # La última máquina real registrada en la etapa en curso ('Reanudado' y los motivos de pausa no cuentan)
+    c.execute("""
+        UPDATE proyectos SET maquina_actual = (
+            SELECT pl.maquina_utilizada FROM proyectos_log pl
+            WHERE pl.proyecto_id = proyectos.id
+              AND pl.estado = CASE WHEN proyectos.estado = 'Pausado' THEN proyectos.estado_anterior ELSE proyectos.estado END
+              AND pl.maquina_utilizada IS NOT NULL AND pl.maquina_utilizada <> 'Reanudado'
+            ORDER BY pl.timestamp_inicio DESC LIMIT 1
+        )
+        WHERE estado <> 'Entregado'
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_proyectos_estado_maquina ON proyectos (estado, maquina_actual)")
+
+
+def _m011_impresion_colores(c, notificar):
+    """Unidades de color normalizadas (ver colores.py), copiadas desde el JSON de info_impresion."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS impresion_colores (
+            proyecto_id INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            anilox TEXT,
+            tipo_color TEXT,
+            codigo_color TEXT,
+            PRIMARY KEY (proyecto_id, slot),
+            FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_colores_anilox ON impresion_colores (anilox, proyecto_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_colores_codigo ON impresion_colores (codigo_color COLLATE NOCASE, proyecto_id)")
+    # JSON inválido se ignora
+    c.execute('''
+        INSERT OR REPLACE INTO impresion_colores (proyecto_id, slot, anilox, tipo_color, codigo_color)
+        SELECT i.proyecto_id, CAST(j.key AS INTEGER) + 1,
+               json_extract(j.value, '$.anilox'), json_extract(j.value, '$.tipo_color'), json_extract(j.value, '$.codigo_color')
+        FROM info_impresion i, json_each(i.detalles_impresion) j
+        WHERE json_valid(i.detalles_impresion) AND json_type(i.detalles_impresion) = 'array' AND j.type = 'object'
+    ''')
+    filas = c.rowcount
+    if filas:
+        notificar(f"Configuración de colores migrada desde JSON ({filas} unidades de color).")
+
+
+# Formatos de ``medidas`` conocidos al publicar la migración 12 (copia de geometria.py de entonces)
+_NUMERO_M012 = r"(\d+(?:[.,]\d+)?)"
+_PATRONES_M012 = {
+    'ancho_mm': rf"Ancho:\s*{_NUMERO_M012}\s*mm",
+    'gap_ancho_mm': rf"\(Gap:\s*{_NUMERO_M012}\s*mm\)",
+    'cavidades': r"(\d+)\s*cavs?\b",
+    'largo_mm': rf"Largo:\s*{_NUMERO_M012}\s*mm",
+    'z': r"\bZ\s*(\d+)",
+    'repeticiones': r"(\d+)\s*reps?\b",
+    'gap_avance_mm': r"Gap Avance:\s*(-?\d+(?:[.,]\d+)?)\s*mm",
+}
+_PATRON_SIMPLE_M012 = rf"^\s*{_NUMERO_M012}\s*[xX×]\s*{_NUMERO_M012}\s*(?:mm)?\s*$"
+
+
+def _m012_geometria(c, notificar):
+    """Geometría de la etiqueta en columnas numéricas (ver geometria.py), completada desde ``medidas``."""
+    for columna, tipo in (('ancho_mm', 'REAL'), ('gap_ancho_mm', 'REAL'), ('largo_mm', 'REAL'),
+                          ('z', 'INTEGER'), ('repeticiones', 'INTEGER'), ('gap_avance_mm', 'REAL')):
+        _agregar_columna(c, 'info_tecnica', columna, tipo, notificar)
+    # Búsqueda de troqueles compatibles: rango de ancho y luego de largo
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tecnica_geometria ON info_tecnica (ancho_mm, largo_mm)")
+    filas = c.execute("SELECT proyecto_id, medidas FROM info_tecnica WHERE ancho_mm IS NULL AND medidas IS NOT NULL").fetchall()
+    if not filas:
+        return
+    ids, textos = zip(*filas)
+    textos = pd.Series(textos, dtype=object).fillna('').astype(str)
+    geo = pd.DataFrame(index=textos.index)
+    for campo, patron in _PATRONES_M012.items():
+        geo[campo] = pd.to_numeric(textos.str.extract(patron, expand=False).str.replace(',', '.'), errors='coerce')
+    simple = textos.str.extract(_PATRON_SIMPLE_M012)
+    for columna, campo in ((0, 'ancho_mm'), (1, 'largo_mm')):
+        geo[campo] = geo[campo].fillna(pd.to_numeric(simple[columna].str.replace(',', '.'), errors='coerce'))
+    geo = geo.astype(object).where(lambda df: df.notna(), None)
+    geo['proyecto_id'] = ids
+    geo = geo[geo[['ancho_mm', 'largo_mm']].notna().any(axis=1)]
+    c.executemany("""
+        UPDATE info_tecnica SET ancho_mm = ?, gap_ancho_mm = ?, numero_cavidades = COALESCE(numero_cavidades, ?),
+               largo_mm = ?, z = ?, repeticiones = ?, gap_avance_mm = ?
+        WHERE proyecto_id = ?
+    """, geo[list(_PATRONES_M012) + ['proyecto_id']].itertuples(index=False, name=None))
+    if len(geo):
+        notificar(f"Geometría completada desde el texto de medidas en {len(geo)} proyectos.")
+
+
+def _m013_inventario_troqueles(c, notificar):
+    """Inventario de troqueles por geometría (ver troqueles.py), armado con los números ya cargados."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS troqueles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_troquel TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            numero_lamina TEXT,
+            ancho_mm REAL,
+            largo_mm REAL,
+            cavidades INTEGER,
+            repeticiones INTEGER,
+            radio_esquina_mm REAL,
+            activo INTEGER NOT NULL DEFAULT 1,
+            usos INTEGER NOT NULL DEFAULT 0,
+            metros_acumulados REAL NOT NULL DEFAULT 0,
+            vida_util_metros REAL,
+            ultimo_uso TIMESTAMP,
+            creado TIMESTAMP
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_troqueles_geometria ON troqueles (ancho_mm, largo_mm, cavidades)")
+    _agregar_columna(c, 'info_troquel', 'troquel_id', 'INTEGER REFERENCES troqueles (id)', notificar)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_info_troquel_troquel ON info_troquel (troquel_id)")
+    # Alta de los troqueles escritos en info_troquel: el proyecto más reciente de cada uno manda en la geometría
+    filas = c.execute('''
+        SELECT tr.numero_troquel, tr.numero_lamina, t.ancho_mm, t.largo_mm, t.numero_cavidades, t.repeticiones
+        FROM info_troquel tr LEFT JOIN info_tecnica t ON t.proyecto_id = tr.proyecto_id
+        WHERE TRIM(COALESCE(tr.numero_troquel, '')) <> ''
+        ORDER BY tr.proyecto_id DESC
+    ''').fetchall()
+    c.executemany('''
+        INSERT INTO troqueles (numero_troquel, numero_lamina, ancho_mm, largo_mm, cavidades, repeticiones, creado)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (numero_troquel) DO UPDATE SET
+            numero_lamina = COALESCE(NULLIF(excluded.numero_lamina, ''), troqueles.numero_lamina),
+            ancho_mm = COALESCE(troqueles.ancho_mm, excluded.ancho_mm),
+            largo_mm = COALESCE(troqueles.largo_mm, excluded.largo_mm),
+            cavidades = COALESCE(troqueles.cavidades, excluded.cavidades),
+            repeticiones = COALESCE(troqueles.repeticiones, excluded.repeticiones)
+    ''', [(numero.strip(), *resto, datetime.now()) for numero, *resto in filas])
+    c.execute('''
+        UPDATE info_troquel SET troquel_id = (SELECT id FROM troqueles WHERE numero_troquel = TRIM(info_troquel.numero_troquel))
+        WHERE TRIM(COALESCE(numero_troquel, '')) <> ''
+    ''')
+    # Uso desde el log tal como se publicó (contando también las etapas cerradas por una pausa; ver migración 15)
+    usos = c.execute('''
+        SELECT it.troquel_id, COUNT(*), COALESCE(SUM(t.metros_lineales), 0), MAX(pl.timestamp_fin)
+        FROM proyectos_log pl
+        JOIN info_troquel it ON it.proyecto_id = pl.proyecto_id
+        LEFT JOIN info_tecnica t ON t.proyecto_id = pl.proyecto_id
+        WHERE pl.estado = 'Troquelado' AND pl.timestamp_fin IS NOT NULL AND it.troquel_id IS NOT NULL
+        GROUP BY it.troquel_id
+    ''').fetchall()
+    c.executemany("UPDATE troqueles SET usos = ?, metros_acumulados = ?, ultimo_uso = ? WHERE id = ?",
+                  [(n, metros, ultimo, troquel_id) for troquel_id, n, metros, ultimo in usos])
+    total = c.execute("SELECT COUNT(*) FROM troqueles").fetchone()[0]
+    if total:
+        notificar(f"Inventario de troqueles creado con {total} troqueles.")
+
+
+def _m014_generacion_bd(c, notificar):
+    """Identificador aleatorio de este archivo de BD (ver base_datos.generacion_bd)."""
+    c.execute("INSERT OR IGNORE INTO sistema (clave, valor) VALUES ('generacion_bd', lower(hex(randomblob(8))))")
+
+
+def _m015_usos_troqueles_sin_pausas(c, notificar):
+    """Recalcula el uso de los troqueles sin contar las etapas de Troquelado cerradas por una pausa.
+
+    La migración 13 las contaba; el conteo en vivo (transiciones.py) no. Una
+    etapa cuenta salvo que la fila siguiente del mismo proyecto sea 'Pausado'.
+    """
+    c.execute("UPDATE troqueles SET usos = 0, metros_acumulados = 0, ultimo_uso = NULL")
+    usos = c.execute('''
+        SELECT it.troquel_id, COUNT(*), COALESCE(SUM(t.metros_lineales), 0), MAX(pl.timestamp_fin)
+        FROM proyectos_log pl
+        JOIN info_troquel it ON it.proyecto_id = pl.proyecto_id
+        LEFT JOIN info_tecnica t ON t.proyecto_id = pl.proyecto_id
+        WHERE pl.estado = 'Troquelado' AND pl.timestamp_fin IS NOT NULL AND it.troquel_id IS NOT NULL
+          AND COALESCE((SELECT sig.estado FROM proyectos_log sig
+                        WHERE sig.proyecto_id = pl.proyecto_id AND sig.id > pl.id
+                        ORDER BY sig.id LIMIT 1), '') <> 'Pausado'
+        GROUP BY it.troquel_id
+    ''').fetchall()
+    c.executemany("UPDATE troqueles SET usos = ?, metros_acumulados = ?, ultimo_uso = ? WHERE id = ?",
+                  [(n, metros, ultimo, troquel_id) for troquel_id, n, metros, ultimo in usos])
+
+
+def _m016_kpi_diario_sin_pausas(c, notificar):
+    """Reconstruye kpi_diario contando cada etapa una vez aunque se haya pausado.
+
+    Los tramos cerrados por una pausa (la fila siguiente del proyecto es
+    'Pausado') suman minutos y metros pero no etapas; ``tramos`` cuenta las
+    filas del log de cada grupo.
+    """
+    _agregar_columna(c, 'kpi_diario', 'tramos', 'INTEGER NOT NULL DEFAULT 0', notificar)
+    c.execute("DELETE FROM kpi_diario")
+    c.execute("""
+        INSERT INTO kpi_diario (dia, estado, maquina, responsable, tramos, etapas, minutos, metros_impresos, desperdicio, cantidad_cores, numero_cajas)
+        SELECT date(pl.timestamp_fin), pl.estado,
+               COALESCE(NULLIF(pl.maquina_utilizada, 'Reanudado'), (
+                   SELECT prev.maquina_utilizada FROM proyectos_log prev
+                   WHERE prev.proyecto_id = pl.proyecto_id AND prev.estado = pl.estado
+                     AND prev.timestamp_inicio < pl.timestamp_inicio
+                     AND prev.maquina_utilizada IS NOT NULL AND prev.maquina_utilizada <> 'Reanudado'
+                   ORDER BY prev.timestamp_inicio DESC LIMIT 1
+               ), ''),
+               COALESCE(pl.responsable, ''),
+               COUNT(*),
+               SUM(CASE WHEN (
+                   SELECT sig.estado FROM proyectos_log sig
+                   WHERE sig.proyecto_id = pl.proyecto_id AND sig.id > pl.id
+                   ORDER BY sig.id LIMIT 1
+               ) = 'Pausado' THEN 0 ELSE 1 END),
+               SUM((julianday(pl.timestamp_fin) - julianday(pl.timestamp_inicio)) * 1440),
+               SUM(COALESCE(pl.metros_impresos, 0)),
+               SUM(COALESCE(pl.desperdicio, 0)),
+               SUM(COALESCE(pl.cantidad_cores, 0)),
+               SUM(COALESCE(pl.numero_cajas, 0))
+        FROM proyectos_log pl
+        WHERE pl.timestamp_fin IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def _m017_metros_por_vuelta(c, notificar):
+    """Recalcula ``metros_lineales`` con vueltas enteras de repeticiones x cavidades.
+
+    Hasta ahora el formulario y la importación guardaban cantidad x
+    circunferencia / repeticiones, sin las cavidades al ancho (el optimizador
+    ya las contaba). Solo se reescriben los valores que coinciden con esa
+    fórmula; los metros editados a mano se respetan. Los metros acumulados de
+    los troqueles suman ``metros_lineales`` y se recalculan como en la
+    migración 15.
+    """
+    filas = c.execute('''
+        SELECT t.proyecto_id, t.metros_lineales, t.z, t.repeticiones, COALESCE(t.numero_cavidades, 1), v.cantidad_solicitada
+        FROM info_tecnica t JOIN info_ventas v ON v.proyecto_id = t.proyecto_id
+        WHERE t.metros_lineales IS NOT NULL AND t.z > 0 AND t.repeticiones > 0 AND v.cantidad_solicitada > 0
+    ''').fetchall()
+    nuevos = []
+    for proyecto_id, metros, z, repeticiones, cavidades, cantidad in filas:
+        circunferencia = round(float(z) * 3.175, 3)
+        vueltas = math.ceil(float(cantidad) / (float(repeticiones) * max(float(cavidades), 1)))
+        nuevo = vueltas * circunferencia / 1000
+        anterior = float(cantidad) * circunferencia / float(repeticiones) / 1000
+        if abs(float(metros) - anterior) < 0.01 and abs(nuevo - anterior) >= 0.01:
+            nuevos.append((nuevo, proyecto_id))
+    c.executemany("UPDATE info_tecnica SET metros_lineales = ? WHERE proyecto_id = ?", nuevos)
+    c.execute("UPDATE troqueles SET metros_acumulados = 0")
+    metros = c.execute('''
+        SELECT it.troquel_id, COALESCE(SUM(t.metros_lineales), 0)
+        FROM proyectos_log pl
+        JOIN info_troquel it ON it.proyecto_id = pl.proyecto_id
+        LEFT JOIN info_tecnica t ON t.proyecto_id = pl.proyecto_id
+        WHERE pl.estado = 'Troquelado' AND pl.timestamp_fin IS NOT NULL AND it.troquel_id IS NOT NULL
+          AND COALESCE((SELECT sig.estado FROM proyectos_log sig
+                        WHERE sig.proyecto_id = pl.proyecto_id AND sig.id > pl.id
+                        ORDER BY sig.id LIMIT 1), '') <> 'Pausado'
+        GROUP BY it.troquel_id
+    ''').fetchall()
+    c.executemany("UPDATE troqueles SET metros_acumulados = ? WHERE id = ?", [(m, troquel_id) for troquel_id, m in metros])
+    if nuevos:
+        notificar(f"Metros lineales recalculados por vuelta del cilindro en {len(nuevos)} proyectos.")
+
+
+
+# Lista ordenada: la posición (empezando en 1) es el número de versión.
+MIGRACIONES = [
+    _m001_tablas_base,
+    _m002_migrar_esquema_monolitico,
+    _m003_columnas_rol_y_cierre,
+    _m004_tabla_sistema,
+    _m005_indices_log_y_filtros,
+    _m006_indices_analitica,
+    _m007_kpi_diario,
+    _m008_almacen_archivos,
+    _m009_eventos,
+    _m010_maquina_actual,
+    _m011_impresion_colores,
+    _m012_geometria,
+    _m013_inventario_troqueles,
+    _m014_generacion_bd,
+    _m015_usos_troqueles_sin_pausas,
+    _m016_kpi_diario_sin_pausas,
+    _m017_metros_por_vuelta,
+]
+VERSION_ACTUAL = len(MIGRACIONES)
+
+# Rutas de BD cuyo esquema ya se verificó en este proceso.
+_esquema_listo = set()
+_lock = threading.Lock()
+
+# Instrumentación de arranque (se muestra en Configuración).
+METRICAS = {
+    'version': None,
+    'migraciones_aplicadas': 0,
+    'arranque_ms': None,
+    'ultima_verificacion_ms': None,
+    'verificaciones_en_caliente': 0,
+}
+
+
+def version_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(notificar=print):
+    """Aplica las migraciones pendientes en una sola transacción. Devuelve cuántas se aplicaron."""
+    with base_datos.conexion() as conn:
+        if version_esquema(conn) >= VERSION_ACTUAL:
+            return 0
+    with base_datos.transaccion() as conn:
+        # Releer dentro del lock de escritura: otro proceso pudo migrar mientras tanto
+        version = version_esquema(conn)
+        c = conn.cursor()
+        for numero in range(version + 1, VERSION_ACTUAL + 1):
+            MIGRACIONES[numero - 1](c, notificar)
+        aplicadas = max(0, VERSION_ACTUAL - version)
+        if aplicadas:
+            c.execute(f"PRAGMA user_version = {VERSION_ACTUAL}")
+    return aplicadas
+
+
+def asegurar_esquema(notificar=print):
+    """Garantiza el esquema al día. Solo la primera llamada del proceso toca la BD.
+
+    Devuelve True en esa primera llamada (arranque en frío), para que el
+    llamador pueda colgar ahí otras tareas de arranque.
+    """
+    inicio = time.perf_counter()
+    ruta = base_datos.DB_PATH
+    if ruta in _esquema_listo:
+        METRICAS['verificaciones_en_caliente'] += 1
+        METRICAS['ultima_verificacion_ms'] = (time.perf_counter() - inicio) * 1000
+        return False
+    arranque = False
+    with _lock:
+        if ruta not in _esquema_listo:
+            arranque = True
+            aplicadas = aplicar_migraciones(notificar)
+            _esquema_listo.add(ruta)
+            METRICAS['version'] = VERSION_ACTUAL
+            METRICAS['migraciones_aplicadas'] = aplicadas
+            METRICAS['arranque_ms'] = (time.perf_counter() - inicio) * 1000
+    METRICAS['ultima_verificacion_ms'] = (time.perf_counter() - inicio) * 1000
+    return arranque
+
+
+def olvidar_esquema():
+    """Descarta la guardia del proceso (tras borrar la BD, para que se vuelva a crear)."""
+    with _lock:
+        _esquema_listo.discard(base_datos.DB_PATH)
@@ -0,0 +1,88 @@
+"""Dibujo del montaje de etiquetas en el cilindro (formulario "Nuevo Proyecto").
+
+Antes se creaba una figura de pyplot por rerun con un ``Rectangle`` por
+etiqueta (y otro por gap), y las figuras nunca se cerraban. Aquí:
+
+- la grilla de etiquetas y la de gaps son dos ``PolyCollection`` cuyos
+  vértices se calculan de una vez con NumPy;
+- se usa ``matplotlib.figure.Figure`` directamente: no pasa por el estado
+  global de pyplot (que no es seguro entre sesiones) y se libera al salir;
+- el PNG resultante se memoriza por parámetros, así que cambiar otro campo
+  del formulario no vuelve a dibujar.
+"""
+import io
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+MARGEN_X = 2
+TAMANO_FIGURA = (2.5, 3.5)
+DPI = 200
+# Combinaciones de parámetros distintas que se guardan (unos pocos KB cada una)
+CACHE_MAX = 256
+
+
+def rectangulos(x, y, ancho, alto):
+    """Vértices (N, 4, 2) de N rectángulos con esquina inferior izquierda en (x, y)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.stack([
+        np.stack([x, y], axis=-1),
+        np.stack([x + ancho, y], axis=-1),
+        np.stack([x + ancho, y + alto], axis=-1),
+        np.stack([x, y + alto], axis=-1),
+    ], axis=1)
+
+
+def figura_montaje(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho):
+    """Figura de matplotlib con el montaje (sin cachear)."""
+    repeticiones, cavidades = int(repeticiones), int(cavidades)
+    fig = Figure(figsize=TAMANO_FIGURA)
+    ax = fig.add_subplot()
+
+    ancho_contenido = (ancho * cavidades) + (gap_ancho * max(0, cavidades - 1))
+    ancho_total = ancho_contenido + (MARGEN_X * 2)
+
+    # Fondo (sustrato / banda) y líneas guía del cilindro (inicio y fin de la vuelta)
+    ax.add_patch(Rectangle((0, 0), ancho_total, z_mm, linewidth=0, facecolor='#f1f5f9'))
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=1)
+    ax.axhline(y=z_mm, color='black', linestyle='-', linewidth=1)
+
+    paso = z_mm / repeticiones
+    ys, xs = np.meshgrid(np.arange(repeticiones) * paso, MARGEN_X + np.arange(cavidades) * (ancho + gap_ancho), indexing='ij')
+    ax.add_collection(PolyCollection(rectangulos(xs.ravel(), ys.ravel(), ancho, largo),
+                                     linewidths=0.5, edgecolors='#1e40af', facecolors='#60a5fa', alpha=0.8))
+    # Visualización del gap (rojo rayado) si existe
+    if gap_avance > 0.1:
+        ax.add_collection(PolyCollection(rectangulos(xs.ravel(), ys.ravel() + largo, ancho, gap_avance),
+                                         linewidths=0, facecolors='#fca5a5', alpha=0.4, hatch='///'))
+    # Texto de medida solo en la primera columna para no saturar
+    for y_pos in ys[:, 0]:
+        ax.text(MARGEN_X + ancho / 2, y_pos + largo / 2, f"{int(largo)}", ha='center', va='center', fontsize=6, color='white', fontweight='bold')
+
+    ax.set_xlim(0, ancho_total)
+    ax.set_ylim(0, z_mm + (z_mm * 0.05))  # Un poco de margen visual arriba
+    ax.set_title(f"Z ({z_mm:.1f}mm) x {cavidades} cavs", fontsize=8)
+    ax.set_ylabel("Avance", fontsize=7)
+    ax.set_xticks([])  # Ocultar eje X para limpieza
+    ax.tick_params(axis='y', labelsize=6)
+    ax.set_aspect('equal', adjustable='box')  # Mantener proporciones reales
+    return fig
+
+
+@lru_cache(maxsize=CACHE_MAX)
+def _png_montaje(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho):
+    fig = figura_montaje(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def dibujar_montaje(ancho, largo, gap_avance, repeticiones, z_mm, cavidades, gap_ancho):
+    """PNG (bytes) del montaje en el cilindro, memorizado por parámetros."""
+    # Redondeo para que el mismo montaje calculado por caminos distintos comparta la entrada
+    return _png_montaje(round(float(ancho), 3), round(float(largo), 3), round(float(gap_avance), 3), int(repeticiones),
+                        round(float(z_mm), 3), int(cavidades), round(float(gap_ancho), 3))
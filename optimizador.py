@@ -0,0 +1,113 @@
+"""Optimizador de montaje: Z del cilindro, repeticiones y cavidades al ancho.
+
+La recomendación original solo recorría las Z para las repeticiones ya
+elegidas y tomaba el menor gap >= 2 mm. ``optimizar`` evalúa de una vez
+(con NumPy, sin bucles de Python por candidato) todas las combinaciones
+Z x repeticiones x cavidades, descarta las que no caben en ninguna
+impresora o dejan un gap de avance menor al mínimo, y devuelve la frontera
+de Pareto para tres objetivos a minimizar:
+
+- metros lineales de material para la cantidad pedida,
+- área de plancha,
+- proporción de desperdicio del sustrato (lo que no es etiqueta).
+
+Metros, área, gap de avance y ancho de montaje salen de ``geometria.calcular``,
+las mismas fórmulas del formulario.
+"""
+import numpy as np
+import pandas as pd
+
+import geometria
+from geometria import Z_PITCH_MM
+Z_UNITS_LIST = [63, 70, 76, 80, 82, 84, 85, 88, 90, 96, 106, 114, 120, 130]
+Z_UNITS_MM = {z: round(z * Z_PITCH_MM, 3) for z in Z_UNITS_LIST}
+
+GAP_MINIMO_MM = 2.0  # Margen mínimo de seguridad entre etiquetas al avance
+MARGEN_BANDA_MM = 5.0  # Refile a cada lado del montaje
+
+# Ancho máximo de banda por impresora (mm). Ajustar a la ficha técnica de cada máquina;
+# una máquina que no esté aquí no limita el ancho.
+ANCHO_MAX_BANDA_MM = {
+    "SP1": 250.0,
+    "FIT 350": 350.0,
+    "SUPERPRINT": 330.0,
+    "MARK ANDY": 254.0,
+}
+
+MAX_REPETICIONES = 30
+MAX_CAVIDADES = 20
+OBJETIVOS = ['metros_lineales', 'area_plancha_cm2', 'desperdicio']
+
+
+def z_recomendada(largo, repeticiones, z_units=Z_UNITS_LIST, gap_minimo=GAP_MINIMO_MM):
+    """Índice (en ``z_units``) de la Z con menor gap >= ``gap_minimo`` para repeticiones fijas, o None."""
+    circ = np.asarray(z_units, dtype=float) * Z_PITCH_MM
+    gaps = circ / repeticiones - largo
+    gaps = np.where(gaps >= gap_minimo, gaps, np.inf)
+    return int(np.argmin(gaps)) if np.isfinite(gaps).any() else None
+
+
+def frontera_pareto(costos):
+    """Índices de las filas no dominadas de ``costos`` (N x k, todo a minimizar)."""
+    indices = np.arange(costos.shape[0])
+    siguiente = 0
+    while siguiente < len(costos):
+        # Se conserva lo que mejora al punto actual en al menos un objetivo (y el propio punto)
+        no_dominados = np.any(costos < costos[siguiente], axis=1)
+        no_dominados[siguiente] = True
+        indices, costos = indices[no_dominados], costos[no_dominados]
+        siguiente = int(np.sum(no_dominados[:siguiente])) + 1
+    return indices
+
+
+def optimizar(ancho, largo, cantidad, numero_colores=1, gap_ancho=0.0, maquinas=None, z_units=Z_UNITS_LIST,
+              max_repeticiones=MAX_REPETICIONES, max_cavidades=MAX_CAVIDADES, gap_minimo=GAP_MINIMO_MM):
+    """Montajes Pareto-óptimos ordenados (DataFrame vacío si ninguno es viable).
+
+    ``maquinas`` es la lista de impresoras disponibles (p. ej.
+    ``maquinas_por_estado['Impresion']``); la columna ``maquinas`` del
+    resultado indica en cuáles cabe cada montaje.
+    """
+    if ancho <= 0 or largo <= 0 or cantidad <= 0:
+        return pd.DataFrame()
+    maquinas = list(maquinas or ANCHO_MAX_BANDA_MM)
+    limites = np.array([ANCHO_MAX_BANDA_MM.get(m, np.inf) for m in maquinas])
+
+    # Grilla completa Z x repeticiones x cavidades, aplanada
+    z, rep, cav = np.meshgrid(np.asarray(z_units, dtype=float), np.arange(1, max_repeticiones + 1),
+                              np.arange(1, max_cavidades + 1), indexing='ij')
+    z, rep, cav = z.ravel(), rep.ravel(), cav.ravel()
+    calculo = geometria.calcular(ancho, gap_ancho, cav, largo, z, rep, cantidad, numero_colores)
+    circ, gap_avance, ancho_montaje = calculo['circunferencia_mm'], calculo['gap_avance_mm'], calculo['ancho_montaje_mm']
+    ancho_banda = ancho_montaje + 2 * MARGEN_BANDA_MM
+    cabe = ancho_banda[:, None] <= limites[None, :]  # candidatos x máquinas
+
+    viable = (gap_avance >= gap_minimo) & cabe.any(axis=1)
+    if not viable.any():
+        return pd.DataFrame()
+    metros, area_plancha = calculo['metros_lineales'], calculo['area_preprensa_cm2']
+    z, rep, cav, circ, gap_avance, ancho_banda, metros, area_plancha, cabe = (
+        a[viable] for a in (z, rep, cav, circ, gap_avance, ancho_banda, metros, area_plancha, cabe))
+
+    desperdicio = 1 - (ancho * largo * rep * cav) / (circ * ancho_banda)
+
+    costos = np.column_stack([metros, area_plancha, desperdicio])
+    frontera = frontera_pareto(costos)
+    # Orden: suma de objetivos normalizados a [0, 1] dentro de la frontera
+    f = costos[frontera]
+    rango = np.ptp(f, axis=0)
+    puntaje = ((f - f.min(axis=0)) / np.where(rango > 0, rango, 1)).sum(axis=1)
+    orden = frontera[np.argsort(puntaje, kind='stable')]
+
+    nombres = np.array(maquinas, dtype=object)
+    return pd.DataFrame({
+        'z': z[orden].astype(int),
+        'repeticiones': rep[orden].astype(int),
+        'cavidades': cav[orden].astype(int),
+        'gap_avance_mm': gap_avance[orden].round(2),
+        'ancho_banda_mm': ancho_banda[orden].round(1),
+        'metros_lineales': metros[orden].round(1),
+        'area_plancha_cm2': area_plancha[orden].round(1),
+        'desperdicio': desperdicio[orden].round(3),
+        'maquinas': [", ".join(nombres[fila]) for fila in cabe[orden]],
+    })
@@ -0,0 +1,192 @@
+"""Planificador de capacidad por máquina y pronóstico de fechas de entrega.
+
+Arma una cola de capacidad finita por máquina con los proyectos abiertos y
+estima cuándo termina cada uno:
+
+- Duraciones: salen de ``kpi_diario`` (ver resumen_diario.py), así que el
+  modelo se lee con una consulta pequeña. Para una etapa con metros
+  registrados se usa minutos por metro de esa máquina x ``metros_lineales``
+  del proyecto; si no, el promedio de minutos por etapa de la máquina, luego
+  el de la etapa y, sin historial, ``DURACION_POR_DEFECTO_MIN``. Son minutos
+  de calendario (incluyen noches y pausas, igual que el historial).
+- Orden de atención: prioridad (Urgente, Alta, Normal), fecha de entrega, id.
+- Lo que ya está corriendo en una máquina no se interrumpe: ocupa su
+  máquina hasta terminar. Cada etapa siguiente va a la máquina de esa etapa
+  que la termine antes, detrás de lo ya asignado (no se rellenan huecos:
+  uno de menor prioridad no se adelanta a otro en la misma máquina).
+
+Sin dependencia de Streamlit. El costo es O(proyectos x etapas x máquinas):
+5000 proyectos abiertos se planifican en menos de 200 ms
+(benchmarks/bench_planificador.py), así que la app lo rehace completo en
+cada cambio de datos (caché por versión) en lugar de mantener un estado
+incremental.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+ESTADOS_FLUJO = ["Por aprobar", "Diseño", "Preprensa", "Impresion", "Control calidad", "Troquelado", "Despacho", "Entregado"]
+ESTADO_FINAL = "Entregado"
+ESTADO_PAUSA = "Pausado"
+
+MAQUINAS_POR_ESTADO = {
+    "Impresion": ["SP1", "FIT 350", "SUPERPRINT", "MARK ANDY"],
+    "Control calidad": [f"Controladora {i+1}" for i in range(6)],
+    "Troquelado": ["Troqueladora Plana"],
+}
+
+ORDEN_PRIORIDAD = {"Urgente": 0, "Alta": 1, "Normal": 2}
+DURACION_POR_DEFECTO_MIN = 240.0
+# Etapas cerradas necesarias para confiar en un promedio (si no, se pasa al nivel siguiente)
+MUESTRA_MINIMA = 3
+# Lo que le queda a una etapa en curso nunca baja de esta fracción de su duración esperada
+FRACCION_MINIMA_RESTANTE = 0.1
+
+SQL_MODELO = """
+    SELECT estado, maquina, SUM(etapas), SUM(minutos),
+           SUM(CASE WHEN metros_impresos > 0 THEN minutos END), SUM(metros_impresos)
+    FROM kpi_diario
+    WHERE estado <> 'Pausado'
+    GROUP BY estado, maquina
+"""
+
+# Proyectos abiertos con la etapa efectiva (la previa si está pausado) y la máquina en uso.
+# 'Reanudado' y los motivos de pausa no son máquinas: se toma la última máquina real de esa etapa.
+SQL_ABIERTOS = """
+    SELECT p.id, v.cliente, v.nombre_proyecto, v.orden_produccion, p.prioridad, v.fecha_entrega,
+           p.estado, CASE WHEN p.estado = 'Pausado' THEN p.estado_anterior ELSE p.estado END AS etapa,
+           t.metros_lineales, pl.timestamp_inicio,
+           CASE WHEN p.estado <> 'Pausado' AND pl.maquina_utilizada IS NOT NULL AND pl.maquina_utilizada <> 'Reanudado'
+                THEN pl.maquina_utilizada
+                ELSE (SELECT prev.maquina_utilizada FROM proyectos_log prev
+                      WHERE prev.proyecto_id = p.id
+                        AND prev.estado = CASE WHEN p.estado = 'Pausado' THEN p.estado_anterior ELSE p.estado END
+                        AND prev.maquina_utilizada IS NOT NULL AND prev.maquina_utilizada <> 'Reanudado'
+                      ORDER BY prev.timestamp_inicio DESC LIMIT 1)
+           END AS maquina
+    FROM proyectos p
+    LEFT JOIN info_ventas v ON p.id = v.proyecto_id
+    LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
+    LEFT JOIN proyectos_log pl ON pl.proyecto_id = p.id AND pl.timestamp_fin IS NULL
+    WHERE p.estado <> ?
+"""
+
+
+class ModeloDuraciones:
+    """Duración esperada (minutos) de una etapa en una máquina, a partir de ``kpi_diario``."""
+
+    def __init__(self, filas):
+        self.por_metro = {}
+        self.por_maquina = {}
+        etapas_estado, minutos_estado = {}, {}
+        for estado, maquina, etapas, minutos, minutos_con_metros, metros in filas:
+            if etapas < MUESTRA_MINIMA:
+                etapas_estado[estado] = etapas_estado.get(estado, 0) + etapas
+                minutos_estado[estado] = minutos_estado.get(estado, 0.0) + minutos
+                continue
+            if metros and minutos_con_metros:
+                self.por_metro[(estado, maquina)] = minutos_con_metros / metros
+            self.por_maquina[(estado, maquina)] = minutos / etapas
+            etapas_estado[estado] = etapas_estado.get(estado, 0) + etapas
+            minutos_estado[estado] = minutos_estado.get(estado, 0.0) + minutos
+        self.por_estado = {e: minutos_estado[e] / etapas_estado[e] for e in etapas_estado if etapas_estado[e] >= MUESTRA_MINIMA}
+
+    @classmethod
+    def desde_bd(cls, conn):
+        return cls(conn.execute(SQL_MODELO).fetchall())
+
+    def minutos(self, estado, maquina=None, metros=None):
+        if maquina is not None:
+            tasa = self.por_metro.get((estado, maquina))
+            if tasa is not None and metros:
+                return tasa * metros
+            if (estado, maquina) in self.por_maquina:
+                return self.por_maquina[(estado, maquina)]
+        return self.por_estado.get(estado, DURACION_POR_DEFECTO_MIN)
+
+
+def _fecha(valor):
+    try:
+        return datetime.fromisoformat(str(valor)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def planificar(conn, ahora=None, maquinas_por_estado=None):
+    """Planifica los proyectos abiertos. Devuelve ``(proyectos, tareas)`` como DataFrames.
+
+    ``proyectos``: una fila por proyecto con ``fin_previsto``, ``dias_atraso`` y ``en_riesgo``.
+    ``tareas``: la cola por máquina (proyecto, etapa, máquina, inicio, fin) de lo que falta.
+    """
+    ahora = ahora or datetime.now()
+    maquinas_por_estado = maquinas_por_estado or MAQUINAS_POR_ESTADO
+    modelo = ModeloDuraciones.desde_bd(conn)
+    abiertos = conn.execute(SQL_ABIERTOS, (ESTADO_FINAL,)).fetchall()
+
+    # Los tiempos se llevan en minutos desde `ahora` (floats) y se pasan a fechas al final
+    libre = {m: 0.0 for maquinas in maquinas_por_estado.values() for m in maquinas}
+    trabajos = []
+    for (pid, cliente, nombre, op, prioridad, fecha_entrega, estado, etapa, metros, inicio, maquina) in abiertos:
+        etapa = etapa if etapa in ESTADOS_FLUJO else ESTADOS_FLUJO[0]
+        if etapa in maquinas_por_estado and maquina not in maquinas_por_estado[etapa]:
+            maquina = None
+        esperado = modelo.minutos(etapa, maquina, metros)
+        transcurrido = 0.0
+        if estado != ESTADO_PAUSA and inicio:
+            transcurrido = max(0.0, (ahora - datetime.fromisoformat(str(inicio))).total_seconds() / 60)
+        restante_actual = max(esperado - transcurrido, esperado * FRACCION_MINIMA_RESTANTE)
+        if maquina is not None:
+            # Etapa en curso en una máquina: la ocupa hasta terminar, sin importar la prioridad
+            inicio_maquina, fin = libre[maquina], libre[maquina] + restante_actual
+            libre[maquina] = fin
+            trabajos.append([pid, cliente, nombre, op, prioridad, _fecha(fecha_entrega), estado, etapa, metros, fin, (etapa, maquina, inicio_maquina, fin)])
+        else:
+            trabajos.append([pid, cliente, nombre, op, prioridad, _fecha(fecha_entrega), estado, etapa, metros, None, restante_actual])
+
+    trabajos.sort(key=lambda t: (ORDEN_PRIORIDAD.get(t[4], 3), t[5] or datetime.max, t[0]))
+    # Por etapa, la hora en que se libera cada máquina
+    colas = {e: [[libre[m], m] for m in ms] for e, ms in maquinas_por_estado.items()}
+
+    def asignar(etapa, listo, metros, minutos_fijos=None):
+        """Ubica una etapa de máquina en la que termine antes. Devuelve (maquina, inicio, fin)."""
+        mejor = None
+        # Con máquinas de distinta velocidad no basta la primera libre: se prueban todas (son pocas)
+        for maquina in colas[etapa]:
+            minutos = minutos_fijos if minutos_fijos is not None else modelo.minutos(etapa, maquina[1], metros)
+            inicio = max(maquina[0], listo)
+            fin = inicio + minutos
+            if mejor is None or fin < mejor[2]:
+                mejor = (maquina, inicio, fin)
+        maquina, inicio, fin = mejor
+        maquina[0] = fin
+        return maquina[1], inicio, fin
+
+    filas, tareas = [], []
+    for pid, cliente, nombre, op, prioridad, entrega, estado, etapa, metros, fin, detalle in trabajos:
+        if fin is not None:
+            listo = fin
+            tareas.append((pid, *detalle))
+        elif etapa in colas:
+            # Resto de la etapa actual, todavía sin máquina
+            m, inicio, listo = asignar(etapa, 0.0, metros, minutos_fijos=detalle)
+            tareas.append((pid, etapa, m, inicio, listo))
+        else:
+            listo = detalle
+        for siguiente in ESTADOS_FLUJO[ESTADOS_FLUJO.index(etapa) + 1:-1]:
+            if siguiente in colas:
+                m, inicio, listo = asignar(siguiente, listo, metros)
+                tareas.append((pid, siguiente, m, inicio, listo))
+            else:
+                listo += modelo.minutos(siguiente)
+        # Se cumple si termina dentro del día de entrega
+        atraso = listo - (entrega + timedelta(days=1) - ahora).total_seconds() / 60 if entrega else 0.0
+        filas.append((pid, cliente, nombre, op, prioridad, estado, entrega.date() if entrega else None, listo, max(atraso, 0.0)))
+
+    proyectos = pd.DataFrame(filas, columns=['id', 'cliente', 'nombre_proyecto', 'orden_produccion', 'prioridad', 'estado', 'fecha_entrega', 'fin_previsto', 'dias_atraso'])
+    proyectos['fin_previsto'] = pd.Timestamp(ahora) + pd.to_timedelta(proyectos['fin_previsto'], unit='min')
+    proyectos['en_riesgo'] = proyectos['dias_atraso'] > 0
+    proyectos['dias_atraso'] = (proyectos['dias_atraso'] / (24 * 60)).round(1)
+    tareas = pd.DataFrame(tareas, columns=['proyecto_id', 'etapa', 'maquina', 'inicio', 'fin'])
+    for columna in ('inicio', 'fin'):
+        tareas[columna] = pd.Timestamp(ahora) + pd.to_timedelta(tareas[columna], unit='min')
+    return proyectos, tareas
@@ -0,0 +1,179 @@
+"""Tabla materializada de KPIs diarios de producción (``kpi_diario``).
+
+Cada fila acumula las etapas cerradas de un día (fecha de ``timestamp_fin``)
+por estado, máquina y responsable: cantidad de etapas, minutos sumados,
+metros impresos, desperdicio, cores y cajas. Los tableros leen de aquí en
+lugar de recorrer todo ``proyectos_log`` en cada visita.
+
+Una pausa cierra la fila del log de la etapa y al reanudar se abre otra del
+mismo estado: los minutos, metros y desperdicio de cada tramo se suman el
+día en que se cerró, pero la etapa cuenta una sola vez, al cerrarse el
+último tramo (la misma regla que el uso de troqueles). ``tramos`` cuenta
+las filas del log de cada grupo.
+
+La tabla se mantiene de forma incremental dentro de las mismas
+transacciones que escriben el log:
+
+- ``acumular_cierres``: la llama ``cambiar_estado_proyecto`` con las filas que acaba de cerrar.
+- ``descontar_proyecto``: la llama ``eliminar_proyecto`` antes de borrar el log.
+
+Uso desde consola (backfill o tras corregir datos del log a mano):
+    python resumen_diario.py --reconstruir
+"""
+import argparse
+import json
+
+import pandas as pd
+
+import base_datos
+
+ESTADO_PAUSA = "Pausado"
+
+# Dimensiones de los tableros -> expresión SQL sobre kpi_diario
+DIMENSIONES = {
+    'estado': "estado",
+    'maquina': "maquina",
+    'responsable': "responsable",
+    'dia': "dia",
+    # Lunes de la semana, igual que los periodos 'W' de pandas
+    'semana': "date(dia, 'weekday 0', '-6 days')",
+}
+
+# Claves de la fila agregada. Las máquinas y responsables vacíos se guardan
+# como '' (no NULL) para que el ON CONFLICT de la clave primaria funcione.
+# Al reanudar una pausa se registra 'Reanudado' como máquina: se hereda la
+# del tramo anterior del mismo proyecto y estado (como en analitica.py).
+_SQL_AGREGADO = """
+    SELECT date(pl.timestamp_fin) AS dia,
+           pl.estado,
+           COALESCE(NULLIF(pl.maquina_utilizada, 'Reanudado'), (
+               SELECT prev.maquina_utilizada FROM proyectos_log prev
+               WHERE prev.proyecto_id = pl.proyecto_id AND prev.estado = pl.estado
+                 AND prev.timestamp_inicio < pl.timestamp_inicio
+                 AND prev.maquina_utilizada IS NOT NULL AND prev.maquina_utilizada <> 'Reanudado'
+               ORDER BY prev.timestamp_inicio DESC LIMIT 1
+           ), '') AS maquina,
+           COALESCE(pl.responsable, '') AS responsable,
+           {signo} * COUNT(*),
+           {signo} * SUM({etapa}),
+           {signo} * SUM((julianday(pl.timestamp_fin) - julianday(pl.timestamp_inicio)) * 1440),
+           {signo} * SUM(COALESCE(pl.metros_impresos, 0)),
+           {signo} * SUM(COALESCE(pl.desperdicio, 0)),
+           {signo} * SUM(COALESCE(pl.cantidad_cores, 0)),
+           {signo} * SUM(COALESCE(pl.numero_cajas, 0))
+    FROM proyectos_log pl
+    WHERE pl.timestamp_fin IS NOT NULL AND {where}
+    GROUP BY 1, 2, 3, 4
+"""
+
+_SQL_UPSERT = """
+    INSERT INTO kpi_diario (dia, estado, maquina, responsable, tramos, etapas, minutos, metros_impresos, desperdicio, cantidad_cores, numero_cajas)
+    {select}
+    ON CONFLICT (dia, estado, maquina, responsable) DO UPDATE SET
+        tramos = tramos + excluded.tramos,
+        etapas = etapas + excluded.etapas,
+        minutos = minutos + excluded.minutos,
+        metros_impresos = metros_impresos + excluded.metros_impresos,
+        desperdicio = desperdicio + excluded.desperdicio,
+        cantidad_cores = cantidad_cores + excluded.cantidad_cores,
+        numero_cajas = numero_cajas + excluded.numero_cajas
+"""
+
+
+# Sobre el log completo: un tramo cuya fila siguiente del proyecto es 'Pausado' no cierra la etapa
+_ETAPA_SEGUN_LOG = f"""CASE WHEN (
+               SELECT sig.estado FROM proyectos_log sig
+               WHERE sig.proyecto_id = pl.proyecto_id AND sig.id > pl.id
+               ORDER BY sig.id LIMIT 1
+           ) = '{ESTADO_PAUSA}' THEN 0 ELSE 1 END"""
+
+
+def _aplicar(c, where, params, signo, etapa=_ETAPA_SEGUN_LOG):
+    select = _SQL_AGREGADO.format(signo=signo, where=where, etapa=etapa)
+    c.execute(_SQL_UPSERT.format(select=select), params)
+    if signo < 0:
+        c.execute("DELETE FROM kpi_diario WHERE tramos <= 0")
+
+
+def acumular_cierres(c, log_ids, pausa=False):
+    """Suma a la tabla las filas del log recién cerradas (dentro de la transacción del cierre).
+
+    Con ``pausa=True`` los tramos suman tiempo y metros, pero no etapas: la
+    etapa cuenta cuando se cierre el tramo reanudado.
+    """
+    log_ids = [int(i) for i in log_ids]
+    if log_ids:
+        _aplicar(c, "pl.id IN (SELECT value FROM json_each(?))", (json.dumps(log_ids),), 1, "0" if pausa else "1")
+
+
+def descontar_proyecto(c, proyecto_id):
+    """Resta las etapas cerradas de un proyecto (antes de borrar su log)."""
+    _aplicar(c, "pl.proyecto_id = ?", (proyecto_id,), -1)
+
+
+def reconstruir_tabla(c):
+    """Vacía y recalcula la tabla completa desde ``proyectos_log``. Devuelve cuántas filas quedaron."""
+    c.execute("DELETE FROM kpi_diario")
+    _aplicar(c, "1", (), 1)
+    return c.execute("SELECT COUNT(*) FROM kpi_diario").fetchone()[0]
+
+
+def reconstruir():
+    with base_datos.transaccion() as conn:
+        return reconstruir_tabla(conn.cursor())
+
+
+def kpis(conn, por='estado', desde=None, hasta=None, incluir_pausas=False):
+    """KPIs agregados desde ``kpi_diario`` por una dimensión (ver ``DIMENSIONES``).
+
+    ``desde``/``hasta`` (date o 'YYYY-MM-DD', inclusive) filtran por día de cierre.
+    """
+    expresion = DIMENSIONES[por]
+    clausulas, params = [], []
+    if not incluir_pausas:
+        clausulas.append("estado <> ?")
+        params.append(ESTADO_PAUSA)
+    if desde:
+        clausulas.append("dia >= ?")
+        params.append(str(desde))
+    if hasta:
+        clausulas.append("dia <= ?")
+        params.append(str(hasta))
+    where = f"WHERE {' AND '.join(clausulas)}" if clausulas else ""
+    query = f"""
+        SELECT {expresion} AS {por},
+               SUM(etapas) AS etapas,
+               SUM(minutos) / 60.0 AS horas_totales,
+               SUM(minutos) / NULLIF(SUM(etapas), 0) AS prom_min,
+               SUM(metros_impresos) AS metros_impresos,
+               SUM(desperdicio) AS desperdicio,
+               SUM(desperdicio) / NULLIF(SUM(metros_impresos) + SUM(desperdicio), 0) AS ratio_desperdicio,
+               SUM(cantidad_cores) AS cantidad_cores,
+               SUM(numero_cajas) AS numero_cajas
+        FROM kpi_diario
+        {where}
+        GROUP BY 1 ORDER BY 1
+    """
+    df = pd.read_sql_query(query, conn, params=params).round(2)
+    if por in ('dia', 'semana'):
+        df[por] = pd.to_datetime(df[por])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la tabla de KPIs diarios (kpi_diario).")
+    parser.add_argument('--reconstruir', action='store_true', help="Recalcular la tabla completa desde proyectos_log")
+    args = parser.parse_args()
+
+    import migraciones  # Aquí y no arriba: migraciones importa este módulo
+    migraciones.asegurar_esquema()
+    if args.reconstruir:
+        print(f"kpi_diario reconstruida en {base_datos.DB_PATH}: {reconstruir()} filas.")
+    else:
+        with base_datos.conexion() as conn:
+            filas = conn.execute("SELECT COUNT(*), MIN(dia), MAX(dia) FROM kpi_diario").fetchone()
+        print(f"kpi_diario: {filas[0]} filas, del {filas[1]} al {filas[2]}. Use --reconstruir para recalcular.")
+
+
+if __name__ == '__main__':
+    main()
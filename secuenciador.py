@@ -0,0 +1,260 @@
+"""Secuencia de trabajos por impresora para reducir los cambios de máquina.
+
+En corridas cortas de flexo lo que más pesa es el alistamiento: cambiar
+anilox, lavar y cargar tintas, cambiar el material de la bobina o el
+cilindro (la Z). ``secuenciar`` toma la cola de cada impresora (lo que está
+en Impresion o pausado en Impresion con esa ``maquina_actual``; lo que aún
+está en la etapa anterior va al grupo ``SIN_MAQUINA``) y propone el orden
+de corrida que minimiza la suma de minutos de cambio entre trabajos
+consecutivos:
+
+- Costo de pasar de un trabajo a otro (``TIEMPOS_CAMBIO_MIN``): anilox
+  distintos en la misma unidad, tintas que hay que cambiar (códigos de
+  color; la policromía sin código cuenta como la tinta de proceso de esa
+  unidad), material distinto y Z distinta (``info_tecnica.z``, ver
+  geometria.py). Un dato que falta no cuenta como cambio.
+- Heurística: vecino más cercano desde lo último que se montó en la
+  máquina (último registro de Impresion en ``proyectos_log``; si ese
+  trabajo sigue en la cola, queda primero) y mejora con 2-opt. La matriz de
+  costos se arma con NumPy de una vez, así que unos cientos de trabajos se
+  ordenan en milisegundos (benchmarks/bench_secuenciador.py).
+- Con ``respetar_prioridad`` (por defecto) los Urgente van antes que los
+  Alta y estos antes que los Normal; la secuencia optimiza dentro de cada
+  grupo.
+
+Sin dependencia de Streamlit.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+import colores
+from planificador import ESTADO_PAUSA, ESTADOS_FLUJO, MAQUINAS_POR_ESTADO, ORDEN_PRIORIDAD
+
+ESTADO_IMPRESION = "Impresion"
+SIN_MAQUINA = "Sin asignar"
+
+# Minutos de alistamiento por cada cambio. Ajustar a lo que mide la planta.
+TIEMPOS_CAMBIO_MIN = {
+    'anilox': 8.0,     # por unidad con anilox distinto
+    'tinta': 12.0,     # por tinta que hay que lavar y cargar
+    'material': 15.0,  # cambio de bobina / sustrato
+    'z': 25.0,         # cambio de cilindro
+}
+# Pasadas de 2-opt como máximo (cada una es O(n²) en NumPy); suele converger antes
+MAX_PASADAS_2OPT = 50
+
+# Trabajos en Impresion (o pausados en Impresion) y los de la etapa anterior, que llegan después
+SQL_COLA = """
+    SELECT p.id AS proyecto_id, v.orden_produccion, v.cliente, v.nombre_proyecto, p.prioridad, v.fecha_entrega,
+           p.estado, CASE WHEN p.estado = ? THEN NULL ELSE p.maquina_actual END AS maquina, t.material, t.z
+    FROM proyectos p
+    LEFT JOIN info_ventas v ON p.id = v.proyecto_id
+    LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
+    WHERE p.estado = ? OR (p.estado = ? AND p.estado_anterior = ?) OR p.estado = ?
+"""
+
+SQL_MONTADOS = """
+    SELECT p.id AS proyecto_id, t.material, t.z FROM proyectos p
+    LEFT JOIN info_tecnica t ON p.id = t.proyecto_id
+    WHERE p.id IN (SELECT value FROM json_each(?))
+"""
+
+
+def _tintas(unidades):
+    tintas = set()
+    for slot, unidad in enumerate(unidades, start=1):
+        codigo = (unidad.get('codigo_color') or '').strip().upper()
+        if codigo:
+            tintas.add(codigo)
+        elif unidad.get('tipo_color') == "Policromía":
+            tintas.add(f"POLICROMÍA#{slot}")
+    return tintas
+
+
+def _codigos(valores):
+    """Códigos enteros por valor; vacío o nulo -> -1 (dato desconocido)."""
+    codigos, _ = pd.factorize(pd.Series(valores, dtype=object).replace('', None))
+    return codigos
+
+
+def componentes_cambio(trabajos, colores_por_id):
+    """Matrices n x n con la cantidad de cada tipo de cambio entre dos trabajos (simétricas).
+
+    ``trabajos`` necesita ``proyecto_id``, ``material`` y ``z``; ``colores_por_id`` es lo que
+    devuelve ``colores.cargar``.
+    """
+    ids = trabajos['proyecto_id'].tolist()
+    unidades = [colores_por_id.get(i, []) for i in ids]
+
+    n_unidades = max((len(u) for u in unidades), default=0)
+    anilox = np.full((len(ids), max(n_unidades, 1)), -1)
+    codigos_anilox = {}
+    for fila, lista in enumerate(unidades):
+        for slot, unidad in enumerate(lista):
+            if unidad.get('anilox'):
+                anilox[fila, slot] = codigos_anilox.setdefault(unidad['anilox'], len(codigos_anilox))
+    conocidos = anilox >= 0
+    cambios_anilox = ((anilox[:, None, :] != anilox[None, :, :]) & conocidos[:, None, :] & conocidos[None, :, :]).sum(axis=2)
+
+    conjuntos = [_tintas(u) for u in unidades]
+    codigos_tinta = {t: k for k, t in enumerate(sorted(set().union(*conjuntos)))}
+    tintas = np.zeros((len(ids), len(codigos_tinta)), dtype=np.int32)
+    for fila, conjunto in enumerate(conjuntos):
+        tintas[fila, [codigos_tinta[t] for t in conjunto]] = 1
+    cuantas = tintas.sum(axis=1)
+    # Tintas a cambiar = las del trabajo con más tintas que no están en el otro
+    cambios_tinta = np.maximum(cuantas[:, None], cuantas[None, :]) - tintas @ tintas.T
+
+    def distintos(codigos):
+        return ((codigos[:, None] != codigos[None, :]) & (codigos[:, None] >= 0) & (codigos[None, :] >= 0)).astype(np.int32)
+
+    material = _codigos(trabajos['material'].fillna('').astype(str).str.strip().str.upper())
+    z = _codigos(trabajos['z'].astype('Int64'))
+    return {'anilox': cambios_anilox, 'tinta': cambios_tinta, 'material': distintos(material), 'z': distintos(z)}
+
+
+def matriz_costos(componentes, tiempos=TIEMPOS_CAMBIO_MIN):
+    """Minutos de cambio entre cada par de trabajos."""
+    return sum(tiempos[k] * m for k, m in componentes.items())
+
+
+def ordenar(costos, desde=None):
+    """Orden (índices) que minimiza la suma de costos consecutivos: vecino más cercano + 2-opt.
+
+    ``desde``: costo de pasar de lo que está montado a cada trabajo (None = máquina vacía).
+    El recorrido es abierto: se fija un nodo de partida (lo montado) y uno de llegada ficticio
+    con costo 0, así el 2-opt puede mover cualquier trabajo.
+    """
+    n = len(costos)
+    if n <= 1:
+        return list(range(n))
+    d = np.zeros((n + 2, n + 2))
+    d[:n, :n] = costos
+    if desde is not None:
+        d[n, :n] = d[:n, n] = desde
+
+    # Vecino más cercano; en empate gana el primero (la cola llega ordenada por prioridad y entrega)
+    ruta = [n]
+    pendientes = np.ones(n, dtype=bool)
+    for _ in range(n):
+        fila = np.where(pendientes, d[ruta[-1], :n], np.inf)
+        siguiente = int(np.argmin(fila))
+        ruta.append(siguiente)
+        pendientes[siguiente] = False
+    ruta = np.array(ruta + [n + 1])
+
+    # 2-opt: invertir ruta[i..j] si d(a,c) + d(b,e) < d(a,b) + d(c,e), con a=ruta[i-1], b=ruta[i], c=ruta[j], e=ruta[j+1]
+    for _ in range(MAX_PASADAS_2OPT):
+        mejoro = False
+        for i in range(1, len(ruta) - 2):
+            a, b = ruta[i - 1], ruta[i]
+            c, e = ruta[i + 1:-1], ruta[i + 2:]
+            delta = d[a, c] + d[b, e] - d[a, b] - d[c, e]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = i + 1 + k
+                ruta[i:j + 1] = ruta[i:j + 1][::-1].copy()
+                mejoro = True
+        if not mejoro:
+            break
+    return [int(x) for x in ruta[1:-1]]
+
+
+def _costo_ruta(costos, ruta, desde=None):
+    total = desde[ruta[0]] if desde is not None and ruta else 0.0
+    return float(total + sum(costos[x, y] for x, y in zip(ruta, ruta[1:])))
+
+
+def _ultimo_montado(conn, maquina):
+    """Id del último trabajo que entró a Impresion en la máquina (su configuración sigue montada), o None."""
+    fila = conn.execute("""SELECT proyecto_id FROM proyectos_log
+                           WHERE estado = ? AND maquina_utilizada = ?
+                           ORDER BY timestamp_inicio DESC LIMIT 1""", (ESTADO_IMPRESION, maquina)).fetchone()
+    return fila[0] if fila else None
+
+
+def _secuenciar_maquina(cola, desde, costos, respetar_prioridad):
+    """Índices de ``cola`` en el orden propuesto; ``desde`` es el índice de lo montado o None."""
+    indices = list(range(len(cola)))
+    if respetar_prioridad:
+        niveles = cola['prioridad'].map(ORDEN_PRIORIDAD).fillna(len(ORDEN_PRIORIDAD)).to_numpy()
+        grupos = [[i for i in indices if niveles[i] == nivel] for nivel in sorted(set(niveles))]
+    else:
+        grupos = [indices]
+    orden = []
+    for grupo in grupos:
+        grupo = [i for i in grupo if i != desde]
+        if not grupo:
+            continue
+        anterior = orden[-1] if orden else desde
+        fila = costos[anterior, grupo] if anterior is not None else None
+        orden.extend(grupo[k] for k in ordenar(costos[np.ix_(grupo, grupo)], fila))
+    return orden
+
+
+def secuenciar(conn, tiempos=TIEMPOS_CAMBIO_MIN, respetar_prioridad=True):
+    """Orden de corrida propuesto por impresora. Devuelve ``(secuencia, resumen)`` como DataFrames.
+
+    ``secuencia``: una fila por trabajo con ``maquina``, ``orden``, ``cambio_min`` (alistamiento
+    desde el trabajo anterior), ``detalle_cambio`` y ``montado`` (su configuración ya está en la máquina).
+    ``resumen``: por máquina, minutos de cambio con la secuencia y con el orden de la cola
+    (prioridad, entrega) desde la misma configuración montada, y el ahorro.
+    """
+    previo = ESTADOS_FLUJO[ESTADOS_FLUJO.index(ESTADO_IMPRESION) - 1]
+    cola = pd.read_sql_query(SQL_COLA, conn, params=[previo, ESTADO_IMPRESION, ESTADO_PAUSA, ESTADO_IMPRESION, previo])
+    cola['maquina'] = cola['maquina'].fillna(SIN_MAQUINA)
+    cola['fecha_entrega'] = pd.to_datetime(cola['fecha_entrega'], errors='coerce')
+    cola = cola.sort_values(
+        ['prioridad', 'fecha_entrega', 'proyecto_id'], key=lambda s: s.map(ORDEN_PRIORIDAD).fillna(len(ORDEN_PRIORIDAD)) if s.name == 'prioridad' else s,
+        na_position='last').reset_index(drop=True)
+
+    montados = {m: _ultimo_montado(conn, m) for m in cola['maquina'].unique() if m != SIN_MAQUINA}
+    en_cola = set(cola['proyecto_id'])
+    externos = [pid for pid in montados.values() if pid is not None and pid not in en_cola]
+    extra = pd.read_sql_query(SQL_MONTADOS, conn, params=[json.dumps(externos)]) if externos else cola.iloc[:0][['proyecto_id', 'material', 'z']]
+    todos = pd.concat([cola[['proyecto_id', 'material', 'z']], extra], ignore_index=True)
+    colores_por_id = colores.cargar(conn, todos['proyecto_id'].tolist())
+    componentes = componentes_cambio(todos, colores_por_id)
+    costos = matriz_costos(componentes, tiempos)
+    posicion = {pid: k for k, pid in enumerate(todos['proyecto_id'])}
+
+    filas, resumen = [], []
+    conocidas = MAQUINAS_POR_ESTADO[ESTADO_IMPRESION]
+    for maquina in sorted(cola['maquina'].unique(), key=lambda m: (m == SIN_MAQUINA, conocidas.index(m) if m in conocidas else len(conocidas), m)):
+        grupo = cola[cola['maquina'] == maquina]
+        indices = list(grupo.index)
+        montado = posicion.get(montados.get(maquina))
+        # Índices locales: los de la cola de la máquina, más lo montado si ya no está en la cola
+        locales = indices + ([montado] if montado is not None and montado not in indices else [])
+        sub = costos[np.ix_(locales, locales)]
+        desde = locales.index(montado) if montado is not None else None
+        fijo = desde if montado in indices else None
+        orden = _secuenciar_maquina(grupo.reset_index(drop=True), desde, sub, respetar_prioridad)
+        en_cola = [k for k in range(len(indices)) if k != fijo]
+        if fijo is not None:
+            orden, en_cola = [fijo] + orden, [fijo] + en_cola
+        arranque = sub[desde] if desde is not None and fijo is None else None
+
+        anterior = desde
+        for numero, k in enumerate(orden, start=1):
+            a, b = locales[anterior] if anterior is not None else None, locales[k]
+            detalle = "" if a is None or a == b else ", ".join(
+                f"{nombre} x{int(m[a, b])}" if nombre in ('anilox', 'tinta') else nombre
+                for nombre, m in componentes.items() if m[a, b])
+            filas.append((maquina, numero, b, float(sub[anterior, k]) if anterior is not None else 0.0, detalle, k == fijo))
+            anterior = k
+        minutos, minutos_cola = _costo_ruta(sub, orden, arranque), _costo_ruta(sub, en_cola, arranque)
+        resumen.append((maquina, len(indices), round(minutos, 1), round(minutos_cola, 1), round(minutos_cola - minutos, 1)))
+
+    secuencia = pd.DataFrame(filas, columns=['maquina', 'orden', 'indice', 'cambio_min', 'detalle_cambio', 'montado'])
+    detalle = cola.assign(
+        z=cola['z'].astype('Int64'),
+        anilox=[" / ".join(u['anilox'] or '-' for u in colores_por_id.get(pid, [])) for pid in cola['proyecto_id']],
+        tintas=[" / ".join(u['codigo_color'] or u['tipo_color'] or '-' for u in colores_por_id.get(pid, [])) for pid in cola['proyecto_id']])
+    secuencia = secuencia.join(detalle.drop(columns=['maquina']), on='indice').drop(columns=['indice'])
+    secuencia = secuencia[['maquina', 'orden', 'proyecto_id', 'orden_produccion', 'cliente', 'nombre_proyecto', 'prioridad', 'estado',
+                           'fecha_entrega', 'material', 'z', 'anilox', 'tintas', 'cambio_min', 'detalle_cambio', 'montado']]
+    resumen = pd.DataFrame(resumen, columns=['maquina', 'trabajos', 'minutos_cambio', 'minutos_cambio_cola', 'ahorro_min'])
+    return secuencia, resumen
@@ -0,0 +1,86 @@
+"""Semilla de usuarios iniciales (admin, ventas y cuentas de tablets).
+
+Antes esto se ejecutaba en cada rerun de Streamlit, re-hasheando y
+actualizando las contraseñas de todos los operarios con cada clic. Ahora es
+idempotente y guarda la versión aplicada en la tabla ``sistema``: solo
+escribe si la versión guardada es menor que ``SEMILLA_VERSION``.
+
+Uso desde consola (por ejemplo tras restaurar una copia de la BD):
+    python semilla.py            # aplica la semilla si está pendiente
+    python semilla.py --forzar   # la vuelve a aplicar (restablece contraseñas)
+"""
+import argparse
+import hashlib
+
+import base_datos
+import migraciones
+
+# Subir este número cuando cambie la lista de usuarios o sus contraseñas.
+SEMILLA_VERSION = 1
+
+# Usuarios operativos para tablets (Contraseña = Usuario)
+LISTA_OPERARIOS = [
+    "IMPRESOR SP1", "IMPRESOR SUPER PRINT", "IMPRESOR FIT 350",
+    "JEFE PRODUCCION",
+    "CONTROLADOR 1", "CONTROLADOR 2", "CONTROLADOR 3", "CONTROLADOR 4", "CONTROLADOR 5", "CONTROLADOR 6",
+    "TROQUELADOR1", "TROQUELADOR 2",
+    "DESPACHO 1"
+]
+
+
+def _hash(password):
+    # Mismo formato que make_hashes() en app_empresa.py (SHA256 hex)
+    return hashlib.sha256(str.encode(password)).hexdigest()
+
+
+def version_semilla(conn):
+    fila = conn.execute("SELECT valor FROM sistema WHERE clave = 'semilla_version'").fetchone()
+    return int(fila[0]) if fila else 0
+
+
+def sembrar_usuarios(forzar=False):
+    """Crea/actualiza los usuarios iniciales si la semilla está pendiente. Devuelve True si escribió."""
+    with base_datos.conexion() as conn:
+        if not forzar and version_semilla(conn) >= SEMILLA_VERSION:
+            return False
+
+    with base_datos.transaccion() as conn:
+        c = conn.cursor()
+        if not forzar and version_semilla(conn) >= SEMILLA_VERSION:
+            return False  # Otro proceso la aplicó mientras esperábamos el lock
+
+        # Asegurar que admin tenga rol de admin
+        c.execute("SELECT * FROM usuarios WHERE username='admin'")
+        if not c.fetchone():
+            c.execute("INSERT INTO usuarios (username, password, rol) VALUES (?, ?, ?)", ('admin', _hash('admin'), 'admin'))
+        else:
+            c.execute("UPDATE usuarios SET rol='admin' WHERE username='admin'")
+
+        # Crear usuario ventas para pruebas
+        c.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", ('ventas', _hash('ventas'), 'ventas'))
+
+        for op_user in LISTA_OPERARIOS:
+            # Contraseña: minúsculas y espacios reemplazados por guiones
+            op_password = op_user.lower().replace(" ", "-")
+            c.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", (op_user, _hash(op_password), 'operario'))
+            # Actualizar contraseña por si el usuario ya existía con el formato anterior
+            c.execute("UPDATE usuarios SET password = ? WHERE username = ?", (_hash(op_password), op_user))
+
+        c.execute("INSERT OR REPLACE INTO sistema (clave, valor) VALUES ('semilla_version', ?)", (str(SEMILLA_VERSION),))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea los usuarios iniciales del sistema de producción.")
+    parser.add_argument('--forzar', action='store_true', help="Reaplicar aunque la semilla ya esté registrada")
+    args = parser.parse_args()
+
+    migraciones.asegurar_esquema()
+    if sembrar_usuarios(forzar=args.forzar):
+        print(f"Semilla v{SEMILLA_VERSION} aplicada en {base_datos.DB_PATH}.")
+    else:
+        print(f"Semilla v{SEMILLA_VERSION} ya estaba aplicada; no se hizo nada.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Regresión de índices: las consultas de datos no recorren tablas completas.
+
+Arma una BD pequeña con las migraciones, llama a cada función de consulta
+registrando las sentencias que llegan a SQLite y revisa su ``EXPLAIN QUERY
+PLAN``. Cada caso indica qué tablas puede recorrer completas y por qué.
+benchmarks/verificar_planes.py sigue como herramienta manual sobre toda la
+app y una BD grande.
+"""
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cola_operario  # noqa: E402
+import consultas  # noqa: E402
+import eventos  # noqa: E402
+import migraciones  # noqa: E402
+import planificador  # noqa: E402
+import resumen_diario  # noqa: E402
+import secuenciador  # noqa: E402
+import troqueles  # noqa: E402
+from analitica import entregas_por_periodo  # noqa: E402
+
+ESTADOS = ["Diseño", "Preprensa", "Impresion", "Troquelado", "Despacho", "Entregado"]
+# Recorrido de una tabla sin índice ("SCAN p", no "SCAN p USING INDEX ..." ni "SCAN json_each VIRTUAL TABLE")
+SCAN_COMPLETO = re.compile(r"^SCAN (\w+)$")
+
+# (id, consulta, tablas que puede recorrer completas)
+CASOS = [
+    ('listado_activos', lambda conn: consultas.listar_proyectos(conn, {'solo_activos': True}), {'p'}),  # Página por rowid acotada por LIMIT
+    ('listado_estados', lambda conn: consultas.listar_proyectos(conn, {'estados': ['Impresion']}), set()),
+    ('listado_prioridades', lambda conn: consultas.listar_proyectos(conn, {'prioridades': ['Urgente']}), set()),
+    ('listado_cliente', lambda conn: consultas.listar_proyectos(conn, {'cliente': 'Cliente 1'}), {'p'}),  # Página por rowid acotada por LIMIT
+    ('listado_maquina', lambda conn: consultas.listar_proyectos(conn, {'maquina': 'SP1'}), {'p'}),  # Página por rowid acotada por LIMIT
+    ('listado_anilox', lambda conn: consultas.listar_proyectos(conn, {'anilox': '440'}), set()),
+    ('listado_entrega', lambda conn: consultas.listar_proyectos(conn, {'entrega_desde': '2024-01-01', 'entrega_hasta': '2024-01-07'}), set()),
+    ('contar_estados', lambda conn: consultas.contar_proyectos(conn, {'estados': ['Impresion']}), set()),
+    ('logs_proyectos', lambda conn: consultas.logs_proyectos(conn, [1, 2, 3]), set()),
+    ('cola_maquina', lambda conn: cola_operario.cola_estacion(conn, 'Impresion', ('SP1',)), set()),
+    ('cola_etapa', lambda conn: cola_operario.cola_estacion(conn, 'Despacho'), set()),
+    ('troqueles_compatibles', lambda conn: troqueles.compatibles(conn, 50, 30, 2), set()),
+    ('troqueles_inventario', troqueles.inventario, {'troqueles'}),  # Una fila por troquel físico
+    ('eventos_posteriores', lambda conn: eventos.posteriores(conn, 0), set()),
+    ('eventos_ultimo', eventos.ultimo_id, set()),
+    ('kpis', lambda conn: resumen_diario.kpis(conn, desde='2024-01-01'), set()),
+    ('entregas', entregas_por_periodo, set()),
+    ('secuenciar', secuenciador.secuenciar, set()),
+    # Todos los proyectos abiertos y kpi_diario (una fila por día/estado/máquina/responsable)
+    ('planificar', planificador.planificar, {'p', 'kpi_diario'}),
+]
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = sqlite3.connect(tmp_path_factory.mktemp('planes') / 'planes.db')
+    c = conn.cursor()
+    for migracion in migraciones.MIGRACIONES:
+        migracion(c, lambda mensaje: None)
+    base = datetime(2024, 1, 1)
+    for i in range(1, 31):
+        estado = ESTADOS[i % len(ESTADOS)]
+        c.execute("INSERT INTO proyectos (id, fecha_creacion, estado, prioridad, maquina_actual) VALUES (?, ?, ?, ?, ?)",
+                  (i, base, estado, "Urgente" if i % 5 == 0 else "Normal", "SP1" if estado == "Impresion" and i % 2 else None))
+        c.execute("INSERT INTO info_ventas (proyecto_id, cliente, orden_produccion, fecha_entrega, cantidad_solicitada) VALUES (?, ?, ?, ?, ?)",
+                  (i, f"Cliente {i % 4}", f"OP{i}", (base + timedelta(days=i)).date().isoformat(), 10000))
+        c.execute("INSERT INTO info_tecnica (proyecto_id, metros_lineales, numero_cavidades, ancho_mm, largo_mm) VALUES (?, ?, ?, ?, ?)",
+                  (i, 120.0, 2, 50.0, 30.0))
+        c.execute("INSERT INTO info_preprensa (proyecto_id, numero_colores) VALUES (?, ?)", (i, 4))
+        c.execute("INSERT INTO info_troquel (proyecto_id, numero_troquel) VALUES (?, ?)", (i, "T-50-30"))
+        c.execute("INSERT INTO impresion_colores (proyecto_id, slot, anilox, tipo_color, codigo_color) VALUES (?, 1, '440', 'Pantone', 'P-185C')", (i,))
+        inicio = base + timedelta(days=i)
+        for k, paso in enumerate(ESTADOS[:ESTADOS.index(estado) + 1]):
+            fin = None if paso == estado else inicio + timedelta(hours=k + 1)
+            c.execute("INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, timestamp_fin, maquina_utilizada) VALUES (?, ?, ?, ?, ?)",
+                      (i, paso, inicio + timedelta(hours=k), fin, "SP1" if paso == "Impresion" else None))
+        eventos.registrar(c, eventos.ALTA, i, estado)
+    troqueles.registrar(c, "T-50-30", geo={'ancho_mm': 50.0, 'largo_mm': 30.0, 'cavidades': 2})
+    resumen_diario.reconstruir_tabla(c)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _planes(conn, consulta):
+    """``{sentencia: filas de EXPLAIN QUERY PLAN}`` de lo que ejecuta ``consulta``."""
+    sentencias = []
+    conn.set_trace_callback(sentencias.append)
+    try:
+        consulta(conn)
+    finally:
+        conn.set_trace_callback(None)
+    return {sql: [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            for sql in sentencias if not re.match(r"^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA)\b", sql, re.IGNORECASE)}
+
+
+@pytest.mark.parametrize('consulta, permitidas', [caso[1:] for caso in CASOS], ids=[caso[0] for caso in CASOS])
+def test_sin_recorridos_completos(conn, consulta, permitidas):
+    planes = _planes(conn, consulta)
+    assert planes, "la consulta no llegó a SQLite"
+    for sql, plan in planes.items():
+        recorridas = {m.group(1) for m in map(SCAN_COMPLETO.match, plan) if m}
+        assert recorridas <= permitidas, f"recorrido completo de {recorridas - permitidas} en:\n{sql}\n" + "\n".join(plan)
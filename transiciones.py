@@ -0,0 +1,103 @@
+"""Servicio de transiciones de estado de un proyecto, sin dependencia de Streamlit.
+
+Un cambio de estado toca varias tablas: cierra la entrada abierta de
+``proyectos_log``, abre la del nuevo estado, actualiza
+``proyectos.estado``/``estado_anterior``/``maquina_actual``, el proveedor de preprensa, los
+KPIs diarios, el uso del troquel y el feed de eventos. Todo ocurre en una sola transacción ``BEGIN IMMEDIATE``, con
+el usuario resuelto dentro de la misma transacción.
+
+Concurrencia optimista: el llamador indica el estado que tenía en pantalla
+(``estado_esperado``). Como el lock de escritura ya está tomado, si el
+estado en la BD es otro es que otra tablet se adelantó; se lanza
+``ConflictoEstado`` y no se escribe nada.
+"""
+from datetime import datetime
+
+import base_datos
+import eventos
+import resumen_diario
+import troqueles
+
+ESTADO_PAUSA = "Pausado"
+# Estado al que vuelve una pausa sin estado_anterior registrado (datos antiguos)
+ESTADO_REANUDAR_POR_DEFECTO = "Impresion"
+
+
+class ConflictoEstado(Exception):
+    """El proyecto cambió de estado (o se eliminó) desde que el usuario lo vio."""
+
+    def __init__(self, proyecto_id, esperado, actual):
+        self.proyecto_id = proyecto_id
+        self.esperado = esperado
+        self.actual = actual
+        if actual is None:
+            mensaje = f"El proyecto {proyecto_id} ya no existe."
+        else:
+            mensaje = f"El proyecto {proyecto_id} ya está en '{actual}' (se esperaba '{esperado}'). Otra estación lo actualizó primero."
+        super().__init__(mensaje)
+
+
+def cambiar_estado(proyecto_id, nuevo_estado, username, estado_esperado=None, maquina=None, responsable=None,
+                   observaciones=None, codigo_bobina=None, metros_impresos=0.0, desperdicio=0.0, cantidad_cores=0,
+                   numero_cajas=0, proveedor_preprensa=None, guardar_anterior=False):
+    """Aplica la transición completa. Devuelve ``(estado_de_partida, estado_nuevo)``.
+
+    ``estado_esperado=None`` desactiva la verificación (scripts, importaciones).
+    ``nuevo_estado=None`` vuelve al ``estado_anterior`` guardado (reanudar).
+    ``guardar_anterior=True`` guarda el estado de partida en ``estado_anterior`` (pausar).
+    """
+    with base_datos.transaccion() as conn:
+        c = conn.cursor()
+        # La hora se toma con el lock de escritura: los cierres quedan en el mismo orden que los commits
+        now = datetime.now()
+        fila = c.execute("SELECT estado, estado_anterior FROM proyectos WHERE id = ?", (proyecto_id,)).fetchone()
+        actual = fila[0] if fila else None
+        if actual is None or (estado_esperado is not None and actual != estado_esperado):
+            raise ConflictoEstado(proyecto_id, estado_esperado, actual)
+        if guardar_anterior and actual == nuevo_estado:
+            # Pausar dos veces perdería el estado al que hay que volver
+            raise ConflictoEstado(proyecto_id, estado_esperado, actual)
+        if nuevo_estado is None:
+            nuevo_estado = fila[1] or ESTADO_REANUDAR_POR_DEFECTO
+        base_datos.marcar_cambio(conn)
+        eventos.registrar(c, eventos.ESTADO, proyecto_id, nuevo_estado, username, now)
+        # Finaliza el estado anterior y guarda datos de cierre del proceso
+        c.execute('''
+            UPDATE proyectos_log
+            SET timestamp_fin = ?, responsable = ?, observaciones = ?, codigo_bobina = ?, metros_impresos = ?, desperdicio = ?, cantidad_cores = ?, numero_cajas = ?
+            WHERE proyecto_id = ? AND timestamp_fin IS NULL
+            RETURNING id
+        ''', (now, responsable, observaciones, codigo_bobina, metros_impresos, desperdicio, cantidad_cores, numero_cajas, proyecto_id))
+        cerrados = [f[0] for f in c.fetchall()]
+        # Suma los tramos cerrados a los KPIs diarios (al pausar, sin contar la etapa) y, salvo al pausar,
+        # el uso del troquel, en la misma transacción
+        resumen_diario.acumular_cierres(c, cerrados, pausa=guardar_anterior)
+        if not guardar_anterior:
+            troqueles.acumular_usos(c, cerrados, now)
+        # Inicia el nuevo estado
+        c.execute('''
+            INSERT INTO proyectos_log (proyecto_id, estado, timestamp_inicio, usuario_id, maquina_utilizada)
+            VALUES (?, ?, ?, (SELECT id FROM usuarios WHERE username = ?), ?)
+        ''', (proyecto_id, nuevo_estado, now, username, maquina))
+        # maquina_actual sigue a la etapa: pausar y reanudar la misma etapa la conservan
+        if guardar_anterior:
+            c.execute('UPDATE proyectos SET estado = ?, estado_anterior = ? WHERE id = ?', (nuevo_estado, actual, proyecto_id))
+        elif actual == ESTADO_PAUSA and nuevo_estado == fila[1]:
+            c.execute('UPDATE proyectos SET estado = ? WHERE id = ?', (nuevo_estado, proyecto_id))
+        else:
+            c.execute('UPDATE proyectos SET estado = ?, maquina_actual = ? WHERE id = ?', (nuevo_estado, maquina, proyecto_id))
+        # Si se definió un proveedor de preprensa (en la etapa de diseño), lo guardamos en el proyecto
+        if proveedor_preprensa:
+            c.execute('UPDATE info_preprensa SET proveedor_preprensa = ? WHERE proyecto_id = ?', (proveedor_preprensa, proyecto_id))
+    return actual, nuevo_estado
+
+
+def pausar(proyecto_id, username, motivo, estado_esperado):
+    """Pausa el proyecto recordando el estado en el que estaba."""
+    return cambiar_estado(proyecto_id, ESTADO_PAUSA, username, estado_esperado=estado_esperado,
+                          maquina=f"Motivo: {motivo}", guardar_anterior=True)
+
+
+def reanudar(proyecto_id, username):
+    """Vuelve al estado previo a la pausa (leído dentro de la transacción)."""
+    return cambiar_estado(proyecto_id, None, username, estado_esperado=ESTADO_PAUSA, maquina="Reanudado")
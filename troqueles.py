@@ -0,0 +1,121 @@
+"""Inventario de troqueles por geometría, con búsqueda de compatibles y uso acumulado.
+
+``info_troquel`` solo guardaba el número de troquel y de lámina como texto
+en cada proyecto, y "¿Troquel Existente?" era una casilla manual. La tabla
+``troqueles`` tiene una fila por troquel físico con su geometría (ancho y
+largo de la etiqueta, cavidades, repeticiones, radio de esquina) y un
+índice ``(ancho_mm, largo_mm, cavidades)``. Con él ``compatibles`` responde
+qué troqueles sirven para un trabajo nuevo mientras se llena el formulario.
+``info_troquel.troquel_id`` enlaza cada proyecto con su troquel.
+
+Desgaste: al cerrarse una etapa de Troquelado (sin contar las pausas) se
+suma un uso y los metros lineales del proyecto al troquel, en la misma
+transacción del cambio de estado (``acumular_usos``, desde transiciones.py).
+El inventario inicial y el uso anterior salieron del log en las migraciones
+13 y 15.
+
+Sin dependencia de Streamlit.
+"""
+import json
+from datetime import datetime
+
+import pandas as pd
+
+ESTADO_TROQUELADO = "Troquelado"
+TOLERANCIA_MM = 0.5
+
+
+def registrar(c, numero_troquel, numero_lamina=None, geo=None):
+    """Alta del troquel si no existe (la geometría de ``geo`` completa la que falte). Devuelve su id."""
+    geo = geo or {}
+    return c.execute('''
+        INSERT INTO troqueles (numero_troquel, numero_lamina, ancho_mm, largo_mm, cavidades, repeticiones, creado)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (numero_troquel) DO UPDATE SET
+            numero_lamina = COALESCE(NULLIF(excluded.numero_lamina, ''), troqueles.numero_lamina),
+            ancho_mm = COALESCE(troqueles.ancho_mm, excluded.ancho_mm),
+            largo_mm = COALESCE(troqueles.largo_mm, excluded.largo_mm),
+            cavidades = COALESCE(troqueles.cavidades, excluded.cavidades),
+            repeticiones = COALESCE(troqueles.repeticiones, excluded.repeticiones)
+        RETURNING id
+    ''', (numero_troquel.strip(), numero_lamina, geo.get('ancho_mm'), geo.get('largo_mm'), geo.get('cavidades'),
+          geo.get('repeticiones'), datetime.now())).fetchone()[0]
+
+
+def asignar(c, proyecto_id, numero_troquel, numero_lamina):
+    """Guarda el troquel del proyecto y lo enlaza al inventario (lo da de alta con la geometría del proyecto)."""
+    troquel_id = None
+    if numero_troquel and numero_troquel.strip():
+        fila = c.execute("SELECT ancho_mm, largo_mm, numero_cavidades, repeticiones FROM info_tecnica WHERE proyecto_id = ?",
+                         (proyecto_id,)).fetchone()
+        geo = dict(zip(('ancho_mm', 'largo_mm', 'cavidades', 'repeticiones'), fila)) if fila else None
+        troquel_id = registrar(c, numero_troquel, numero_lamina, geo)
+    c.execute("UPDATE info_troquel SET troquel_existente = ?, numero_troquel = ?, numero_lamina = ?, troquel_id = ? WHERE proyecto_id = ?",
+              ("Si" if troquel_id else "No", numero_troquel, numero_lamina, troquel_id, proyecto_id))
+    return troquel_id
+
+
+def acumular_usos(c, log_ids, momento=None):
+    """Suma un uso y los metros del proyecto a cada troquel cuyas etapas de Troquelado se cerraron."""
+    if not log_ids:
+        return
+    # Pocas filas (las etapas recién cerradas): se agregan por troquel y se suman con un UPDATE por troquel
+    usos = c.execute('''
+        SELECT it.troquel_id, COUNT(*), COALESCE(SUM(t.metros_lineales), 0)
+        FROM json_each(?) j
+        CROSS JOIN proyectos_log pl ON pl.id = j.value
+        JOIN info_troquel it ON it.proyecto_id = pl.proyecto_id
+        LEFT JOIN info_tecnica t ON t.proyecto_id = pl.proyecto_id
+        WHERE pl.estado = ? AND it.troquel_id IS NOT NULL
+        GROUP BY it.troquel_id
+    ''', (json.dumps(list(log_ids)), ESTADO_TROQUELADO)).fetchall()
+    momento = momento or datetime.now()
+    c.executemany("UPDATE troqueles SET usos = usos + ?, metros_acumulados = metros_acumulados + ?, ultimo_uso = ? WHERE id = ?",
+                  [(n, metros, momento, troquel_id) for troquel_id, n, metros in usos])
+
+
+def compatibles(conn, ancho_mm, largo_mm, cavidades=None, repeticiones=None, radio_esquina_mm=None,
+                tolerancia_mm=TOLERANCIA_MM, incluir_inactivos=False):
+    """Troqueles cuyo ancho y largo están a ``tolerancia_mm`` o menos, del más parecido al menos.
+
+    ``cavidades`` y ``repeticiones`` deben coincidir si se indican; el radio de esquina, estar dentro
+    de la tolerancia (un troquel sin radio registrado no se descarta).
+    """
+    clausulas = ["ancho_mm BETWEEN ? AND ?", "largo_mm BETWEEN ? AND ?"]
+    params = [ancho_mm - tolerancia_mm, ancho_mm + tolerancia_mm, largo_mm - tolerancia_mm, largo_mm + tolerancia_mm]
+    if cavidades:
+        clausulas.append("cavidades = ?")
+        params.append(int(cavidades))
+    if repeticiones:
+        clausulas.append("(repeticiones IS NULL OR repeticiones = ?)")
+        params.append(int(repeticiones))
+    if radio_esquina_mm:
+        clausulas.append("(radio_esquina_mm IS NULL OR ABS(radio_esquina_mm - ?) <= ?)")
+        params += [radio_esquina_mm, tolerancia_mm]
+    if not incluir_inactivos:
+        clausulas.append("activo = 1")
+    return pd.read_sql_query(f'''
+        SELECT id, numero_troquel, numero_lamina, ancho_mm, largo_mm, cavidades, repeticiones, radio_esquina_mm,
+               usos, metros_acumulados, vida_util_metros,
+               ROUND(100.0 * metros_acumulados / NULLIF(vida_util_metros, 0), 1) AS desgaste_pct, ultimo_uso
+        FROM troqueles
+        WHERE {' AND '.join(clausulas)}
+        ORDER BY ABS(ancho_mm - ?) + ABS(largo_mm - ?), COALESCE(desgaste_pct, 0), usos DESC
+    ''', conn, params=params + [ancho_mm, largo_mm])
+
+
+def inventario(conn):
+    """Todos los troqueles con uso y desgaste, los más gastados primero."""
+    return pd.read_sql_query('''
+        SELECT id, numero_troquel, numero_lamina, ancho_mm, largo_mm, cavidades, repeticiones, radio_esquina_mm,
+               activo, usos, metros_acumulados, vida_util_metros,
+               ROUND(100.0 * metros_acumulados / NULLIF(vida_util_metros, 0), 1) AS desgaste_pct, ultimo_uso
+        FROM troqueles
+        ORDER BY desgaste_pct IS NULL, desgaste_pct DESC, usos DESC, numero_troquel
+    ''', conn)
+
+
+def actualizar(c, troquel_id, numero_lamina, radio_esquina_mm, vida_util_metros, activo):
+    """Datos que se mantienen a mano desde Configuración."""
+    c.execute("UPDATE troqueles SET numero_lamina = ?, radio_esquina_mm = ?, vida_util_metros = ?, activo = ? WHERE id = ?",
+              (numero_lamina, radio_esquina_mm, vida_util_metros, int(bool(activo)), troquel_id))